@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/fake_youtube.py
+Server HTTP cục bộ đóng vai YouTube cho benchmark offline (không chạm mạng thật).
+
+Phục vụ từ benchmarks/fixtures:
+    GET  /watch?v=<id>                      watch page (ytInitialPlayerResponse nhúng trong HTML)
+    GET  /channel/<id>/videos|shorts, /@<handle>/videos|shorts, /playlist?list=UU...
+                                            danh sách phẳng (giống kết quả extract_flat)
+    POST /youtubei/v1/player                innertube player JSON
+    POST /youtubei/v1/browse                innertube browse JSON
+    GET  /media/<id>.<ext>                  media giả (hỗ trợ Range; `media_conn_rate` giới hạn byte/s mỗi kết nối)
+    GET  /_stats, POST /_reset              bộ đếm request cho harness
+    POST /_config                           đổi cấu hình lúc chạy (vd. tỉ lệ lỗi giả lập)
+
+Fault injection (watch / listing / player / browse, không áp dụng cho media), tỉ lệ 0..1:
+    429       HTTP 429 Too Many Requests
+    timeout   giữ kết nối `hang_s` giây rồi đóng, không trả lời
+    slow      trễ thêm `slow_ms` rồi trả lời bình thường
+    signin    trang "Sign in to confirm you're not a bot" (playabilityStatus LOGIN_REQUIRED)
+    truncate  gửi Content-Length đầy đủ nhưng cắt body giữa chừng
+
+    python -m benchmarks.fake_youtube --port 8790 --channel-videos 300 --media-bytes 2000000
+    python -m benchmarks.fake_youtube --fault-429 0.2 --fault-timeout 0.02 --fault-signin 0.05
+"""
+import os
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from typing import Any, Dict, Optional
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FAULT_KINDS = ('429', 'timeout', 'slow', 'signin', 'truncate')
+SIGNIN_REASON = "Sign in to confirm you\u2019re not a bot"
+
+
+def bench_video_id(n: int) -> str:
+    """ID 11 ký tự hợp lệ, xác định: bench000001, ..."""
+    return f'bench{n:06d}'
+
+
+def _load(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class FakeYouTubeConfig:
+    def __init__(self, channel_videos: int = 120, channel_shorts: int = 40, media_bytes: int = 2_000_000,
+                 page_padding: int = 400_000, latency_ms: float = 0.0, seed: int = 1234,
+                 faults: Optional[Dict[str, float]] = None, slow_ms: float = 1500.0, hang_s: float = 30.0,
+                 media_conn_rate: float = 0.0):
+        self.channel_videos = channel_videos
+        self.channel_shorts = channel_shorts
+        self.media_bytes = media_bytes
+        self.page_padding = page_padding  # watch page thật ~ 0.5-1 MB
+        self.latency_ms = latency_ms      # độ trễ nền cho mọi request
+        self.seed = seed
+        self.faults: Dict[str, float] = {}
+        self.slow_ms = slow_ms            # fault 'slow': trễ thêm
+        self.hang_s = hang_s              # fault 'timeout': lớn hơn socket_timeout của client (10s turbo / 20s safe)
+        self.media_conn_rate = media_conn_rate  # byte/s tối đa của 1 kết nối media (CDN giới hạn theo kết nối), 0 = không
+        self.set_faults(faults or {})
+
+    def set_faults(self, faults: Dict[str, float]):
+        unknown = set(faults) - set(FAULT_KINDS)
+        if unknown:
+            raise ValueError(f'Unknown fault kinds: {sorted(unknown)}')
+        self.faults = {k: max(0.0, float(v)) for k, v in faults.items() if v}
+        if sum(self.faults.values()) > 1.0:
+            raise ValueError('Tổng tỉ lệ fault phải <= 1')
+
+    def update(self, data: Dict[str, Any]):
+        """Áp dụng cấu hình từ POST /_config"""
+        for name in ('latency_ms', 'slow_ms', 'hang_s', 'page_padding', 'channel_videos', 'channel_shorts', 'media_bytes',
+                     'media_conn_rate'):
+            if name in data:
+                setattr(self, name, type(getattr(self, name))(data[name]))
+        if 'faults' in data:
+            self.set_faults(data['faults'] or {})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'channel_videos': self.channel_videos, 'channel_shorts': self.channel_shorts,
+                'media_bytes': self.media_bytes, 'page_padding': self.page_padding, 'latency_ms': self.latency_ms,
+                'seed': self.seed, 'faults': dict(self.faults), 'slow_ms': self.slow_ms, 'hang_s': self.hang_s,
+                'media_conn_rate': self.media_conn_rate}
+
+
+class _Stats:
+    def __init__(self, seed: int = 1234):
+        self._lock = threading.Lock()
+        self._seed = seed
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts: Dict[str, int] = {}
+            self.faults: Dict[str, int] = {}
+            self.modes: Dict[str, int] = {}
+            self.bytes_sent = 0
+            self.started = time.time()
+            self._rng = random.Random(self._seed)  # reset -> cùng chuỗi fault cho mỗi lần chạy
+
+    def hit(self, key: str, nbytes: int = 0):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.bytes_sent += nbytes
+
+    def mode(self, mode: str):
+        with self._lock:
+            self.modes[mode] = self.modes.get(mode, 0) + 1
+
+    def pick_fault(self, rates: Dict[str, float], key: str) -> Optional[str]:
+        """Chọn fault cho request theo tỉ lệ cấu hình (None = trả lời bình thường)"""
+        if not rates:
+            return None
+        with self._lock:
+            r, acc = self._rng.random(), 0.0
+            for kind in FAULT_KINDS:
+                acc += rates.get(kind, 0.0)
+                if r < acc:
+                    name = f'{key}:{kind}'
+                    self.faults[name] = self.faults.get(name, 0) + 1
+                    return kind
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'counts': dict(self.counts), 'requests': sum(self.counts.values()),
+                    'faults': dict(self.faults), 'faulted': sum(self.faults.values()), 'modes': dict(self.modes),
+                    'bytes_sent': self.bytes_sent, 'uptime': round(time.time() - self.started, 3)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    config: FakeYouTubeConfig = None
+    stats: _Stats = None
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeYouTube/1.0'
+
+    def log_message(self, fmt, *args):
+        pass
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    # ---- helpers ----
+    def _send(self, status: int, body: bytes, ctype: str, key: str, headers: Optional[Dict[str, str]] = None,
+              truncate: bool = False):
+        self.send_response(status)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if truncate:
+            # Body bị cắt: client nhận thiếu byte so với Content-Length rồi mất kết nối
+            body = body[:len(body) // 2]
+            self.close_connection = True
+        self.stats.hit(key, len(body))
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _json(self, obj: Any, key: str, status: int = 200):
+        self._send(status, json.dumps(obj, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8', key)
+
+    def _video_fields(self, vid: str) -> Dict[str, str]:
+        rnd = random.Random(f'{self.config.seed}:{vid}')
+        return {
+            '{{VIDEO_ID}}': vid, '{{BASE_URL}}': self.base_url,
+            '{{DURATION}}': str(rnd.choice([45, 58, 183, 241, 305, 612])),
+            '{{VIEW_COUNT}}': str(rnd.randint(1_000, 50_000_000)),
+            '{{LIKE_COUNT}}': str(rnd.randint(10, 500_000)),
+            '{{MEDIA_BYTES}}': str(self.config.media_bytes),
+        }
+
+    def _player_response(self, vid: str) -> str:
+        text = _load('player_response.json').strip()
+        for k, v in self._video_fields(vid).items():
+            text = text.replace(k, v)
+        return text
+
+    def _listing(self, kind: str, owner: str) -> Dict[str, Any]:
+        n = self.config.channel_shorts if kind == 'shorts' else self.config.channel_videos
+        offset = 500_000 if kind == 'shorts' else 0
+        entries = [{'_type': 'url', 'ie_key': 'Youtube', 'id': bench_video_id(offset + i + 1),
+                    'url': f'https://www.youtube.com/watch?v={bench_video_id(offset + i + 1)}',
+                    'title': f'Benchmark {kind} {i + 1}'} for i in range(n)]
+        return {'_type': 'playlist', 'id': owner, 'title': f'AIO Benchmark Channel - {kind}',
+                'uploader': 'AIO Benchmark Channel', 'channel_id': 'UCbenchmark00000000000000', 'entries': entries}
+
+    def _delay(self):
+        if self.config.latency_ms:
+            threading.Event().wait(self.config.latency_ms / 1000.0)
+
+    def _fault(self, key: str) -> Optional[str]:
+        """
+        Chọn và xử lý fault cho request. Trả về:
+            'handled'            đã trả lời / bỏ kết nối (429, timeout)
+            'signin'/'truncate'  route tự tạo body tương ứng
+            None                 trả lời bình thường (kể cả sau 'slow')
+        """
+        mode = self.headers.get('X-AIO-Mode')
+        if mode:
+            self.stats.mode(mode)
+        kind = self.stats.pick_fault(self.config.faults, key)
+        if kind == '429':
+            self._send(429, b'Too Many Requests', 'text/plain', key, {'Retry-After': '2'})
+            return 'handled'
+        if kind == 'timeout':
+            self.stats.hit(key)
+            threading.Event().wait(self.config.hang_s)
+            self.close_connection = True
+            return 'handled'
+        if kind == 'slow':
+            threading.Event().wait(self.config.slow_ms / 1000.0)
+            return None
+        return kind
+
+    def _signin_response(self) -> str:
+        return json.dumps({
+            'responseContext': {},
+            'playabilityStatus': {'status': 'LOGIN_REQUIRED', 'reason': SIGNIN_REASON,
+                                  'errorScreen': {'playerErrorMessageRenderer': {
+                                      'reason': {'simpleText': SIGNIN_REASON}}}},
+        })
+
+    # ---- routes ----
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/_stats':
+            return self._json(self.stats.snapshot(), '_stats')
+        self._delay()
+
+        if url.path == '/watch':
+            fault = self._fault('watch')
+            if fault == 'handled':
+                return
+            vid = (query.get('v') or [''])[0]
+            pr = self._signin_response() if fault == 'signin' else self._player_response(vid)
+            page = _load('watch_page.html').replace('{{VIDEO_ID}}', vid)
+            page = page.replace('{{PLAYER_RESPONSE}}', pr)
+            page = page.replace('{{PADDING}}', 'x' * self.config.page_padding)
+            return self._send(200, page.encode('utf-8'), 'text/html; charset=utf-8', 'watch',
+                              truncate=fault == 'truncate')
+
+        m = re.match(r'^/(?:channel/[^/]+|@[^/]+|c/[^/]+|user/[^/]+)/(videos|shorts)$', url.path)
+        if m or url.path == '/playlist':
+            kind = m.group(1) if m else 'videos'
+            key = f'listing_{kind}'
+            fault = self._fault(key)
+            if fault == 'handled':
+                return
+            if fault == 'signin':
+                return self._send(403, SIGNIN_REASON.encode('utf-8'), 'text/plain; charset=utf-8', key)
+            owner = url.path.split('/')[1] if m else (query.get('list') or [''])[0]
+            body = json.dumps(self._listing(kind, owner), ensure_ascii=False).encode('utf-8')
+            return self._send(200, body, 'application/json; charset=utf-8', key, truncate=fault == 'truncate')
+
+        m = re.match(r'^/media/([0-9A-Za-z_-]+)\.(\w+)$', url.path)
+        if m:
+            return self._media(m.group(1), m.group(2))
+
+        self._json({'error': 'not found'}, 'not_found', 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if url.path == '/_reset':
+            self.stats.reset()
+            return self._json({'ok': True}, '_reset')
+        if url.path == '/_config':
+            try:
+                self.config.update(payload)
+            except (ValueError, TypeError) as e:
+                return self._json({'error': str(e)}, '_config', 400)
+            return self._json(self.config.to_dict(), '_config')
+        self._delay()
+
+        if url.path in ('/youtubei/v1/player', '/youtubei/v1/browse'):
+            key = url.path.rsplit('/', 1)[-1]
+            fault = self._fault(key)
+            if fault == 'handled':
+                return
+            if fault == 'signin' and key == 'browse':
+                return self._send(403, SIGNIN_REASON.encode('utf-8'), 'text/plain; charset=utf-8', key)
+        else:
+            fault = None
+
+        if url.path == '/youtubei/v1/player':
+            vid = payload.get('videoId', '')
+            body = self._signin_response() if fault == 'signin' else self._player_response(vid)
+            return self._send(200, body.encode('utf-8'), 'application/json', 'player', truncate=fault == 'truncate')
+        if url.path == '/youtubei/v1/browse':
+            items = [{'richItemRenderer': {'content': {'videoRenderer': {
+                'videoId': bench_video_id(i + 1), 'title': {'runs': [{'text': f'Benchmark video {i + 1}'}]}}}}}
+                for i in range(self.config.channel_videos)]
+            text = _load('browse_videos.json').replace('"{{ITEMS}}"', json.dumps(items))
+            return self._send(200, text.encode('utf-8'), 'application/json', 'browse', truncate=fault == 'truncate')
+
+        self._json({'error': 'not found'}, 'not_found', 404)
+
+    def _media(self, vid: str, ext: str):
+        size = self.config.media_bytes
+        start, end = 0, size - 1
+        rng = self.headers.get('Range')
+        status = 200
+        if rng:
+            m = re.match(r'bytes=(\d*)-(\d*)', rng)
+            if m:
+                start = int(m.group(1) or 0)
+                end = min(int(m.group(2)) if m.group(2) else size - 1, size - 1)
+                status = 206
+        if start >= size:
+            return self._send(416, b'', 'text/plain', 'media_416', {'Content-Range': f'bytes */{size}'})
+
+        ctype = {'mp4': 'video/mp4', 'm4a': 'audio/mp4', 'webm': 'video/webm'}.get(ext, 'application/octet-stream')
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if self.command == 'HEAD':
+            return self.stats.hit('media_head')
+        # Nội dung xác định theo vị trí byte -> tải lại/nhiều đoạn vẫn khớp
+        block = (vid.encode('ascii') * (65536 // len(vid) + 1))[:65536]
+        sent, pos = 0, start
+        rate, t0 = self.config.media_conn_rate, time.perf_counter()
+        try:
+            while pos <= end:
+                off = pos % len(block)
+                chunk = block[off:off + min(len(block) - off, end - pos + 1, 16384 if rate else len(block))]
+                self.wfile.write(chunk)
+                pos += len(chunk)
+                sent += len(chunk)
+                if rate:  # giữ nhịp theo kết nối
+                    ahead = sent / rate - (time.perf_counter() - t0)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.stats.hit('media', sent)
+
+
+class FakeYouTubeServer:
+    """Chạy server trong thread nền: with FakeYouTubeServer(config) as srv: srv.base_url"""
+
+    def __init__(self, config: Optional[FakeYouTubeConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config or FakeYouTubeConfig()
+        self.stats = _Stats(self.config.seed)
+        handler = type('FakeYouTubeHandler', (_Handler,), {'config': self.config, 'stats': self.stats})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'FakeYouTubeServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-youtube', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog='python -m benchmarks.fake_youtube')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8790)
+    p.add_argument('--channel-videos', type=int, default=120)
+    p.add_argument('--channel-shorts', type=int, default=40)
+    p.add_argument('--media-bytes', type=int, default=2_000_000)
+    p.add_argument('--page-padding', type=int, default=400_000)
+    p.add_argument('--latency-ms', type=float, default=0.0)
+    p.add_argument('--media-conn-rate', type=float, default=0.0, help='byte/s tối đa mỗi kết nối media (0 = không giới hạn)')
+    p.add_argument('--seed', type=int, default=1234)
+    for kind in FAULT_KINDS:
+        p.add_argument(f'--fault-{kind}', type=float, default=0.0, metavar='RATE', help=f"Tỉ lệ fault '{kind}' (0..1)")
+    p.add_argument('--slow-ms', type=float, default=1500.0, help="Độ trễ thêm của fault 'slow'")
+    p.add_argument('--hang-s', type=float, default=30.0, help="Thời gian giữ kết nối của fault 'timeout'")
+    return p
+
+
+def config_from_args(args) -> FakeYouTubeConfig:
+    return FakeYouTubeConfig(channel_videos=args.channel_videos, channel_shorts=args.channel_shorts,
+                             media_bytes=args.media_bytes, page_padding=args.page_padding,
+                             latency_ms=args.latency_ms, seed=args.seed,
+                             faults={k: getattr(args, f'fault_{k}') for k in FAULT_KINDS},
+                             slow_ms=args.slow_ms, hang_s=args.hang_s, media_conn_rate=args.media_conn_rate)
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    srv = FakeYouTubeServer(config_from_args(args), args.host, args.port)
+    print(json.dumps({'event': 'listening', 'base_url': srv.base_url}), flush=True)
+    try:
+        srv.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,520 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/run.py
+Benchmark offline cho scraper / checker / enrich / download / player (yt_internal) bằng fake_youtube.
+
+    python -m benchmarks.run --suites checker,enrich --workers 2,4,8 --batch-sizes 5,15 --items 120
+    python -m benchmarks.run --suites download --workers 1,2,4 --items 20 --media-bytes 5000000
+    python -m benchmarks.run --suites download --workers 2 --items 10 --media-bytes 8000000 \
+        --media-conn-rate 2000000 --downloaders native,segmented
+    python -m benchmarks.run --suites checker,scraper --profiles clean,throttled,mixed
+    python -m benchmarks.run --suites checker --faults 429=0.3,signin=0.05
+
+Mỗi cấu hình (profile x suite x workers x batch_size) ghi: items/s, latency p50/p95/p99 (ms) từng item,
+peak RSS (process chính + worker), CPU giây / %, bộ đếm request của server và phần "suy giảm" khi có fault:
+trạng thái từng item, request lãng phí (watch/player vượt quá số item OK), request chạy ở safe mode
+(turbo -> safe fallback), thời gian time.sleep trong core theo hàm gọi, throughput so với profile 'clean'.
+batch_size: scraper/checker = số video mỗi batch process; player = số ID mỗi lần player_info_many;
+download/enrich: không dùng (None). download chạy thêm theo từng `--downloaders` (native = HttpFD của yt-dlp,
+segmented = core.segmented, aria2 = aria2c nếu có); `--media-conn-rate` giới hạn byte/s mỗi kết nối như CDN thật.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+import platform
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from typing import Any, Callable, Dict, List, Optional
+from urllib.request import Request, urlopen
+
+import psutil
+
+SUITES = ('scraper', 'checker', 'enrich', 'download', 'player')
+DOWNLOADERS = ('native', 'segmented', 'aria2')
+BATCHED_SUITES = ('scraper', 'checker', 'player')
+METADATA_KEYS = ('watch', 'player')
+BACKOFF_CALLERS = ('get_video_info', 'get_channel_info_stable', 'get_shorts_info_stable')  # sleep do retry/fallback
+
+# Tỉ lệ fault cho server giả (xem benchmarks/fake_youtube.py). Production thường ở dạng 'throttled'.
+FAULT_PROFILES: Dict[str, Dict[str, float]] = {
+    'clean': {},
+    'throttled': {'429': 0.25, 'slow': 0.10},
+    'flaky': {'timeout': 0.03, 'truncate': 0.05, 'slow': 0.10},
+    'signin': {'signin': 0.15},
+    'mixed': {'429': 0.15, 'timeout': 0.02, 'slow': 0.05, 'signin': 0.05, 'truncate': 0.03},
+}
+
+
+# ===== Đo đạc =====
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    data = sorted(values)
+    k = (len(data) - 1) * p / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(data) - 1)
+    return data[lo] + (data[hi] - data[lo]) * (k - lo)
+
+
+class LatencyRecorder:
+    """Thu thời gian từng item, kể cả từ worker process (multiprocessing.Queue kế thừa qua fork)"""
+
+    def __init__(self):
+        self._queue = multiprocessing.Queue()
+        self.samples: List[float] = []
+
+    def wrap(self, fn: Callable) -> Callable:
+        queue = self._queue
+
+        def _timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                queue.put(time.perf_counter() - t0)
+        return _timed
+
+    def wrap_async(self, fn: Callable) -> Callable:
+        queue = self._queue
+
+        async def _timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                queue.put(time.perf_counter() - t0)
+        return _timed
+
+    def drain(self) -> List[float]:
+        while True:
+            try:
+                self.samples.append(self._queue.get(timeout=0.05))
+            except Exception:
+                break
+        return self.samples
+
+    def summary(self) -> Dict[str, Any]:
+        ms = [s * 1000 for s in self.drain()]
+        return {'n': len(ms), 'p50': percentile(ms, 50), 'p95': percentile(ms, 95), 'p99': percentile(ms, 99),
+                'mean': sum(ms) / len(ms) if ms else None, 'max': max(ms) if ms else None}
+
+
+class SleepRecorder:
+    """
+    Thay `time` trong các module core bằng proxy đếm time.sleep theo hàm gọi
+    (backoff trong get_video_info, nhịp nghỉ của worker...). Cài trước khi tạo pool để worker kế thừa.
+    """
+
+    def __init__(self):
+        self._queue = multiprocessing.Queue()
+        self.by_caller: Dict[str, float] = {}
+        self._patched: List[Any] = []
+
+    def install(self, *modules):
+        queue = self._queue
+
+        class _Clock:
+            def __getattr__(self, name):
+                return getattr(time, name)
+
+            @staticmethod
+            def sleep(seconds):
+                queue.put((sys._getframe(1).f_code.co_name, float(seconds)))
+                time.sleep(seconds)
+
+        for mod in modules:
+            if getattr(mod, 'time', None) is time:
+                mod.time = _Clock()
+                self._patched.append(mod)
+
+    def uninstall(self):
+        for mod in self._patched:
+            mod.time = time
+        self._patched = []
+
+    def summary(self) -> Dict[str, Any]:
+        while True:
+            try:
+                caller, seconds = self._queue.get(timeout=0.05)
+            except Exception:
+                break
+            self.by_caller[caller] = self.by_caller.get(caller, 0.0) + seconds
+        return {'total_s': round(sum(self.by_caller.values()), 3),
+                'backoff_s': round(sum(v for k, v in self.by_caller.items() if k in BACKOFF_CALLERS), 3),
+                'by_caller': {k: round(v, 3) for k, v in sorted(self.by_caller.items())}}
+
+
+class ResourceMeter(threading.Thread):
+    """Lấy mẫu RSS/CPU của process chính + mọi process con (trừ server giả) mỗi `interval` giây"""
+
+    def __init__(self, exclude_pids: Optional[List[int]] = None, interval: float = 0.1):
+        super().__init__(daemon=True)
+        self.exclude = set(exclude_pids or [])
+        self.interval = interval
+        self.peak_rss = 0
+        self._cpu: Dict[int, float] = {}
+        self._base: Dict[int, float] = {}
+        self._halt = threading.Event()
+        self._me = psutil.Process()
+
+    def _procs(self) -> List[psutil.Process]:
+        procs = [self._me]
+        try:
+            procs += [p for p in self._me.children(recursive=True) if p.pid not in self.exclude]
+        except psutil.Error:
+            pass
+        return procs
+
+    def _sample(self):
+        rss = 0
+        for p in self._procs():
+            try:
+                with p.oneshot():
+                    rss += p.memory_info().rss
+                    t = p.cpu_times()
+                    self._cpu[p.pid] = t.user + t.system
+            except psutil.Error:
+                continue
+        self.peak_rss = max(self.peak_rss, rss)
+
+    def run(self):
+        t = self._me.cpu_times()
+        self._base[self._me.pid] = t.user + t.system
+        while not self._halt.is_set():
+            self._sample()
+            self._halt.wait(self.interval)
+
+    def stop(self) -> Dict[str, float]:
+        self._sample()
+        self._halt.set()
+        self.join(timeout=2)
+        cpu_s = sum(v - self._base.get(pid, 0.0) for pid, v in self._cpu.items())
+        return {'peak_rss_mb': round(self.peak_rss / 1024 / 1024, 1), 'cpu_s': round(cpu_s, 3)}
+
+
+# ===== Server giả (process riêng để CPU của server không lẫn vào số đo) =====
+class ServerProcess:
+    def __init__(self, extra_args: List[str]):
+        self.extra_args = extra_args
+        self.proc: Optional[subprocess.Popen] = None
+        self.base_url = ''
+
+    def __enter__(self):
+        cmd = [sys.executable, '-m', 'benchmarks.fake_youtube', '--port', '0'] + self.extra_args
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True,
+                                     cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.base_url = json.loads(self.proc.stdout.readline())['base_url']
+        return self
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        self.proc.wait(timeout=5)
+        return False
+
+    def call(self, path: str, post: bool = False, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        data = json.dumps(payload or {}).encode('utf-8') if post else None
+        req = Request(self.base_url + path, data=data)
+        with urlopen(req, timeout=10) as r:
+            return json.loads(r.read())
+
+
+# ===== Các suite =====
+def _bench_ids(n: int) -> List[str]:
+    from benchmarks.fake_youtube import bench_video_id
+    return [bench_video_id(i + 1) for i in range(n)]
+
+
+def _new_counts() -> Dict[str, Any]:
+    return {'items': 0, 'errors': 0, 'statuses': {}}
+
+
+def _classify(status: Optional[str]) -> str:
+    """Gom thông báo lỗi về vài nhóm để so sánh giữa các profile"""
+    if status in (None, 'OK'):
+        return 'OK'
+    text = str(status).lower()
+    for needle, label in (('429', 'Rate limited (429)'), ('too many requests', 'Rate limited (429)'),
+                          ('sign in', 'Sign-in required'), ('sign-in', 'Sign-in required'),
+                          ('timed out', 'Timeout'), ('timeout', 'Timeout'),
+                          ('incompleteread', 'Truncated body'), ('peer closed', 'Truncated body'),
+                          ('disconnected', 'Connection dropped'),
+                          ('metadata missing', 'Metadata missing')):
+        if needle in text:
+            return label
+    return str(status).splitlines()[0][:60] or 'error'
+
+
+def _count(counts: Dict[str, Any], status: Optional[str]):
+    """status None/'OK' = thành công; lỗi gom nhóm qua _classify"""
+    counts['items'] += 1
+    key = _classify(status)
+    counts['errors'] += key != 'OK'
+    counts['statuses'][key] = counts['statuses'].get(key, 0) + 1
+
+
+def _run_scraper(cfg: Dict[str, Any], rec: LatencyRecorder, workdir: str) -> Dict[str, Any]:
+    import core.ScraperChecker as sc
+    counts = _new_counts()
+
+    def on_item(row):
+        _count(counts, row.get('Tình trạng'))
+
+    original = sc.get_video_info
+    sc.get_video_info = rec.wrap(original)
+    try:
+        sc.run_scraper('UCbenchmark00000000000000', workdir, max_workers=cfg['workers'],
+                       batch_size=cfg['batch_size'], turbo_mode=True, item_callback=on_item)
+    finally:
+        sc.get_video_info = original
+    return counts
+
+
+def _run_checker(cfg: Dict[str, Any], rec: LatencyRecorder, workdir: str) -> Dict[str, Any]:
+    import pandas as pd
+    import core.ScraperChecker as sc
+    fp = os.path.join(workdir, 'bench_input.csv')
+    pd.DataFrame({'ID Video': _bench_ids(cfg['items'])}).to_csv(fp, index=False)
+    counts = _new_counts()
+
+    def on_item(row):
+        _count(counts, row.get('Tình trạng'))
+
+    original = sc.get_video_info
+    sc.get_video_info = rec.wrap(original)
+    try:
+        sc.run_checker(fp, max_workers=cfg['workers'], batch_size=cfg['batch_size'], turbo_mode=True,
+                       item_callback=on_item)
+    finally:
+        sc.get_video_info = original
+    return counts
+
+
+def _run_enrich(cfg: Dict[str, Any], rec: LatencyRecorder, workdir: str) -> Dict[str, Any]:
+    import core.enricher as en
+    counts = _new_counts()
+
+    def on_item(row):
+        _count(counts, row.get('error') or None)
+
+    original = en._extract_detail
+    en._extract_detail = rec.wrap(original)
+    try:
+        en.enrich(_bench_ids(cfg['items']), max_workers=cfg['workers'], include_transcript=False,
+                  out_excel=os.path.join(workdir, 'enriched.xlsx'), item_callback=on_item)
+    finally:
+        en._extract_detail = original
+    return counts
+
+
+def _run_download(cfg: Dict[str, Any], rec: LatencyRecorder, workdir: str) -> Dict[str, Any]:
+    import core.ScraperChecker as sc
+    counts = _new_counts()
+
+    def on_item(row):
+        _count(counts, row.get('Trạng thái'))
+
+    original = sc.download_video
+    sc.download_video = rec.wrap(original)
+    try:
+        downloader = cfg.get('downloader') or 'native'
+        sc.run_downloader(_bench_ids(cfg['items']), os.path.join(workdir, 'media'), quality='best',
+                          max_workers=cfg['workers'], use_archive=False, item_callback=on_item,
+                          enable_aria2=downloader == 'aria2',
+                          segment_connections=cfg.get('segments') if downloader == 'segmented' else None)
+    finally:
+        sc.download_video = original
+    return counts
+
+
+def _run_player(cfg: Dict[str, Any], rec: LatencyRecorder, workdir: str, base_url: str = '') -> Dict[str, Any]:
+    import core.yt_internal as yi
+    ids = _bench_ids(cfg['items'])
+    chunk = cfg['batch_size'] or len(ids)
+    counts = _new_counts()
+    original_post, original_base = yi._post_json, yi.API_BASE
+    yi._post_json, yi.API_BASE = rec.wrap_async(original_post), f'{base_url}/youtubei/v1'
+    context = {'client': {'clientName': 'WEB', 'clientVersion': '2.20240515.01.00', 'hl': 'vi', 'gl': 'VN'}}
+    try:
+        for i in range(0, len(ids), chunk):
+            rows = asyncio.run(yi.player_info_many(ids[i:i + chunk], 'bench-key', context,
+                                                   concurrency=cfg['workers']))
+            for r in rows:
+                status = r.get('error') or (r.get('playabilityStatus') or {}).get('reason')
+                _count(counts, status if 'videoDetails' not in r else None)
+    finally:
+        yi._post_json, yi.API_BASE = original_post, original_base
+    return counts
+
+
+_RUNNERS = {'scraper': _run_scraper, 'checker': _run_checker, 'enrich': _run_enrich,
+            'download': _run_download, 'player': _run_player}
+
+
+def run_config(suite: str, cfg: Dict[str, Any], server: ServerProcess) -> Dict[str, Any]:
+    import core.ScraperChecker as sc
+    import core.enricher as en
+    rec = LatencyRecorder()
+    sleeps = SleepRecorder()
+    server.call('/_reset', post=True)
+    meter = ResourceMeter(exclude_pids=[server.proc.pid])
+    sleeps.install(sc, en)
+    with tempfile.TemporaryDirectory(prefix=f'aio_bench_{suite}_') as workdir:
+        meter.start()
+        t0 = time.perf_counter()
+        error = None
+        try:
+            if suite == 'player':
+                counts = _run_player(cfg, rec, workdir, server.base_url)
+            else:
+                counts = _RUNNERS[suite](cfg, rec, workdir)
+        except Exception as e:
+            counts, error = _new_counts(), f'{type(e).__name__}: {e}'
+        finally:
+            sleeps.uninstall()
+        wall = time.perf_counter() - t0
+        res = meter.stop()
+
+    stats = server.call('/_stats')
+    ok = counts['items'] - counts['errors']
+    metadata_requests = sum(stats['counts'].get(k, 0) for k in METADATA_KEYS)
+    return {
+        'profile': cfg.get('profile', 'clean'), 'suite': suite, 'downloader': cfg.get('downloader'),
+        'workers': cfg['workers'],
+        'batch_size': cfg['batch_size'], 'items': counts['items'], 'ok': ok, 'errors': counts['errors'],
+        'statuses': counts['statuses'], 'wall_s': round(wall, 3),
+        'items_per_s': round(counts['items'] / wall, 3) if wall > 0 else None,
+        'ok_per_s': round(ok / wall, 3) if wall > 0 else None,
+        'latency_ms': rec.summary(), **res,
+        'cpu_pct': round(res['cpu_s'] / wall * 100, 1) if wall > 0 else None,
+        'sleep': sleeps.summary(),
+        'requests': {'metadata': metadata_requests,
+                     'wasted': max(0, metadata_requests - ok) if suite != 'download' else None,
+                     'faulted': stats['faulted'], 'safe_mode': stats['modes'].get('safe', 0),
+                     'turbo_mode': stats['modes'].get('turbo', 0)},
+        'server': stats, 'error': error,
+    }
+
+
+def compare_to_clean(results: List[Dict[str, Any]]):
+    """Thêm 'vs_clean' = tỉ lệ ok/s và wall so với cùng cấu hình ở profile 'clean' (nếu có)"""
+    base = {(r['suite'], r.get('downloader'), r['workers'], r['batch_size']): r
+            for r in results if r['profile'] == 'clean'}
+    for r in results:
+        b = base.get((r['suite'], r.get('downloader'), r['workers'], r['batch_size']))
+        if r['profile'] == 'clean' or not b or not b['ok_per_s']:
+            continue
+        r['vs_clean'] = {'ok_per_s_ratio': round((r['ok_per_s'] or 0) / b['ok_per_s'], 3),
+                         'wall_ratio': round(r['wall_s'] / b['wall_s'], 3) if b['wall_s'] else None,
+                         'extra_sleep_s': round(r['sleep']['total_s'] - b['sleep']['total_s'], 3),
+                         'extra_backoff_s': round(r['sleep']['backoff_s'] - b['sleep']['backoff_s'], 3)}
+
+
+def _parse_faults(text: str) -> Dict[str, float]:
+    """'429=0.2,signin=0.05' -> {'429': 0.2, 'signin': 0.05}"""
+    faults = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        kind, _, rate = part.partition('=')
+        faults[kind.strip()] = float(rate)
+    return faults
+
+
+def _int_list(s: str) -> List[Optional[int]]:
+    return [int(x) if x.strip().lower() not in ('', 'auto', 'none') else None for x in s.split(',')]
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog='python -m benchmarks.run', description='AIO offline benchmark')
+    p.add_argument('--suites', default='checker,enrich,player', help=f"Chọn trong: {','.join(SUITES)}")
+    p.add_argument('--workers', default='2,4,8', type=_int_list)
+    p.add_argument('--batch-sizes', default='auto', type=_int_list, help='auto = để pipeline tự chọn')
+    p.add_argument('--items', type=int, default=60, help='Số video cho checker/enrich/download/player')
+    p.add_argument('--channel-videos', type=int, default=60, help='Số video của kênh giả (scraper)')
+    p.add_argument('--channel-shorts', type=int, default=20)
+    p.add_argument('--media-bytes', type=int, default=2_000_000)
+    p.add_argument('--latency-ms', type=float, default=0.0, help='Độ trễ nền của server giả')
+    p.add_argument('--media-conn-rate', type=float, default=0.0,
+                   help='byte/s tối đa mỗi kết nối media của server giả (0 = không giới hạn)')
+    p.add_argument('--downloaders', default='native', help=f"download suite: {','.join(DOWNLOADERS)}")
+    p.add_argument('--segments', type=int, default=8, help='Số kết nối / file cho downloader segmented')
+    p.add_argument('--profiles', default='clean', help=f"Fault profile: {','.join(FAULT_PROFILES)}")
+    p.add_argument('--faults', default=None, type=_parse_faults,
+                   help="Profile tuỳ chỉnh 'custom', vd. 429=0.2,timeout=0.02,slow=0.1,signin=0.05,truncate=0.03")
+    p.add_argument('--slow-ms', type=float, default=1500.0, help="Độ trễ thêm của fault 'slow'")
+    p.add_argument('--hang-s', type=float, default=30.0,
+                   help="Fault 'timeout' giữ kết nối bao lâu (socket_timeout của checker: 10s turbo, 20s safe)")
+    p.add_argument('--out', default=None, help='File JSON kết quả (mặc định bench_results_<time>.json)')
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    suites = [s.strip() for s in args.suites.split(',') if s.strip()]
+    unknown = [s for s in suites if s not in SUITES]
+    if unknown:
+        print(f'Unknown suites: {unknown}', file=sys.stderr)
+        return 2
+    profiles = {name: FAULT_PROFILES[name] for name in (p.strip() for p in args.profiles.split(','))
+                if name in FAULT_PROFILES}
+    if args.faults:
+        profiles['custom'] = args.faults
+    if not profiles:
+        print(f'Unknown profiles: {args.profiles}', file=sys.stderr)
+        return 2
+
+    from benchmarks import shim
+    server_args = ['--channel-videos', str(args.channel_videos), '--channel-shorts', str(args.channel_shorts),
+                   '--media-bytes', str(args.media_bytes), '--latency-ms', str(args.latency_ms),
+                   '--media-conn-rate', str(args.media_conn_rate)]
+    downloaders_arg = [d.strip() for d in args.downloaders.split(',') if d.strip()]
+    results = []
+    with ServerProcess(server_args) as server:
+        shim.install(server.base_url)
+        for profile, faults in profiles.items():
+            cfg_reply = server.call('/_config', post=True,
+                                    payload={'faults': faults, 'slow_ms': args.slow_ms, 'hang_s': args.hang_s})
+            if 'error' in cfg_reply:
+                print(f"Invalid faults for profile '{profile}': {cfg_reply['error']}", file=sys.stderr)
+                return 2
+            for suite in suites:
+                batches = args.batch_sizes if suite in BATCHED_SUITES else [None]
+                downloaders = [d for d in downloaders_arg if d in DOWNLOADERS] if suite == 'download' else [None]
+                for downloader, workers, batch_size in itertools.product(downloaders, args.workers, batches):
+                    cfg = {'profile': profile, 'workers': workers or 1, 'batch_size': batch_size,
+                           'items': args.items, 'downloader': downloader, 'segments': args.segments}
+                    row = run_config(suite, cfg, server)
+                    results.append(row)
+                    lat, req = row['latency_ms'], row['requests']
+                    print(f"{profile:9s} {suite:9s} {downloader or '':9s} workers={row['workers']:<3} batch={str(batch_size):<5} "
+                          f"{row['ok_per_s'] or 0:8.2f} ok/s  ok={row['ok']}/{row['items']}  "
+                          f"p50={lat['p50'] or 0:8.1f}ms p95={lat['p95'] or 0:8.1f}ms  "
+                          f"wasted={req['wasted']} safe={req['safe_mode']} backoff={row['sleep']['backoff_s']}s "
+                          f"sleep={row['sleep']['total_s']}s  "
+                          f"rss={row['peak_rss_mb']}MB cpu={row['cpu_pct']}%"
+                          + (f"  ERROR {row['error']}" if row['error'] else ''), file=sys.stderr)
+        shim.uninstall()
+    compare_to_clean(results)
+
+    import yt_dlp.version
+    report = {
+        'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+                 'yt_dlp': yt_dlp.version.__version__, 'ffmpeg': shim.ffmpeg_available(),
+                 'args': {k: v for k, v in vars(args).items()}, 'profiles': profiles},
+        'results': results,
+    }
+    out = args.out or f"bench_results_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps({'event': 'saved', 'path': out}), flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    if hasattr(os, 'fork'):
+        multiprocessing.set_start_method('fork', force=True)
+    sys.exit(main())
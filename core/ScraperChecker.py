@@ -6,14 +6,28 @@ import os
 import re
 import pandas as pd
 from datetime import datetime, timedelta
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 import yt_dlp
 import multiprocessing
-from typing import Callable, Optional, Union, List, Tuple, Dict, Any
+from typing import Callable, Optional, Union, List, Tuple, Dict, Any, Iterator
 import time
 import random
 from functools import lru_cache
 import threading
+from core import throttle
+from core import timing
+from core import metrics
+from core.autoscale import Autoscaler, run_bounded
+from core.download_queue import DownloadScheduler, DOWNLOAD_MAX_WORKERS
+from core.bandwidth import BandwidthBudget, format_rate
+from core.postprocess import AUDIO_FORMATS, PostProcessPool
+from core.prefetch import MetadataPrefetcher, PREFETCH_LOOKAHEAD
+from core.archive_index import DownloadIndex, youtube_id
+from core.download_journal import DownloadJournal, JOURNAL_NAME
+from core.download_progress import DownloadProgress
+from core.media_store import MediaStore, selector_key
+from core import segmented
+from core.download_tuning import DownloadTuner, ThroughputProbe, TUNING_NAME, tuning_key
 
 TOPIC_OVERRIDES = {
     "UCdW9arh-ckZrMW_wHu4xPYA": ("UCNqz53FCc3mUg5NyzHxsXGQ", "Quang Lê Official"),
@@ -149,6 +163,59 @@ class Utils:
         return "N/A"
 
 
+def _notify_items(item_callback: Optional[Callable[[dict], None]], items: List[dict]):
+    """Gửi từng kết quả item cho item_callback (CLI / job server), bỏ qua lỗi callback"""
+    if not item_callback:
+        return
+    for item in items:
+        try:
+            item_callback(item)
+        except Exception:
+            pass
+
+
+class DownloadTally:
+    """item_callback đếm kết quả từng lượt tải rồi chuyển tiếp cho callback thật.
+    run_downloader trả path báo cáo (None khi chỉ 1 mục / không còn gì để tải) -> CLI / job server dùng
+    `succeeded` / `partial` thay vì path để quyết định job thành công."""
+
+    def __init__(self, forward: Optional[Callable[[dict], None]] = None):
+        self.forward = forward
+        self.ok = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, item: dict):
+        status = str(item.get('Trạng thái') or '')
+        with self._lock:
+            if status == 'OK':
+                self.ok += 1
+            elif status.startswith('Error'):
+                self.failed += 1
+        if self.forward:
+            self.forward(item)
+
+    @property
+    def succeeded(self) -> bool:
+        """Không mục nào lỗi (kể cả batch đã tải hết từ trước), hoặc có ít nhất 1 mục tải được"""
+        return self.failed == 0 or self.ok > 0
+
+    @property
+    def partial(self) -> bool:
+        """Có mục tải được nhưng cũng có mục lỗi (cron cần phân biệt với lượt chạy sạch)"""
+        return self.ok > 0 and self.failed > 0
+
+
+def _pool_init(limiter: Optional[throttle.RateLimiter], counters: Optional[metrics.SharedCounters]):
+    """Initializer của worker process: dùng chung rate limit và bộ đếm metrics với process cha"""
+    throttle.install(limiter)
+    metrics.install(counters)
+
+
+def _pool_kwargs() -> Dict[str, Any]:
+    return {'initializer': _pool_init, 'initargs': (throttle.current(), metrics.current())}
+
+
 # ===== STABLE CACHING =====
 @lru_cache(maxsize=500)
 def _cached_normalize_input(channel: str) -> str:
@@ -163,8 +230,15 @@ def _cached_normalize_input(channel: str) -> str:
     return c
 
 
-def get_video_info(video_id: str, retries: int = 2, use_turbo: bool = True, cookies_file: Optional[str] = None, cookies_from_browser: Optional[str] = None) -> dict:
-    """Lấy thông tin video với retry và fallback modes"""
+def _backoff(seconds: float, timings: Optional[Dict[str, float]] = None):
+    """Sleep giữa các lần retry, ghi vào stage retry_backoff"""
+    time.sleep(seconds)
+    timing.add(timings, timing.STAGE_BACKOFF, seconds)
+
+
+def get_video_info(video_id: str, retries: int = 2, use_turbo: bool = True, cookies_file: Optional[str] = None, cookies_from_browser: Optional[str] = None,
+                   timings: Optional[Dict[str, float]] = None) -> dict:
+    """Lấy thông tin video với retry và fallback modes (timings: dict cộng dồn thời gian theo stage, xem core.timing)"""
 
     def _get_opts(turbo: bool, cookies: Optional[str], browser_cookies: Optional[str]) -> dict:
         opts = {
@@ -188,9 +262,11 @@ def get_video_info(video_id: str, retries: int = 2, use_turbo: bool = True, cook
     current_turbo = use_turbo
     for attempt in range(retries + 1):
         opts = _get_opts(current_turbo, cookies_file, cookies_from_browser)
+        timing.add(timings, timing.STAGE_RATE_WAIT, throttle.acquire())
         try:
             with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False)
+                with timing.measure(timings, timing.STAGE_EXTRACT), metrics.request():
+                    info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False)
                 if info:
                     # Fallback cho metadata
                     info.setdefault('title', f"https://www.youtube.com/watch?v={video_id}")
@@ -213,21 +289,22 @@ def get_video_info(video_id: str, retries: int = 2, use_turbo: bool = True, cook
             elif "live event will begin" in error_msg:
                 return {"error": "Upcoming livestream"}
             elif "429" in error_msg or "too many requests" in error_msg:
+                metrics.add('rate_limited_total')
                 if attempt < retries:
                     wait = 2 ** attempt  # exponential backoff
                     # Using a print statement for now, as log_func is not available here
                     print(f"[WARN] Rate limited, waiting {wait}s before retry...")
-                    time.sleep(wait)
+                    _backoff(wait, timings)
                     continue
                 return {"error": "Rate limited (429)"}
             elif attempt < retries:
-                time.sleep(random.uniform(1, 3))
+                _backoff(random.uniform(1, 3), timings)
                 continue
             else:
                 return {"error": f"Download error: {str(e)[:80]}"}
         except Exception as e:
             if attempt < retries:
-                time.sleep(random.uniform(0.5, 1.5))
+                _backoff(random.uniform(0.5, 1.5), timings)
                 continue
             return {"error": f"Unexpected error: {str(e)[:80]}"}
     
@@ -266,8 +343,9 @@ def get_channel_info_stable(channel_input: str, use_turbo: bool = True) -> Tuple
         ])
 
     for url in urls_to_try:
+        throttle.acquire()
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl, metrics.request():
                 data = ydl.extract_info(url, download=False)
                 if data and data.get('entries'):
                     title = data.get('uploader') or data.get('title') or title
@@ -307,8 +385,9 @@ def get_shorts_info_stable(channel_input: str, use_turbo: bool = True) -> Tuple[
         ])
 
     for url in urls_to_try:
+        throttle.acquire()
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl, metrics.request():
                 data = ydl.extract_info(url, download=False)
                 if data:
                     title = data.get('uploader') or data.get('title') or cid
@@ -341,11 +420,15 @@ def _scraper_worker_enhanced(args_batch: List[Tuple], batch_idx: int, tracker: P
         tracker.update(global_completed, current_item, batch_info)
 
         # Small delay để tránh rate limiting
-        time.sleep(random.uniform(0.5, 1.5))
+        item_timings: Dict[str, float] = {}
+        pause = random.uniform(0.5, 1.5)
+        time.sleep(pause)
+        timing.add(item_timings, timing.STAGE_RATE_WAIT, pause)
 
         try:
             start_time = time.time()
-            info = get_video_info(vid, retries=2, use_turbo=True, cookies_file=cookies_file, cookies_from_browser=cookies_from_browser)
+            info = get_video_info(vid, retries=2, use_turbo=True, cookies_file=cookies_file, cookies_from_browser=cookies_from_browser,
+                                  timings=item_timings)
             process_time = time.time() - start_time
 
             # Log thời gian xử lý
@@ -355,6 +438,7 @@ def _scraper_worker_enhanced(args_batch: List[Tuple], batch_idx: int, tracker: P
             info = {"error": f"Worker error: {str(e)[:50]}"}
             status_info = f"Error: {str(e)[:30]}"
 
+        parse_start = time.perf_counter()
         if not info or 'error' in info:
             result = {
                 'Số thứ tự': idx, 'Tên Kênh': title, 'ID Kênh': cid_input,
@@ -382,6 +466,8 @@ def _scraper_worker_enhanced(args_batch: List[Tuple], batch_idx: int, tracker: P
                 'Tình trạng': 'OK', 'Hình thức': ftype,
                 '_debug_info': status_info
             }
+        timing.add(item_timings, timing.STAGE_PARSE, time.perf_counter() - parse_start)
+        result['_timings'] = item_timings
 
         results.append(result)
 
@@ -396,19 +482,31 @@ def run_scraper(channel_input: str, out_folder: str,
                 turbo_mode: bool = True,
                 max_workers: int = None,
                 cookies_file: Optional[str] = None,
-                cookies_from_browser: Optional[str] = None) -> Optional[str]:
+                cookies_from_browser: Optional[str] = None,
+                item_callback: Optional[Callable[[dict], None]] = None,
+                batch_size: Optional[int] = None,
+                timings: Optional[timing.JobTimings] = None,
+                autoscale: bool = False,
+                autoscale_max: Optional[int] = None) -> Optional[str]:
     """
     ENHANCED SCRAPER với detailed progress tracking và ETA
     detail_callback: callback nhận dict với thông tin chi tiết
+    item_callback: callback nhận dict kết quả của từng video ngay khi batch xong
+    batch_size: số video mỗi batch (None = tự chọn theo tổng số video)
+    timings: JobTimings nhận histogram theo stage (None = tự tạo, chỉ log tóm tắt)
+    autoscale: tự chỉnh số worker trong lúc chạy (max_workers = điểm bắt đầu, autoscale_max = trần)
     """
+    timings = timings if timings is not None else timing.JobTimings('scraper')
 
     log_func and log_func(f'🚀 ENHANCED TURBO: Starting scrape {channel_input}', prefix='EnhancedScraper')
 
     # Get channel info
     try:
         log_func and log_func('📡 Fetching channel info...', prefix='EnhancedScraper')
-        s_title, s_items = get_shorts_info_stable(channel_input, use_turbo=turbo_mode)
-        u_title, u_items = get_channel_info_stable(channel_input, use_turbo=turbo_mode)
+        with timings.stage(timing.STAGE_LISTING):
+            s_title, s_items = get_shorts_info_stable(channel_input, use_turbo=turbo_mode)
+        with timings.stage(timing.STAGE_LISTING):
+            u_title, u_items = get_channel_info_stable(channel_input, use_turbo=turbo_mode)
     except Exception as e:
         log_func and log_func(f'❌ Channel info error: {str(e)}', prefix='EnhancedScraper')
         return None
@@ -459,7 +557,7 @@ def run_scraper(channel_input: str, out_folder: str,
     # Processing strategy
     if turbo_mode and total > 40:
         # BATCH PROCESSING
-        batch_size = min(20, max(8, total // 8))
+        batch_size = batch_size or min(20, max(8, total // 8))
         batches = [args[i:i + batch_size] for i in range(0, len(args), batch_size)]
 
         if max_workers is None:
@@ -470,28 +568,30 @@ def run_scraper(channel_input: str, out_folder: str,
             f'⚡ Batch processing: {len(batches)} batches, {max_workers} workers, {batch_size} items/batch',
             prefix='EnhancedScraper')
 
+        scaler = Autoscaler(max_workers, max_workers=autoscale_max, enabled=autoscale, tasks=len(batches),
+                            log_func=log_func, prefix='EnhancedScraper')
         try:
-            with ProcessPoolExecutor(max_workers=max_workers) as executor:
-                # Submit all batches
-                futures = {
-                    executor.submit(_scraper_worker_enhanced, batch, i, tracker, cookies_file, cookies_from_browser): i
-                    for i, batch in enumerate(batches)
-                }
+            with ProcessPoolExecutor(max_workers=scaler.max_workers, **_pool_kwargs()) as executor:
+                # Submit theo giới hạn in-flight của scaler (lấp chỗ ngay khi 1 batch xong)
+                calls = ((i, _scraper_worker_enhanced, (batch, i, tracker, cookies_file, cookies_from_browser))
+                         for i, batch in enumerate(batches))
 
                 done_batches = 0
 
-                for future in as_completed(futures):
+                for future, batch_idx in run_bounded(executor, calls, scaler):
                     if stop_event and stop_event.is_set():
                         executor.shutdown(cancel_futures=True)
                         return None
 
-                    batch_idx = futures[future]
                     batch = batches[batch_idx]
 
                     try:
                         batch_results = future.result(timeout=120)  # 2 phút timeout per batch
+                        scaler.record(batch_results)
                         if batch_results:
+                            timings.absorb(batch_results)
                             results.extend(batch_results)
+                            _notify_items(item_callback, batch_results)
 
                         # Update tracker
                         tracker.update(
@@ -505,6 +605,7 @@ def run_scraper(channel_input: str, out_folder: str,
                             prefix='EnhancedScraper')
 
                     except Exception as e:
+                        scaler.record(failed=len(batch))
                         log_func and log_func(f'⚠️ Batch {batch_idx + 1} failed: {str(e)[:100]}',
                                               prefix='EnhancedScraper')
 
@@ -539,31 +640,33 @@ def run_scraper(channel_input: str, out_folder: str,
             results = []
 
         max_workers = max_workers or min(multiprocessing.cpu_count(), total, 8)
+        scaler = Autoscaler(max_workers, max_workers=autoscale_max, enabled=autoscale, tasks=total,
+                            log_func=log_func, prefix='EnhancedScraper')
 
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            single_batches = [(([arg], 0, tracker)) for arg in args]
-            futures = {
-                executor.submit(_scraper_worker_enhanced, [batch[0]], batch[1], batch[2], cookies_file, cookies_from_browser): i
-                for i, batch in enumerate(single_batches)
-            }
+        with ProcessPoolExecutor(max_workers=scaler.max_workers, **_pool_kwargs()) as executor:
+            calls = ((i, _scraper_worker_enhanced, ([arg], 0, tracker, cookies_file, cookies_from_browser))
+                     for i, arg in enumerate(args))
 
             done = 0
 
-            for future in as_completed(futures):
+            for future, item_idx in run_bounded(executor, calls, scaler):
                 if stop_event and stop_event.is_set():
                     executor.shutdown(cancel_futures=True)
                     return None
 
                 try:
                     batch_results = future.result(timeout=45)
+                    scaler.record(batch_results)
                     if batch_results:
+                        timings.absorb(batch_results)
                         results.extend(batch_results)
+                        _notify_items(item_callback, batch_results)
 
                     # Update detailed progress
                     tracker.update(done + 1, f"Item {done + 1}/{total}", "Standard processing")
 
                 except Exception as e:
-                    item_idx = futures[future]
+                    scaler.record(failed=1)
                     log_func and log_func(f'⚠️ Item {item_idx + 1} failed: {str(e)[:50]}', prefix='EnhancedScraper')
 
                 done += 1
@@ -591,17 +694,18 @@ def run_scraper(channel_input: str, out_folder: str,
         results = retry_metadata_missing(results, retries=2, log_func=log_func, cookies_file=cookies_file, cookies_from_browser=cookies_from_browser)
 
     # Process results
-    df = pd.DataFrame(results)
+    with timings.stage(timing.STAGE_SERIALIZE):
+        df = pd.DataFrame(results)
 
-    if not df.empty:
-        # Remove debug info before saving
-        if '_debug_info' in df.columns:
-            df = df.drop('_debug_info', axis=1)
+        if not df.empty:
+            # Remove debug info before saving
+            if '_debug_info' in df.columns:
+                df = df.drop('_debug_info', axis=1)
 
-        # Remove duplicates
-        df = df.drop_duplicates(subset=['ID Video'], keep='first')
-        df = df.sort_values('Số thứ tự').reset_index(drop=True)
-        df['Số thứ tự'] = range(1, len(df) + 1)
+            # Remove duplicates
+            df = df.drop_duplicates(subset=['ID Video'], keep='first')
+            df = df.sort_values('Số thứ tự').reset_index(drop=True)
+            df['Số thứ tự'] = range(1, len(df) + 1)
 
     # Save file
     safe = Utils.sanitize_filename(title)
@@ -611,7 +715,8 @@ def run_scraper(channel_input: str, out_folder: str,
     path = os.path.join(out_folder, f"{safe}_Videos{suffix}.xlsx")
 
     try:
-        df.to_excel(path, index=False)
+        with timings.stage(timing.STAGE_EXCEL):
+            df.to_excel(path, index=False)
         success_count = len(df[df['Tình trạng'] == 'OK']) if 'Tình trạng' in df.columns else len(df)
         total_count = len(df)
         elapsed_time = tracker.get_elapsed()
@@ -619,6 +724,7 @@ def run_scraper(channel_input: str, out_folder: str,
         log_func and log_func(f'🎉 SUCCESS! Saved {success_count}/{total_count} videos in {elapsed_time}',
                               prefix='EnhancedScraper')
         log_func and log_func(f'📁 File: {path}', prefix='EnhancedScraper')
+        log_func and log_func(f'⏱️ Stages: {timings.summary()}', prefix='EnhancedScraper')
 
         return path
     except Exception as e:
@@ -627,6 +733,47 @@ def run_scraper(channel_input: str, out_folder: str,
 
 
 # ===== ENHANCED CHECKER với detailed progress =====
+CHECKER_COLUMNS = ['Số thứ tự', 'ID Kênh', 'Tên Kênh', 'ID Video', 'Tên Video', 'Thời Lượng', 'Ngày Xuất Bản',
+                   'Lượt View', 'Tình trạng', 'Hình thức']
+
+
+def _check_video(idx: int, vid: str, cookies_file: Optional[str] = None, cookies_from_browser: Optional[str] = None,
+                 item_timings: Optional[Dict[str, float]] = None) -> dict:
+    """Kiểm tra 1 video, trả về 1 dòng kết quả của checker (kèm '_timings' theo stage)"""
+    item_timings = item_timings if item_timings is not None else {}
+    try:
+        start_time = time.time()
+        info = get_video_info(vid, retries=2, use_turbo=True, cookies_file=cookies_file, cookies_from_browser=cookies_from_browser,
+                              timings=item_timings)
+        process_time = time.time() - start_time
+
+        status_info = f"Checked in {process_time:.1f}s"
+
+    except Exception as e:
+        info = {"error": f"Check error: {str(e)[:50]}"}
+        status_info = f"Error: {str(e)[:30]}"
+
+    parse_start = time.perf_counter()
+    status = 'OK' if info and 'error' not in info else f"Error: {info.get('error', 'N/A') if info else 'N/A'}"
+
+    row = {
+        'index': idx,
+        'ID Kênh': info.get('channel_id', 'N/A') if info and 'error' not in info else 'N/A',
+        'Tên Kênh': info.get('uploader', 'N/A') if info and 'error' not in info else 'N/A',
+        'ID Video': vid,
+        'Tên Video': info.get('title', 'N/A') if info and 'error' not in info else 'N/A',
+        'Thời Lượng': Utils.format_duration(info.get('duration')) if info and 'error' not in info else 'N/A',
+        'Ngày Xuất Bản': Utils.format_date(info.get('upload_date')) if info and 'error' not in info else 'N/A',
+        'Lượt View': info.get('view_count', 'N/A') if info and 'error' not in info else 'N/A',
+        'Tình trạng': status,
+        'Hình thức': 'Shorts' if info and info.get('duration', 0) and info.get('duration') <= 60 else 'Video',
+        '_debug_info': status_info
+    }
+    timing.add(item_timings, timing.STAGE_PARSE, time.perf_counter() - parse_start)
+    row['_timings'] = item_timings
+    return row
+
+
 def _checker_worker_enhanced(batch_items: List[Tuple[int, str]], batch_idx: int, tracker: ProgressTracker, cookies_file: Optional[str] = None, cookies_from_browser: Optional[str] = None) -> List[dict]:
     """Enhanced checker worker với progress tracking"""
     results = []
@@ -640,37 +787,28 @@ def _checker_worker_enhanced(batch_items: List[Tuple[int, str]], batch_idx: int,
         global_completed = tracker.completed + local_idx
         tracker.update(global_completed, current_item, batch_info)
 
-        time.sleep(random.uniform(0.5, 1.5))  # Rate limiting
+        pause = random.uniform(0.5, 1.5)
+        time.sleep(pause)  # Rate limiting
 
-        try:
-            start_time = time.time()
-            info = get_video_info(vid, retries=2, use_turbo=True, cookies_file=cookies_file, cookies_from_browser=cookies_from_browser)
-            process_time = time.time() - start_time
+        results.append(_check_video(idx, vid, cookies_file, cookies_from_browser,
+                                    item_timings={timing.STAGE_RATE_WAIT: pause}))
 
-            status_info = f"Checked in {process_time:.1f}s"
+    return results
 
-        except Exception as e:
-            info = {"error": f"Check error: {str(e)[:50]}"}
-            status_info = f"Error: {str(e)[:30]}"
 
-        status = 'OK' if info and 'error' not in info else f"Error: {info.get('error', 'N/A') if info else 'N/A'}"
-
-        result = {
-            'index': idx,
-            'ID Kênh': info.get('channel_id', 'N/A') if info and 'error' not in info else 'N/A',
-            'Tên Kênh': info.get('uploader', 'N/A') if info and 'error' not in info else 'N/A',
-            'ID Video': vid,
-            'Tên Video': info.get('title', 'N/A') if info and 'error' not in info else 'N/A',
-            'Thời Lượng': Utils.format_duration(info.get('duration')) if info and 'error' not in info else 'N/A',
-            'Ngày Xuất Bản': Utils.format_date(info.get('upload_date')) if info and 'error' not in info else 'N/A',
-            'Lượt View': info.get('view_count', 'N/A') if info and 'error' not in info else 'N/A',
-            'Tình trạng': status,
-            'Hình thức': 'Shorts' if info and info.get('duration', 0) and info.get('duration') <= 60 else 'Video',
-            '_debug_info': status_info
-        }
-        results.append(result)
+def checker_output_frame(results: List[dict]) -> pd.DataFrame:
+    """Chuẩn hoá danh sách kết quả checker thành DataFrame theo CHECKER_COLUMNS"""
+    df_out = pd.DataFrame(results)
 
-    return results
+    # Remove debug info
+    df_out = df_out.drop(columns=[c for c in ('_debug_info', '_timings') if c in df_out.columns])
+
+    df_out.insert(0, 'Số thứ tự', range(1, len(df_out) + 1))
+
+    for col in CHECKER_COLUMNS:
+        if col not in df_out.columns:
+            df_out[col] = 'N/A'
+    return df_out[CHECKER_COLUMNS]
 
 
 def retry_metadata_missing(results: List[dict], retries: int = 2, log_func: Optional[Callable] = None, cookies_file: Optional[str] = None, cookies_from_browser: Optional[str] = None) -> List[dict]:
@@ -731,8 +869,18 @@ def run_checker(fp: str, max_workers: int = 6,
                 stop_event: Optional[object] = None,
                 turbo_mode: bool = True,
                 cookies_file: Optional[str] = None,
-                cookies_from_browser: Optional[str] = None) -> Optional[str]:
-    """ENHANCED CHECKER với detailed progress"""
+                cookies_from_browser: Optional[str] = None,
+                item_callback: Optional[Callable[[dict], None]] = None,
+                batch_size: Optional[int] = None,
+                timings: Optional[timing.JobTimings] = None,
+                autoscale: bool = False,
+                autoscale_max: Optional[int] = None) -> Optional[str]:
+    """
+    ENHANCED CHECKER với detailed progress (batch_size=None: tự chọn theo tổng số video)
+    timings: JobTimings nhận histogram theo stage (None = tự tạo, chỉ log tóm tắt)
+    autoscale: tự chỉnh số worker trong lúc chạy (max_workers = điểm bắt đầu, autoscale_max = trần)
+    """
+    timings = timings if timings is not None else timing.JobTimings('checker')
 
     def read_input_file(fp: str) -> Optional[pd.DataFrame]:
         ext = os.path.splitext(fp)[1].lower()
@@ -774,31 +922,33 @@ def run_checker(fp: str, max_workers: int = 6,
 
     if turbo_mode and total > 15:
         # Batch processing
-        batch_size = min(15, max(5, total // 6))
+        batch_size = batch_size or min(15, max(5, total // 6))
         batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
-        max_workers = min(max_workers, len(batches), 6)
+        max_workers = max(1, min(max_workers, len(batches)))
 
         log_func and log_func(f'⚡ Batch checking: {len(batches)} batches, {max_workers} workers',
                               prefix='EnhancedChecker')
 
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            futures = {
-                executor.submit(_checker_worker_enhanced, batch, i, tracker, cookies_file, cookies_from_browser): i
-                for i, batch in enumerate(batches)
-            }
+        scaler = Autoscaler(max_workers, max_workers=autoscale_max, enabled=autoscale, tasks=len(batches),
+                            log_func=log_func, prefix='EnhancedChecker')
+        with ProcessPoolExecutor(max_workers=scaler.max_workers, **_pool_kwargs()) as executor:
+            calls = ((i, _checker_worker_enhanced, (batch, i, tracker, cookies_file, cookies_from_browser))
+                     for i, batch in enumerate(batches))
             done_batches = 0
 
-            for future in as_completed(futures):
+            for future, batch_idx in run_bounded(executor, calls, scaler):
                 if stop_event and stop_event.is_set():
                     executor.shutdown(cancel_futures=True)
                     return None
 
-                batch_idx = futures[future]
                 batch = batches[batch_idx]
 
                 try:
                     batch_results = future.result(timeout=90)
+                    scaler.record(batch_results)
+                    timings.absorb(batch_results)
                     results.extend(batch_results)
+                    _notify_items(item_callback, batch_results)
 
                     tracker.update(
                         done_batches * batch_size + len(batch),
@@ -810,6 +960,7 @@ def run_checker(fp: str, max_workers: int = 6,
                                           prefix='EnhancedChecker')
 
                 except Exception as e:
+                    scaler.record(failed=len(batch))
                     log_func and log_func(f'⚠️ Check batch {batch_idx + 1} error: {str(e)[:50]}',
                                           prefix='EnhancedChecker')
 
@@ -826,27 +977,29 @@ def run_checker(fp: str, max_workers: int = 6,
                         prefix='EnhancedChecker')
     else:
         # Standard processing
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            single_batches = [(([item], 0, tracker)) for item in items]
-            futures = {
-                executor.submit(_checker_worker_enhanced, [batch[0]], batch[1], batch[2], cookies_file, cookies_from_browser): i
-                for i, batch in enumerate(single_batches)
-            }
+        scaler = Autoscaler(max_workers, max_workers=autoscale_max, enabled=autoscale, tasks=total,
+                            log_func=log_func, prefix='EnhancedChecker')
+        with ProcessPoolExecutor(max_workers=scaler.max_workers, **_pool_kwargs()) as executor:
+            calls = ((i, _checker_worker_enhanced, ([item], 0, tracker, cookies_file, cookies_from_browser))
+                     for i, item in enumerate(items))
             done = 0
 
-            for future in as_completed(futures):
+            for future, _ in run_bounded(executor, calls, scaler):
                 if stop_event and stop_event.is_set():
                     executor.shutdown(cancel_futures=True)
                     return None
 
                 try:
                     batch_results = future.result(timeout=30)
+                    scaler.record(batch_results)
+                    timings.absorb(batch_results)
                     results.extend(batch_results)
+                    _notify_items(item_callback, batch_results)
 
                     tracker.update(done + 1, f"Checked item {done + 1}/{total}", "Standard check")
 
                 except:
-                    pass
+                    scaler.record(failed=1)
 
                 done += 1
                 if progress_callback:
@@ -862,29 +1015,22 @@ def run_checker(fp: str, max_workers: int = 6,
         log_func and log_func("🔄 Attempting to fix 'Metadata missing' items...", prefix='EnhancedChecker')
         results = retry_metadata_missing(results, retries=2, log_func=log_func, cookies_file=cookies_file, cookies_from_browser=cookies_from_browser)
 
-    df_out = pd.DataFrame(results)
-
-    # Remove debug info
-    if '_debug_info' in df_out.columns:
-        df_out = df_out.drop('_debug_info', axis=1)
-
-    df_out.insert(0, 'Số thứ tự', range(1, len(df_out) + 1))
-
-    cols = ['Số thứ tự', 'ID Kênh', 'Tên Kênh', 'ID Video', 'Tên Video', 'Thời Lượng', 'Ngày Xuất Bản', 'Lượt View',
-            'Tình trạng', 'Hình thức']
-    df_out = df_out[cols]
+    with timings.stage(timing.STAGE_SERIALIZE):
+        df_out = checker_output_frame(results)
 
     suffix = "_ENHANCED" if turbo_mode else "_STANDARD"
     out_path = os.path.splitext(fp)[0] + f'_checked{suffix}.xlsx'
 
     try:
-        df_out.to_excel(out_path, index=False)
+        with timings.stage(timing.STAGE_EXCEL):
+            df_out.to_excel(out_path, index=False)
         success_count = len(df_out[df_out['Tình trạng'] == 'OK']) if 'Tình trạng' in df_out.columns else 0
         elapsed_time = tracker.get_elapsed()
 
         log_func and log_func(f'🎉 CHECKER COMPLETE: {success_count}/{len(df_out)} OK in {elapsed_time}',
                               prefix='EnhancedChecker')
         log_func and log_func(f'📁 File: {out_path}', prefix='EnhancedChecker')
+        log_func and log_func(f'⏱️ Stages: {timings.summary()}', prefix='EnhancedChecker')
 
         return out_path
     except Exception as e:
@@ -893,6 +1039,19 @@ def run_checker(fp: str, max_workers: int = 6,
 
 
 # ===== Keep original download functions =====
+# audio_only: 'best' / 'm4a' / 'aac' / 'opus' chọn luồng audio gốc hợp container rồi remux (-acodec copy, vài giây
+# CPU / file); codec khác codec gốc (mp3, flac, ...) mới chuyển mã thật - trên pool hậu xử lý nếu có.
+_AUDIO_SELECTORS = {
+    'm4a': 'bestaudio[ext=m4a]/bestaudio[acodec^=mp4a]/bestaudio/best',
+    'aac': 'bestaudio[ext=m4a]/bestaudio[acodec^=mp4a]/bestaudio/best',
+    'opus': 'bestaudio[acodec=opus]/bestaudio/best',
+}
+
+
+def _audio_selector(audio_format: str) -> str:
+    return _AUDIO_SELECTORS.get(audio_format, 'bestaudio/best')
+
+
 def _build_ydl_opts_for_download(
         out_folder: str,
         quality: str = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best',
@@ -907,7 +1066,7 @@ def _build_ydl_opts_for_download(
         write_thumbnail: bool = False,
         add_metadata: bool = True,
         embed_thumbnail: bool = False,
-        download_archive_path: Optional[str] = None,
+        download_archive_path: Optional[Union[str, DownloadIndex]] = None,
         enable_aria2: bool = False,
         rate_limit: Optional[int] = None,
         throttled_rate: Optional[int] = None,
@@ -915,13 +1074,15 @@ def _build_ydl_opts_for_download(
         retries: int = 10,
         fragment_retries: int = 10,
         sleep_interval: Optional[float] = None,
-        max_sleep_interval: Optional[float] = None
+        max_sleep_interval: Optional[float] = None,
+        postprocessor_args: Optional[Dict[str, List[str]]] = None,
+        segment_connections: Optional[int] = None
 ) -> dict:
     os.makedirs(out_folder, exist_ok=True)
     outtmpl = os.path.join(out_folder, '%(uploader)s - %(title)s [%(id)s].%(ext)s')
     ydl_opts = {
         'outtmpl': outtmpl, 'quiet': True, 'no_warnings': True, 'restrictfilenames': False, 'windowsfilenames': True,
-        'noprogress': True, 'format': 'bestaudio/best' if audio_only else quality,
+        'noprogress': True, 'format': _audio_selector(preferred_audio_codec) if audio_only else quality,
         'concurrent_fragment_downloads': concurrent_frags, 'merge_output_format': None if audio_only else merge_to,
         'postprocessors': [], 'continuedl': True, 'retries': retries, 'fragment_retries': fragment_retries,
         'nocheckcertificate': True,
@@ -941,48 +1102,141 @@ def _build_ydl_opts_for_download(
     if enable_aria2:
         ydl_opts['external_downloader'] = 'aria2c'
         ydl_opts['external_downloader_args'] = ['-x16', '-k1M', '--file-allocation=none']
+    elif segment_connections and segmented.REGISTERED:
+        # bộ tải range song song trong tiến trình (core.segmented) cho format 1 file; DASH/HLS giữ native
+        ydl_opts['external_downloader'] = {'http': segmented.NAME}
+        ydl_opts['aio_segment_connections'] = int(segment_connections)
+    if postprocessor_args: ydl_opts['postprocessor_args'] = postprocessor_args
     if add_metadata: ydl_opts['postprocessors'].append({'key': 'FFmpegMetadata'})
     if write_thumbnail: ydl_opts['writethumbnail'] = True
     if embed_thumbnail: ydl_opts['postprocessors'].append({'key': 'EmbedThumbnail'})
     if audio_only:
+        # 'best': m4a/mp3/opus... giữ nguyên file, webm -> .opus bằng stream copy; codec trùng codec gốc -> copy
         ydl_opts['postprocessors'].append({
             'key': 'FFmpegExtractAudio', 'preferredcodec': preferred_audio_codec,
-            'preferredquality': preferred_audio_quality
+            'preferredquality': None if preferred_audio_codec == 'best' else preferred_audio_quality
         })
     return ydl_opts
 
 
+def _video_url(video: str) -> str:
+    return f'https://www.youtube.com/watch?v={video}' if re.match(r'^[0-9A-Za-z_-]{11}$', video) else video
+
+
+def _record_archive(archive: Optional[Union[str, DownloadIndex]], vid: str):
+    """Ghi 'youtube <id>' vào archive của thư mục tải cho mục không đi qua yt-dlp (lấy từ kho media)"""
+    if not archive:
+        return
+    if isinstance(archive, DownloadIndex):
+        archive.add(f'youtube {vid}')
+        return
+    with open(archive, 'a', encoding='utf-8') as f:
+        f.write(f'youtube {vid}\n')
+
+
 def download_video(
         video: str, out_folder: str = 'downloads',
         quality: str = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best',
         audio_only: bool = False, concurrent_frags: int = 8,
         cookies_file: Optional[str] = None, proxy: Optional[str] = None,
         cookies_from_browser: Optional[str] = None,
+        audio_format: str = 'mp3',
         write_thumbnail: bool = False, embed_thumbnail: bool = False,
-        add_metadata: bool = True, download_archive_path: Optional[str] = None,
+        add_metadata: bool = True, download_archive_path: Optional[Union[str, DownloadIndex]] = None,
         enable_aria2: bool = False, rate_limit: Optional[int] = None,
         throttled_rate: Optional[int] = None, http_chunk_size: Optional[int] = 10_485_760,
         retries: int = 10, fragment_retries: int = 10,
         sleep_interval: Optional[float] = None, max_sleep_interval: Optional[float] = None,
         progress_callback: Optional[Callable[[dict], None]] = None,
-        log_func: Optional[Callable[[str], None]] = None, stop_event: Optional[object] = None
-) -> Tuple[bool, Optional[str], Optional[str]]:
+        log_func: Optional[Callable[[str], None]] = None, stop_event: Optional[object] = None,
+        timings: Optional[Dict[str, float]] = None,
+        bandwidth: Optional[BandwidthBudget] = None,
+        postprocess_pool: Optional[PostProcessPool] = None,
+        prefetched_info: Optional[Dict[str, Any]] = None,
+        progress_log_interval: Optional[float] = 5.0,
+        media_store: Optional[MediaStore] = None,
+        segment_connections: Optional[int] = None,
+        tuner: Optional[DownloadTuner] = None
+) -> Union[Tuple[bool, Optional[str], Optional[str]], Future]:
+    """audio_format (audio_only): 'best' / 'm4a' / 'aac' / 'opus' = luồng audio gốc, chỉ remux; 'mp3' / 'flac' / ... = chuyển mã.
+    bandwidth: ngân sách băng thông chung của job; hook ngủ sau mỗi block để lượt này không vượt phần chia.
+    Với aria2c (không có hook theo block) phần chia lúc bắt đầu được truyền làm ratelimit.
+    postprocess_pool: tách bước FFmpeg (merge / extract audio / metadata / thumbnail) sang pool CPU; hàm trả về
+    ngay khi tải xong với Future -> (ok, path, err), thread gọi (slot mạng) rảnh để tải item kế tiếp.
+    prefetched_info: info đã extract + chọn format sẵn (core.prefetch) -> bỏ qua bước extract, tải ngay.
+    progress_log_interval: giây giữa 2 dòng log tiến độ (None = không log; run_downloader log tổng hợp qua DownloadProgress).
+    media_store: kho media chung (core.media_store) - đã có (ID, selector) thì hardlink/copy vào out_folder thay vì tải lại,
+    tải xong thì đưa vào kho.
+    segment_connections: tải format 1 file bằng N kết nối range song song (core.segmented) thay vì 1 kết nối.
+    tuner: tự chọn concurrent_frags / http_chunk_size theo (host, loại format) đã học (core.download_tuning); lượt tải
+    này đo throughput những giây đầu và báo lại cho tuner."""
     if not video: return False, None, 'Thiếu video ID/URL'
-    url = f'https://www.youtube.com/watch?v={video}' if re.match(r'^[0-9A-Za-z_-]{11}$', video) else video
+
+    def _result(ok: bool, path: Optional[str], err: Optional[str]):
+        if postprocess_pool is None:
+            return ok, path, err
+        fut = Future()
+        fut.set_result((ok, path, err))
+        return fut
+
+    store_vid = youtube_id(video) if media_store is not None else None
+    store_selector = selector_key(quality, audio_only, audio_format)
+    if store_vid:
+        hit = media_store.materialize(store_vid, store_selector, out_folder)
+        if hit:
+            _record_archive(download_archive_path, store_vid)
+            return _result(True, hit, None)
+
+    def _store(info, path: Optional[str]):
+        if media_store is None or not info or not path:
+            return
+        vid = store_vid or youtube_id(info.get('id') or '')
+        if vid:
+            media_store.put(vid, store_selector, path)
+
+    url = _video_url(video)
+    lease = bandwidth.lease(video) if bandwidth is not None else None
+    if lease is not None and enable_aria2 and bandwidth.share():
+        rate_limit = int(min(rate_limit or bandwidth.share(), bandwidth.share()))
     ydl_opts = _build_ydl_opts_for_download(
-        out_folder=out_folder, quality=quality, audio_only=audio_only,
+        out_folder=out_folder, quality=quality, audio_only=audio_only, preferred_audio_codec=audio_format,
         concurrent_frags=concurrent_frags, cookies_file=cookies_file, proxy=proxy,
         cookies_from_browser=cookies_from_browser,
         write_thumbnail=write_thumbnail, embed_thumbnail=embed_thumbnail, add_metadata=add_metadata,
         download_archive_path=download_archive_path, enable_aria2=enable_aria2,
         rate_limit=rate_limit, throttled_rate=throttled_rate, http_chunk_size=http_chunk_size,
         retries=retries, fragment_retries=fragment_retries, sleep_interval=sleep_interval,
-        max_sleep_interval=max_sleep_interval
+        max_sleep_interval=max_sleep_interval,
+        postprocessor_args=postprocess_pool.ffmpeg_args() if postprocess_pool is not None else None,
+        segment_connections=segment_connections
     )
 
+    bytes_seen: Dict[str, int] = {}
+    last_log = [0.0]
+    probe: List[Optional[ThroughputProbe]] = [None]
+    hook_lock = threading.Lock()  # core.segmented gọi hook từ nhiều thread segment
+
     def _hook(d):
         if stop_event and hasattr(stop_event, "is_set") and stop_event.is_set():
             raise yt_dlp.utils.DownloadError("Cancelled by user")
+        delta = 0
+        with hook_lock:
+            if probe[0] is not None:
+                probe[0].update(d)
+            if d.get('status') in ('downloading', 'finished'):
+                # Cộng phần byte mới của file này vào bộ đếm chung (tải lại từ đầu -> tính lại từ 0)
+                name = d.get('filename') or ''
+                got = d.get('downloaded_bytes') or d.get('total_bytes') or 0
+                seen = bytes_seen.get(name, 0)
+                delta = got - seen
+                # nhỏ hơn một chút: tick lệch thứ tự giữa các thread segment -> bỏ qua, không tính lại
+                if delta > 0 or got < seen // 2 or d.get('status') == 'finished':
+                    bytes_seen[name] = got
+        if delta > 0:
+            metrics.add('downloaded_bytes_total', delta)
+            if lease is not None:
+                # ngủ ngoài hook_lock: mỗi thread segment tự trả nợ băng thông của phần nó vừa báo
+                timing.add(timings, timing.STAGE_RATE_WAIT, lease.consume(delta, stop_event))
         if progress_callback:
             payload = {'phase': d.get('status')}
             if d.get('status') == 'downloading':
@@ -997,7 +1251,11 @@ def download_video(
                 progress_callback(payload)
             except Exception:
                 pass
-        if log_func and d.get('status') == 'downloading':
+        if log_func and progress_log_interval and d.get('status') == 'downloading':
+            now = time.time()
+            if now - last_log[0] < progress_log_interval:
+                return
+            last_log[0] = now
             info = []
             total = d.get('total_bytes') or d.get('total_bytes_estimate')
             if total and d.get('downloaded_bytes'):
@@ -1010,60 +1268,262 @@ def download_video(
             if d.get('eta'): info.append(f"ETA {d['eta']}s")
             if info: log_func('[Downloader] ' + ' | '.join(info))
 
+    pp_started: Dict[str, float] = {}
+
+    def _pp_hook(d):
+        # Thời gian từng post-processor (FFmpeg merge/extract audio/metadata...)
+        name = d.get('postprocessor') or ''
+        if d.get('status') == 'started':
+            if lease is not None:
+                lease.pause()  # FFmpeg không dùng mạng -> nhường phần băng thông cho lượt khác
+            pp_started[name] = time.perf_counter()
+        elif d.get('status') == 'finished' and name in pp_started:
+            timing.add(timings, timing.STAGE_POSTPROCESS, time.perf_counter() - pp_started.pop(name))
+
     ydl_opts['progress_hooks'] = [_hook]
+    if timings is not None or lease is not None:
+        ydl_opts['postprocessor_hooks'] = [_pp_hook]
+    if prefetched_info is None:  # đã qua rate limiter ở bước prefetch
+        timing.add(timings, timing.STAGE_RATE_WAIT, throttle.acquire(stop_event))
+
+    def _out_path(info) -> Optional[str]:
+        if not info:
+            return None
+        if info.get('filepath'):
+            return info['filepath']
+        # extract_info(download=True) trả info gốc: path thật (sau merge / post-process) nằm trong requested_downloads
+        done = [d.get('filepath') for d in info.get('requested_downloads') or [] if d.get('filepath')]
+        if done:
+            return done[-1]
+        if '_filename' in info:
+            return info.get('_filename')
+        ext = info.get('ext') or ('mp3' if audio_only else 'mp4')
+        return os.path.join(
+            out_folder,
+            f"{Utils.sanitize_filename(info.get('uploader', ''))} - "
+            f"{Utils.sanitize_filename(info.get('title', ''))} [{info.get('id', '')}].{ext}"
+        )
+
+    def _tune(info) -> Optional[ThroughputProbe]:
+        """Áp giá trị tuner chọn cho (host, loại format) của info đã chọn format; None nếu không chỉnh"""
+        if not info or info.get('_type', 'video') != 'video' or (bandwidth is not None and bandwidth.rate):
+            return None  # có cap băng thông thì throughput đo được là của cap, không phải của đường truyền
+        key = tuning_key(info)
+        if key[1] == 'progressive' and ydl_opts.get('external_downloader'):
+            return None  # aria2c / core.segmented tự chia range
+        frags, chunk = tuner.settings(key)
+        ydl.params['concurrent_fragment_downloads'] = frags
+        ydl.params['http_chunk_size'] = chunk
+        # YouTube gắn http_chunk_size riêng cho từng format (downloader_options), ưu tiên hơn params
+        for fmt in [info, *(info.get('formats') or []), *(info.get('requested_formats') or [])]:
+            opts = fmt.get('downloader_options')
+            if isinstance(opts, dict) and opts.get('http_chunk_size'):
+                opts['http_chunk_size'] = chunk
+        return tuner.probe(key, frags, chunk)
+
+    ydl = None
+    deferred: Dict[str, Any] = {}
+    archive_pending: List[Dict[str, Any]] = []
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            out_path = None
-            if info:
-                if '_filename' in info:
-                    out_path = info.get('_filename')
-                else:
-                    ext = info.get('ext') or ('mp3' if audio_only else 'mp4')
-                    out_path = os.path.join(
-                        out_folder,
-                        f"{Utils.sanitize_filename(info.get('uploader', ''))} - "
-                        f"{Utils.sanitize_filename(info.get('title', ''))} [{info.get('id', '')}].{ext}"
-                    )
-            return True, out_path, None
+        ydl = yt_dlp.YoutubeDL(ydl_opts)
+        if postprocess_pool is not None:
+            # yt-dlp ghi archive ngay sau post_process (lúc này mới chỉ được giữ lại) -> hoãn tới khi FFmpeg xong,
+            # hậu xử lý lỗi thì không ghi để lần sau tải lại
+            ydl.record_download_archive = archive_pending.append
+            # yt-dlp gọi self.post_process(...) ngay sau khi tải xong -> chỉ giữ tham số lại, chạy sau trên pool CPU
+            def _capture(filename, info, files_to_move=None):
+                info['filepath'] = filename
+                # copy: sau process_info yt-dlp xoá khỏi info các key trùng với info gốc
+                deferred.update(filename=filename, info=dict(info), files_to_move=dict(files_to_move or {}))
+                return info
+            ydl.post_process = _capture
+        if tuner is not None and prefetched_info is None:
+            # extract trước để biết host / loại format rồi mới chọn tham số tải
+            with timing.measure(timings, timing.STAGE_EXTRACT), metrics.request():
+                prefetched_info = ydl.extract_info(url, download=False)
+        if tuner is not None:
+            probe[0] = _tune(prefetched_info)
+        with timing.measure(timings, timing.STAGE_DOWNLOAD), metrics.request():
+            if tuner is not None and not prefetched_info:
+                info = None  # archive đã có / không có gì để tải
+            elif prefetched_info is not None:
+                info = ydl.process_ie_result(prefetched_info, download=True)
+            else:
+                info = ydl.extract_info(url, download=True)
+        if probe[0] is not None:
+            tuner.report(probe[0], ok=True)
     except Exception as e:
+        if probe[0] is not None and not (stop_event and hasattr(stop_event, "is_set") and stop_event.is_set()):
+            tuner.report(probe[0], ok=False)
+        if ydl is not None:
+            ydl.close()
         if log_func: log_func(f'[Downloader] Lỗi: {e}')
-        return False, None, str(e)
-
-
-def _expand_video_ids_from_url(url: str) -> List[str]:
-    flat_opts = {'quiet': True, 'extract_flat': True, 'skip_download': True, 'ignoreerrors': True,
-                 'nocheckcertificate': True}
-    ids: List[str] = []
+        return _result(False, None, str(e))
+    finally:
+        if lease is not None:
+            bandwidth.release(lease)
+
+    def _flush_archive():
+        for archived in archive_pending:
+            yt_dlp.YoutubeDL.record_download_archive(ydl, archived)
+
+    if not deferred:
+        _flush_archive()
+        ydl.close()
+        _store(info, _out_path(info))
+        return _result(True, _out_path(info), None)
+
+    def _postprocess() -> Tuple[bool, Optional[str], Optional[str]]:
+        try:
+            done = yt_dlp.YoutubeDL.post_process(ydl, deferred['filename'], deferred['info'], deferred['files_to_move'])
+            _flush_archive()
+            _store(done, _out_path(done))
+            return True, _out_path(done), None
+        except Exception as e:
+            if log_func: log_func(f'[Downloader] Lỗi hậu xử lý: {e}')
+            return False, None, f'Postprocessing: {e}'
+        finally:
+            ydl.close()
+
+    return postprocess_pool.submit(_postprocess)
+
+
+def _iter_flat_ids(ydl, url: str, stop_event: Optional[object], depth: int = 0) -> Iterator[str]:
+    data = ydl.extract_info(url, download=False, process=False)
+    if not data: return
+    if data.get('_type') in ('url', 'url_transparent') and data.get('url') and depth < 3:
+        yield from _iter_flat_ids(ydl, data['url'], stop_event, depth + 1)
+        return
+    entries = data.get('entries')
+    if entries is None:
+        vid = data.get('id')
+        if vid and re.match(r'^[0-9A-Za-z_-]{11}$', vid): yield vid
+        return
+    # entries của tab YouTube là generator: mỗi trang (continuation) chỉ được tải khi duyệt tới
+    for e in entries:
+        if stop_event and hasattr(stop_event, "is_set") and stop_event.is_set(): return
+        if not e: continue
+        vid = e.get('id')
+        if vid and re.match(r'^[0-9A-Za-z_-]{11}$', vid):
+            yield vid
+        elif e.get('url') and depth < 2:  # kênh -> các tab Videos / Shorts / Live
+            yield from _iter_flat_ids(ydl, e['url'], stop_event, depth + 1)
+
+
+def iter_video_ids_from_url(url: str, stop_event: Optional[object] = None,
+                            log_func: Optional[Callable[[str], None]] = None) -> Iterator[str]:
+    """Liệt kê ID video của playlist / kênh theo từng trang (generator): ID đầu tiên có ngay khi trang 1 về.
+    Không nhận ra ID nào -> trả về chính URL (để yt-dlp tự xử lý như 1 video)."""
+    flat_opts = {'quiet': True, 'extract_flat': 'in_playlist', 'lazy_playlist': True, 'skip_download': True,
+                 'ignoreerrors': True, 'nocheckcertificate': True}
+    count = 0
     try:
         with yt_dlp.YoutubeDL(flat_opts) as ydl:
-            data = ydl.extract_info(url, download=False)
-        if not data: return ids
-        entries = data.get('entries') or []
-        if entries:
-            for e in entries:
-                if not e: continue
-                vid = e.get('id')
-                if vid and re.match(r'^[0-9A-Za-z_-]{11}$', vid): ids.append(vid)
-        else:
-            vid = data.get('id')
-            if vid and re.match(r'^[0-9A-Za-z_-]{11}$', vid): ids.append(vid)
-    except Exception:
-        pass
-    return ids
+            for vid in _iter_flat_ids(ydl, url, stop_event):
+                count += 1
+                yield vid
+    except Exception as e:
+        if log_func: log_func(f'Lỗi liệt kê {url} (sau {count} mục): {e}')
+    if not count:
+        yield url
+
+
+def _is_collection_url(value: str) -> bool:
+    """URL cần liệt kê (playlist / kênh / trang khác); URL watch đơn lẻ lấy thẳng ID, không gọi mạng"""
+    return value.startswith('http') and ('list=' in value or not youtube_id(value))
+
+
+def _download_sources(input_value: Union[str, List[str], None], read_input_file: Callable,
+                      log: Callable[[str], None]) -> Optional[List[Tuple[str, float]]]:
+    """(ID/URL, priority) theo thứ tự input. Nhận: 1 chuỗi (nhiều ID/URL cách nhau bởi xuống dòng / dấu phẩy / khoảng trắng),
+    list, file .xlsx/.csv (cột 'ID Video' + 'Ưu tiên'/'Priority') hoặc file text (mỗi dòng 1 ID/URL, '#' là chú thích).
+    None nếu file không hợp lệ."""
+    if input_value is None: return []
+    if isinstance(input_value, (list, tuple)):
+        out: List[Tuple[str, float]] = []
+        for value in input_value:
+            part = _download_sources(str(value), read_input_file, log)
+            if part is None: return None
+            out.extend(part)
+        return out
+    if not isinstance(input_value, str):
+        log('Input không hợp lệ');
+        return None
+    s = input_value.strip()
+    if s and os.path.isfile(s):
+        ext = os.path.splitext(s)[1].lower()
+        if ext in ('.xls', '.xlsx', '.csv'):
+            df = read_input_file(s)
+            if df is None or 'ID Video' not in df.columns:
+                log('File không hợp lệ hoặc thiếu cột ID Video');
+                return None
+            prio_col = next((c for c in ('Ưu tiên', 'Priority') if c in df.columns), None)
+            df = df[df['ID Video'].astype(str).str.strip() != '']
+            prios = pd.to_numeric(df[prio_col], errors='coerce').fillna(0).tolist() if prio_col else [0.0] * len(df)
+            return [(str(x).strip(), float(p)) for x, p in zip(df['ID Video'].tolist(), prios)]
+        with open(s, 'r', encoding='utf-8-sig') as f:
+            lines = [line for line in f if not line.lstrip().startswith('#')]
+        return [(tok, 0.0) for line in lines for tok in re.split(r'[\s,;]+', line.strip()) if tok]
+    tokens = [tok for tok in re.split(r'[\s,;]+', s) if tok]
+    if any(os.path.isfile(tok) for tok in tokens):
+        return _download_sources(tokens, read_input_file, log)
+    return [(tok, 0.0) for tok in tokens]
 
 
 def run_downloader(
-        input_value: Union[str, List[str]], out_folder: str,
+        input_value: Optional[Union[str, List[str]]], out_folder: str,
         quality: str = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best',
         audio_only: bool = False, max_workers: int = 2, concurrent_frags: int = 8,
         cookies_file: Optional[str] = None, proxy: Optional[str] = None,
         cookies_from_browser: Optional[str] = None,
+        audio_format: str = 'mp3',
         progress_callback: Optional[Callable[[int, int], None]] = None,
         detail_callback: Optional[Callable[[dict], None]] = None,
         log_func: Optional[Callable[[str, str], None]] = None,
-        stop_event: Optional[object] = None, enable_aria2: bool = False, use_archive: bool = True
+        stop_event: Optional[object] = None, enable_aria2: bool = False, use_archive: bool = True,
+        item_callback: Optional[Callable[[dict], None]] = None,
+        timings: Optional[timing.JobTimings] = None,
+        order: str = 'fifo',
+        scheduler: Optional[DownloadScheduler] = None,
+        autoscale: bool = False,
+        autoscale_max: Optional[int] = None,
+        max_rate: Optional[Union[str, float]] = None,
+        bandwidth: Optional[BandwidthBudget] = None,
+        postprocess_workers: Optional[int] = None,
+        prefetch: int = PREFETCH_LOOKAHEAD,
+        use_journal: bool = True,
+        journal: Optional[Union[str, DownloadJournal]] = None,
+        resume: bool = False,
+        retry_failed: bool = False,
+        media_store: Optional[Union[str, MediaStore]] = None,
+        store_max_size: Optional[Union[str, int]] = None,
+        segment_connections: Optional[int] = None,
+        auto_tune: bool = False
 ) -> Optional[str]:
+    """
+    Tải danh sách video qua DownloadScheduler: max_workers lượt song song (tối đa DOWNLOAD_MAX_WORKERS),
+    lấp chỗ ngay khi 1 lượt xong. order='priority' dùng cột 'Ưu tiên'/'Priority' của file input (lớn chạy trước).
+    scheduler: truyền vào để đổi số lượt song song khi đang chạy (scheduler.set_concurrency), nếu không sẽ tự tạo.
+    max_rate / bandwidth: tổng băng thông của cả job ('5M', byte/s) chia động cho các lượt đang tải;
+    truyền BandwidthBudget để đổi khi đang chạy (bandwidth.set_rate).
+    postprocess_workers: số lượt FFmpeg song song trên pool CPU riêng (None = số core, 0 = chạy ngay trong slot tải như cũ).
+    prefetch: số item kế tiếp trong hàng đợi được extract + chọn format trước (0 = tắt).
+    use_journal / journal: trạng thái từng item lưu qua các phiên (core.download_journal, mặc định out_folder/download_queue.db);
+    resume=True chạy tiếp các mục chưa xong của phiên trước (input có thể rỗng), retry_failed=True chạy lại các mục lỗi.
+    input_value: ID/URL, nhiều ID/URL (list hoặc chuỗi nhiều dòng), file .xlsx/.csv hoặc file text trộn URL + ID.
+    Playlist / kênh được liệt kê theo từng trang trên thread riêng và đưa dần vào hàng đợi (tối đa scheduler.maxsize
+    mục chờ) -> video đầu tiên bắt đầu tải trong lúc các trang sau còn đang được liệt kê.
+    media_store / store_max_size: thư mục kho media dùng chung giữa các job (core.media_store, LRU theo dung lượng '200G');
+    mục đã có trong kho được hardlink/copy vào out_folder thay vì tải lại.
+    segment_connections: số kết nối range song song cho mỗi file (core.segmented, thay aria2c; None/0 = tắt).
+    auto_tune: concurrent_frags / http_chunk_size tự chỉnh theo throughput đo được, nhớ theo (host, loại format)
+    ở out_folder/download_tuning.json (core.download_tuning); concurrent_frags là điểm bắt đầu.
+    audio_format (audio_only): 'best' / 'm4a' / 'aac' / 'opus' lấy luồng audio gốc và chỉ remux, không chuyển mã;
+    'mp3' (mặc định) / 'flac' / ... chuyển mã trên pool hậu xử lý (postprocess_workers).
+    """
+    if audio_only and audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"audio_format phải là một trong {', '.join(AUDIO_FORMATS)}")
+    timings = timings if timings is not None else timing.JobTimings('downloader')
     os.makedirs(out_folder, exist_ok=True)
     archive_path = os.path.join(out_folder, 'download_archive.txt') if use_archive else None
 
@@ -1080,66 +1540,237 @@ def run_downloader(
         if ext == '.csv': return pd.read_csv(fp)
         return None
 
-    id_list: List[str] = []
-    if isinstance(input_value, list):
-        id_list = [str(x).strip() for x in input_value if str(x).strip()]
-    elif isinstance(input_value, str) and os.path.isfile(input_value):
-        df = read_input_file(input_value)
-        if df is None or 'ID Video' not in df.columns:
-            _log('File không hợp lệ hoặc thiếu cột ID Video');
-            return None
-        id_list = [str(x).strip() for x in df['ID Video'].tolist() if str(x).strip()]
-    elif isinstance(input_value, str):
-        s = input_value.strip()
-        if s.startswith('http'):
-            expanded = _expand_video_ids_from_url(s);
-            id_list = expanded if expanded else [s]
-        else:
-            id_list = [s]
-    else:
-        _log('Input không hợp lệ');
+    sources = _download_sources(input_value, read_input_file, _log)
+    if sources is None:
         return None
 
-    total = len(id_list)
-    if total == 0:
+    if journal is None and (use_journal or resume or retry_failed):
+        journal = os.path.join(out_folder, JOURNAL_NAME)
+    if journal is not None and not isinstance(journal, DownloadJournal):
+        journal = DownloadJournal(journal)
+    journal_items: List[Tuple[str, float]] = []
+    if journal is not None:
+        retry_ids = {vid for vid, _ in journal.failed()} if retry_failed else set()
+        if retry_ids:
+            journal.retry_failed()
+        interrupted = journal.reset_interrupted()
+        if resume or retry_ids:
+            journal_items = [(vid, prio) for vid, prio in journal.unfinished() if resume or vid in retry_ids]
+        st = journal.stats()
+        _log(f"Journal {journal.path}: {st['total']} mục | done {st['done']} | failed {st['failed']} | "
+             f"pending {st['pending']} (dở dang {interrupted}, thử lại {len(retry_ids)})")
+
+    if not sources and not journal_items:
         _log('Không có mục nào để tải');
+        if journal is not None:
+            journal.close()
         return None
-    if progress_callback: progress_callback(0, total)
 
-    results, done_counter = [], 0
-
-    def _task(vid):
-        return download_video(
-            vid, out_folder=out_folder, quality=quality, audio_only=audio_only,
-            concurrent_frags=concurrent_frags, cookies_file=cookies_file, proxy=proxy,
-            cookies_from_browser=cookies_from_browser,
-            progress_callback=detail_callback, log_func=_log, stop_event=stop_event,
-            download_archive_path=archive_path, enable_aria2=enable_aria2
+    # Archive + file đã có trong out_folder nạp 1 lần -> lọc ngay, không tạo YoutubeDL cho mục đã tải
+    index = DownloadIndex(out_folder, archive_path)
+    results: List[Dict[str, Any]] = []
+    total = 0
+    skipped = 0
+    done_counter = 0
+
+    pp_pool = PostProcessPool(postprocess_workers) if postprocess_workers != 0 else None
+    progress = DownloadProgress(emit=detail_callback, log_func=log_func)
+    tuner = DownloadTuner(frags=concurrent_frags, path=os.path.join(out_folder, TUNING_NAME),
+                          log_func=log_func) if auto_tune else None
+    own_store = isinstance(media_store, str)
+    if own_store:
+        media_store = MediaStore(media_store, max_bytes=store_max_size, log_func=log_func)
+    prefetcher = None
+    if prefetch:
+        prefetcher = MetadataPrefetcher(
+            _build_ydl_opts_for_download(
+                out_folder=out_folder, quality=quality, audio_only=audio_only, preferred_audio_codec=audio_format,
+                concurrent_frags=concurrent_frags, cookies_file=cookies_file, proxy=proxy, cookies_from_browser=cookies_from_browser,
+                download_archive_path=index, enable_aria2=enable_aria2
+            ),
+            lookahead=prefetch, url_for=_video_url, stop_event=stop_event, log_func=log_func
         )
+    pp_pending: Dict[Future, Tuple[str, Dict[str, float]]] = {}
+    halt = threading.Event()
+
+    def _stopped() -> bool:
+        return halt.is_set() or bool(stop_event and hasattr(stop_event, "is_set") and stop_event.is_set())
 
-    if total == 1 or max_workers <= 1:
-        ok, path, err = _task(id_list[0]);
+    def _task(vid):
+        """Slot mạng: trả về (kết quả hoặc Future của bước FFmpeg, timings của item)"""
+        item_timings: Dict[str, float] = {}
+        info = None
+        # tick của yt-dlp chỉ cập nhật bộ gộp (+ journal); detail_callback nhận snapshot tổng hợp theo nhịp
+        item_detail = progress.hook(vid)
+        if journal is not None:
+            journal.mark(vid, 'extracting')
+            update_progress = item_detail
+
+            def item_detail(d):
+                if d.get('phase') == 'downloading':
+                    journal.progress(vid, d.get('downloaded'), d.get('total'))
+                update_progress(d)
+        if prefetcher is not None:
+            info = prefetcher.take(vid, item_timings)
+            prefetcher.refill(scheduler.peek(prefetcher.lookahead))
+        try:
+            res = download_video(
+                vid, out_folder=out_folder, quality=quality, audio_only=audio_only, audio_format=audio_format,
+                concurrent_frags=concurrent_frags, cookies_file=cookies_file, proxy=proxy,
+                cookies_from_browser=cookies_from_browser,
+                progress_callback=item_detail, log_func=_log, stop_event=stop_event,
+                download_archive_path=index, enable_aria2=enable_aria2, timings=item_timings,
+                bandwidth=bandwidth, postprocess_pool=pp_pool, prefetched_info=info, progress_log_interval=None,
+                media_store=media_store, segment_connections=segment_connections, tuner=tuner
+            )
+        except Exception as e:
+            res = (False, None, str(e))
+        finally:
+            progress.finish(vid)
+        return res, item_timings
+
+    def _finish(vid, res, item_timings):
+        nonlocal done_counter
+        ok, path, err = res
+        timings.observe_all(item_timings)
+        if journal is not None:
+            if ok:
+                journal.mark(vid, 'done', path=path)
+            elif _stopped():
+                journal.mark(vid, 'pending')  # bị dừng giữa chừng -> phiên sau tải tiếp (.part còn giữ)
+            else:
+                journal.mark(vid, 'failed', error=err)
         done_counter += 1
         if progress_callback: progress_callback(done_counter, total)
-        results.append({'ID/URL': id_list[0], 'Trạng thái': 'OK' if ok else f'Error: {err}', 'Đường dẫn': path})
-    else:
-        workers = max(1, min(max_workers, 4))
-        with ThreadPoolExecutor(max_workers=workers) as ex:
-            futures = {ex.submit(_task, vid): vid for vid in id_list}
-            for fut in as_completed(futures):
-                vid = futures[fut]
-                ok, path, err = fut.result();
-                done_counter += 1
-                if progress_callback: progress_callback(done_counter, total)
-                results.append({'ID/URL': vid, 'Trạng thái': 'OK' if ok else f'Error: {err}', 'Đường dẫn': path})
-
-    if total == 1: return None
+        results.append({'ID/URL': vid, 'Trạng thái': 'OK' if ok else f'Error: {err}', 'Đường dẫn': path})
+        _notify_items(item_callback, results[-1:])
+        scheduler.scaler.record(results[-1:])
+
+    def _collect_postprocessed(block: bool = False):
+        """Ghi nhận các item đã xong bước FFmpeg (block=True: chờ hết)"""
+        for f in [f for f in pp_pending if block or f.done()]:
+            vid, item_timings = pp_pending.pop(f)
+            _finish(vid, f.result(), item_timings)
+
+    seen = set()
+
+    def _enqueue(vid: str, priority: float, block: bool):
+        """1 mục mới: bỏ trùng / đã tải, ghi journal, đưa vào hàng đợi (block=True: chờ khi hàng đợi đầy)"""
+        nonlocal total, skipped
+        if vid in seen:
+            return
+        seen.add(vid)
+        if journal is not None:
+            journal.add_many([vid], [priority])
+        if index.has_video(vid):
+            skipped += 1
+            results.append({'ID/URL': vid, 'Trạng thái': 'Skipped (đã tải)', 'Đường dẫn': None})
+            if journal is not None:
+                journal.mark(vid, 'done')
+            return
+        if not scheduler.add(vid, priority, block=block):
+            return
+        total += 1
+        if progress_callback: progress_callback(done_counter, total)
+        if prefetcher is not None:
+            prefetcher.refill(scheduler.peek(prefetcher.lookahead))
+
+    def _produce():
+        """Thread nạp hàng đợi: ID trần vào ngay, playlist / kênh được liệt kê từng trang trong lúc đã tải"""
+        try:
+            for value, priority in sources:
+                if _stopped(): break
+                if _is_collection_url(value):
+                    before = total + skipped
+                    for vid in iter_video_ids_from_url(value, stop_event=stop_event, log_func=_log):
+                        if _stopped(): break
+                        _enqueue(vid, priority, block=True)
+                    _log(f'Đã liệt kê {value}: {total + skipped - before} mục')
+                else:
+                    _enqueue(youtube_id(value) or value, priority, block=False)
+            for vid, priority in journal_items:
+                if _stopped(): break
+                _enqueue(vid, priority, block=False)
+        except Exception as e:
+            _log(f'Lỗi đọc input: {e}')
+        finally:
+            scheduler.close()
+            if skipped:
+                _log(f'Bỏ qua {skipped}/{total + skipped} mục đã có trong archive / thư mục tải')
+
+    # Tuần tự (max_workers <= 1) hay song song đều đi qua scheduler -> không bỏ sót item nào
+    if bandwidth is None:
+        bandwidth = BandwidthBudget(max_rate, log_func=log_func)
+    elif max_rate is not None:
+        bandwidth.set_rate(max_rate, reason='job')
+    if scheduler is None:
+        scheduler = DownloadScheduler(max_workers, order=order, autoscale=autoscale,
+                                      autoscale_max=autoscale_max, log_func=log_func)
+    if progress_callback: progress_callback(0, 0)
+    pp_info = f'FFmpeg pool {pp_pool.workers}x{pp_pool.ffmpeg_threads} threads' if pp_pool else 'FFmpeg inline'
+    _log(f'Hàng đợi: {len(sources) + len(journal_items)} input, {scheduler.concurrency} lượt song song, '
+         f'thứ tự {scheduler.order}, băng thông {format_rate(bandwidth.rate)}, {pp_info}')
+    producer = threading.Thread(target=_produce, name='aio-dl-input', daemon=True)
+    producer.start()
+    try:
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_MAX_WORKERS, thread_name_prefix='aio-dl') as ex:
+            for fut, vid in scheduler.run(ex, _task):
+                res, item_timings = fut.result()
+                if isinstance(res, Future):
+                    pp_pending[res] = (vid, item_timings)
+                    if journal is not None and not res.done():
+                        journal.mark(vid, 'postprocessing')
+                else:
+                    _finish(vid, res, item_timings)
+                _collect_postprocessed()
+                if _stopped():
+                    dropped = scheduler.clear()
+                    if dropped:
+                        _log(f'Đã dừng: bỏ {dropped} mục chưa tải')
+        if pp_pending:
+            _log(f'Tải xong, chờ {len(pp_pending)} mục đang hậu xử lý FFmpeg...')
+        _collect_postprocessed(block=True)
+    finally:
+        halt.set()
+        scheduler.clear()
+        producer.join(timeout=5)
+        progress.stop()
+        if pp_pool is not None:
+            pp_pool.shutdown()
+        if prefetcher is not None:
+            prefetcher.shutdown()
+            _log(prefetcher.summary())
+        if tuner is not None:
+            tuner.save()
+            _log(f'Tuning: {tuner.summary()}')
+        if media_store is not None:
+            _log(f'Media store: {media_store.summary()}')
+            if own_store:
+                media_store.close()
+        index.close()
+        if journal is not None:
+            st = journal.stats()
+            _log(f"Journal: done {st['done']} | failed {st['failed']} | pending {st['pending']}")
+            journal.close()
+
+    if total == 0:
+        _log('Tất cả các mục đã được tải trước đó' if skipped else 'Không có mục nào để tải')
+        return None
+    if bandwidth.rate and bandwidth.throttled_seconds:
+        _log(f'Bandwidth: {bandwidth.total_bytes / 1024 / 1024:.1f}MB, giữ nhịp {bandwidth.throttled_seconds:.1f}s '
+             f'(cap {format_rate(bandwidth.rate)})')
+    if len(results) == 1:
+        _log(f'Stages: {timings.summary()}')
+        return None
     try:
-        df_out = pd.DataFrame(results);
-        df_out.insert(0, 'Số thứ tự', range(1, len(df_out) + 1))
+        with timings.stage(timing.STAGE_SERIALIZE):
+            df_out = pd.DataFrame(results);
+            df_out.insert(0, 'Số thứ tự', range(1, len(df_out) + 1))
         out_report = os.path.join(out_folder, 'Download_Report.xlsx');
-        df_out.to_excel(out_report, index=False)
+        with timings.stage(timing.STAGE_EXCEL):
+            df_out.to_excel(out_report, index=False)
         _log(f'Đã lưu báo cáo: {out_report}');
+        _log(f'Stages: {timings.summary()}')
         return out_report
     except Exception as e:
         _log(f'Lỗi lưu báo cáo: {e}');
@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+"""
+core/__main__.py
+Headless CLI cho AIO (không import flet) - chạy trên server/cron:
+
+    python -m core scrape   <channel> --out <folder> [--workers N]
+    python -m core check    <file.xlsx|.csv> [--workers N]
+    python -m core download <id|url|file> [...] --out <folder> [--workers N]
+    python -m core enrich   <id|url|file> [...] [--out-excel path] [--workers N]
+    python -m core serve    [--port 8765] [--max-jobs N] [--worker-budget N] [--rate R]
+
+    Chia việc checker nhiều máy (queue: sqlite:///path.db hoặc http://coordinator:8766):
+    python -m core shard-enqueue <file> --queue Q
+    python -m core shard-serve   --queue sqlite:///q.db [--port 8766]
+    python -m core shard-work    --queue Q [--workers N] [--batch N] [--lease S]
+    python -m core shard-status  --queue Q
+    python -m core shard-merge   --queue Q [--out file.xlsx]
+
+Mỗi sự kiện (log / progress / detail / item / timings / result) được ghi ra stdout dưới dạng
+một dòng JSON. --timings <file.json|.csv> xuất thêm histogram theo stage qua performance_monitor.
+--metrics-port N phơi OpenMetrics tại http://127.0.0.1:N/metrics trong lúc job chạy; --metrics-file <path>
+ghi cùng nội dung ra file (định kỳ + lần cuối khi kết thúc). Exit code: 0 = thành công, 1 = job lỗi/không có kết quả,
+2 = sai tham số, 3 = download xong một phần (có mục lỗi), 130 = bị dừng (SIGINT/SIGTERM).
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import contextlib
+from typing import Any, Dict, List, Optional
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_PARTIAL = 3
+EXIT_INTERRUPTED = 130
+
+
+class JsonLinesEmitter:
+    """Ghi sự kiện ra stream dạng JSON lines (thread-safe, flush từng dòng)"""
+
+    def __init__(self, stream=None, detail_interval: float = 0.0):
+        self.stream = stream or sys.stdout
+        self.detail_interval = detail_interval
+        self._lock = threading.Lock()
+        self._last_detail = 0.0
+
+    def emit(self, event: str, **fields):
+        record = {'event': event, 'ts': round(time.time(), 3)}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            try:
+                self.stream.write(line + "\n")
+                self.stream.flush()
+            except (BrokenPipeError, ValueError):
+                pass
+
+    # ---- callbacks truyền vào run_* ----
+    def log(self, msg, prefix=''):
+        self.emit('log', prefix=str(prefix).strip('[]'), msg=str(msg))
+
+    def progress(self, done, total=0, *_):
+        self.emit('progress', done=done, total=total)
+
+    def detail(self, data: Dict[str, Any]):
+        now = time.time()
+        if self.detail_interval and now - self._last_detail < self.detail_interval:
+            return
+        self._last_detail = now
+        self.emit('detail', **(data if isinstance(data, dict) else {'data': data}))
+
+    def item(self, data: Dict[str, Any]):
+        self.emit('item', data=data)
+
+
+def _cookies_kwargs(args) -> Dict[str, Any]:
+    return {
+        'cookies_file': args.cookies or None,
+        'cookies_from_browser': args.cookies_from_browser or None,
+    }
+
+
+def _autoscale_kwargs(args) -> Dict[str, Any]:
+    return {'autoscale': args.autoscale, 'autoscale_max': args.autoscale_max}
+
+
+def _cmd_scrape(args, em: JsonLinesEmitter, stop_event: threading.Event):
+    from core.ScraperChecker import run_scraper
+    return run_scraper(
+        args.channel, args.out, log_func=em.log,
+        progress_callback=em.progress, detail_callback=em.detail, item_callback=em.item,
+        stop_event=stop_event, turbo_mode=not args.standard, max_workers=args.workers,
+        timings=args.job_timings, **_autoscale_kwargs(args), **_cookies_kwargs(args)
+    )
+
+
+def _cmd_check(args, em: JsonLinesEmitter, stop_event: threading.Event):
+    from core.ScraperChecker import run_checker
+    return run_checker(
+        args.file, max_workers=args.workers,
+        progress_callback=em.progress, detail_callback=em.detail, item_callback=em.item,
+        log_func=em.log, stop_event=stop_event, turbo_mode=not args.standard,
+        timings=args.job_timings, **_autoscale_kwargs(args), **_cookies_kwargs(args)
+    )
+
+
+def _cmd_download(args, em: JsonLinesEmitter, stop_event: threading.Event):
+    from core.ScraperChecker import DownloadTally, run_downloader
+    if not args.inputs and not (args.resume or args.retry_failed):
+        raise ValueError('download cần input hoặc --resume / --retry-failed')
+    input_value = args.inputs[0] if len(args.inputs) == 1 else list(args.inputs)
+    tally = DownloadTally(em.item)
+    report = run_downloader(
+        input_value, args.out, quality=args.quality, audio_only=args.audio_only, audio_format=args.audio_format,
+        max_workers=args.workers, concurrent_frags=args.frags, proxy=args.proxy,
+        progress_callback=em.progress, detail_callback=em.detail, item_callback=tally,
+        log_func=em.log, stop_event=stop_event, enable_aria2=args.aria2,
+        use_archive=not args.no_archive, timings=args.job_timings, order=args.order, max_rate=args.limit_rate,
+        postprocess_workers=args.pp_workers, prefetch=args.prefetch,
+        use_journal=not args.no_journal, resume=args.resume, retry_failed=args.retry_failed,
+        media_store=args.store or None, store_max_size=args.store_max, segment_connections=args.segments or None,
+        auto_tune=args.auto_tune,
+        **_autoscale_kwargs(args), **_cookies_kwargs(args)
+    )
+    args.failed_items = tally.failed
+    # 1 mục / đã tải hết từ trước -> không có báo cáo, kết quả là thư mục tải
+    return (report or args.out) if tally.succeeded else None
+
+
+def _cmd_enrich(args, em: JsonLinesEmitter, stop_event: threading.Event):
+    from core.enricher import enrich
+    input_value = args.inputs[0] if len(args.inputs) == 1 else list(args.inputs)
+    df, saved = enrich(
+        input_value, max_workers=args.workers, include_transcript=not args.no_transcript,
+        out_excel=args.out_excel, progress=em.progress, log=em.log, item_callback=em.item,
+        timings=args.job_timings, transcript_workers=args.transcript_workers, transcript_rate=args.transcript_rate,
+        metadata_rate=args.metadata_rate,
+        **_autoscale_kwargs(args)
+    )
+    if args.out_excel:
+        return saved
+    return f"{len(df)} rows" if len(df) else None
+
+
+def _cmd_serve(args, em: JsonLinesEmitter, stop_event: threading.Event):
+    from core.job_server import serve
+    serve(root=args.root, host=args.host, port=args.port, max_jobs=args.max_jobs,
+          worker_budget=args.worker_budget, rate=args.rate, burst=args.burst,
+          log_func=em.log, stop_event=stop_event)
+    return args.root
+
+
+def _cmd_shard_enqueue(args, em: JsonLinesEmitter, stop_event: threading.Event):
+    from core.sharding import open_queue, enqueue_checker_file
+    queue = open_queue(args.queue)
+    n = enqueue_checker_file(args.file, queue, log_func=em.log)
+    em.emit('stats', **queue.stats())
+    return n
+
+
+def _cmd_shard_serve(args, em: JsonLinesEmitter, stop_event: threading.Event):
+    from core.sharding import open_queue, make_queue_server
+    queue = open_queue(args.queue)
+    server = make_queue_server(queue, args.host, args.port, token=args.token)
+    threading.Thread(target=lambda: (stop_event.wait(), server.shutdown()), daemon=True).start()
+    em.log(f'Queue {args.queue} on http://{args.host}:{server.server_address[1]}', prefix='ShardCoordinator')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        queue.close()
+    return args.queue
+
+
+def _cmd_shard_work(args, em: JsonLinesEmitter, stop_event: threading.Event):
+    from core import throttle
+    from core.sharding import open_queue, run_shard_worker
+    if args.rate:
+        throttle.install(throttle.RateLimiter(args.rate))
+    n = run_shard_worker(
+        open_queue(args.queue, token=args.token), max_workers=args.workers, batch_size=args.batch,
+        lease_seconds=args.lease, idle_exit=not args.wait, progress_callback=em.progress,
+        log_func=em.log, stop_event=stop_event, item_callback=em.item, timings=args.job_timings,
+        **_cookies_kwargs(args)
+    )
+    return f'{n} items' if n or not args.wait else None
+
+
+def _cmd_shard_status(args, em: JsonLinesEmitter, stop_event: threading.Event):
+    from core.sharding import open_queue
+    queue = open_queue(args.queue, token=args.token)
+    queue.requeue_expired()
+    stats = queue.stats()
+    em.emit('stats', **stats)
+    return stats['total'] or None
+
+
+def _cmd_shard_merge(args, em: JsonLinesEmitter, stop_event: threading.Event):
+    from core.sharding import open_queue, merge_results
+    return merge_results(open_queue(args.queue), args.out, log_func=em.log)
+
+
+def _emit_timings(args, em: JsonLinesEmitter):
+    """Sự kiện 'timings' + (tuỳ chọn) file export qua performance_monitor"""
+    snap = args.job_timings.snapshot()
+    if not snap['stages']:
+        return
+    em.emit('timings', **snap)
+    if args.timings:
+        from performance_monitor import PerformanceMonitor
+        monitor = args.monitor or PerformanceMonitor()
+        monitor.add_timings(args.job_timings)
+        monitor.export_timings(args.timings)
+    elif args.monitor:
+        args.monitor.add_timings(args.job_timings)
+
+
+def _start_metrics(args, em: JsonLinesEmitter):
+    """--metrics-port / --metrics-file: PerformanceMonitor nhận item/progress của job và xuất OpenMetrics"""
+    if not (args.metrics_port or args.metrics_file) or args.command == 'serve':
+        return None, None
+    from performance_monitor import PerformanceMonitor
+    monitor = args.monitor = PerformanceMonitor()
+    monitor.watch_timings(args.job_timings)
+    em.item = monitor.wrap_item(args.command, em.item)
+    em.progress = monitor.wrap_progress(args.command, em.progress)
+    server = writer = None
+    if args.metrics_port:
+        server = monitor.serve_metrics(args.metrics_port)
+        em.emit('metrics', url=f'http://127.0.0.1:{server.server_address[1]}/metrics')
+    if args.metrics_file:
+        writer = monitor.start_metrics_file(args.metrics_file, args.metrics_interval)
+        em.emit('metrics', file=args.metrics_file)
+    return server, writer
+
+
+def _stop_metrics(args, server, writer):
+    if writer:
+        writer.set()
+        args.monitor.write_metrics(args.metrics_file)
+    if server:
+        server.shutdown()
+        server.server_close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python -m core',
+        description='AIO headless: scrape / check / download / enrich, xuất JSON lines ra stdout.'
+    )
+    parser.add_argument('--detail-interval', type=float, default=1.0,
+                        help='Khoảng cách tối thiểu (giây) giữa 2 sự kiện detail (0 = không giới hạn)')
+    parser.add_argument('--timings', help='Xuất histogram thời gian theo stage ra file .json/.csv')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Phơi metrics OpenMetrics tại http://127.0.0.1:PORT/metrics (serve: dùng GET /metrics)')
+    parser.add_argument('--metrics-file', help='Ghi metrics OpenMetrics ra file (textfile collector)')
+    parser.add_argument('--metrics-interval', type=float, default=15.0, help='Chu kỳ ghi --metrics-file (giây)')
+    sub = parser.add_subparsers(dest='command', required=True)
+    from core.postprocess import AUDIO_FORMATS  # module nhẹ (không kéo yt-dlp / pandas)
+
+    def add_cookies(p):
+        p.add_argument('--cookies', help='Đường dẫn cookies.txt')
+        p.add_argument('--cookies-from-browser', help='chrome, firefox, edge, ...')
+
+    def add_autoscale(p):
+        p.add_argument('--autoscale', action='store_true',
+                       help='Tự chỉnh số worker theo items/s, lỗi/429 và CPU/RAM (--workers là điểm bắt đầu)')
+        p.add_argument('--autoscale-max', type=int, default=None, help='Trần số worker khi autoscale (mặc định 2x --workers)')
+
+    def add_shard_token(p):
+        p.add_argument('--token', default=os.environ.get('AIO_SHARD_TOKEN'),
+                       help='Token chung giữa coordinator và worker HTTP (mặc định $AIO_SHARD_TOKEN)')
+
+    p = sub.add_parser('scrape', help='Scrape toàn bộ video/shorts của kênh')
+    p.add_argument('channel', help='URL / ID / @handle của kênh')
+    p.add_argument('--out', default='.', help='Thư mục xuất')
+    p.add_argument('--workers', type=int, default=None)
+    p.add_argument('--standard', action='store_true', help='Tắt Enhanced/turbo mode')
+    add_cookies(p)
+    add_autoscale(p)
+    p.set_defaults(func=_cmd_scrape)
+
+    p = sub.add_parser('check', help="Kiểm tra file .xlsx/.csv có cột 'ID Video'")
+    p.add_argument('file')
+    p.add_argument('--workers', type=int, default=6)
+    p.add_argument('--standard', action='store_true', help='Tắt Enhanced/turbo mode')
+    add_cookies(p)
+    add_autoscale(p)
+    p.set_defaults(func=_cmd_check)
+
+    p = sub.add_parser('download', help='Tải video/audio')
+    p.add_argument('inputs', nargs='*', help='ID/URL video, playlist/kênh (nhiều input được), file .xlsx/.csv hoặc .txt (mỗi dòng 1 ID/URL)')
+    p.add_argument('--out', default='downloads', help='Thư mục tải về')
+    p.add_argument('--resume', action='store_true',
+                   help='Chạy tiếp các mục chưa xong trong <out>/download_queue.db của phiên trước')
+    p.add_argument('--retry-failed', action='store_true', help='Chạy lại các mục lỗi trong download_queue.db')
+    p.add_argument('--no-journal', action='store_true', help='Không ghi trạng thái hàng đợi ra download_queue.db')
+    p.add_argument('--quality', default='bestvideo[ext=mp4]+bestaudio[ext=m4a]/best')
+    p.add_argument('--audio-only', action='store_true')
+    p.add_argument('--audio-format', default='mp3', choices=AUDIO_FORMATS,
+                   help='Với --audio-only: best/m4a/aac/opus = luồng audio gốc, chỉ remux (nhẹ CPU); '
+                        'mp3/vorbis/flac/alac/wav = chuyển mã')
+    p.add_argument('--workers', type=int, default=2, help='Số lượt tải song song (1 = tuần tự, tối đa 16)')
+    p.add_argument('--order', choices=['fifo', 'priority'], default='fifo',
+                   help="Thứ tự tải; priority dùng cột 'Ưu tiên'/'Priority' của file input")
+    p.add_argument('--frags', type=int, default=8, help='concurrent fragments / download')
+    p.add_argument('--limit-rate', default=None,
+                   help='Tổng băng thông cho cả job, chia động cho các lượt đang tải (vd: 5M, 800K)')
+    p.add_argument('--pp-workers', type=int, default=None,
+                   help='Số lượt FFmpeg (merge/MP3) song song trên pool CPU riêng (mặc định = số core, 0 = chạy trong slot tải)')
+    p.add_argument('--prefetch', type=int, default=4,
+                   help='Extract + chọn format trước cho N mục kế tiếp trong hàng đợi (0 = tắt)')
+    p.add_argument('--store', default=os.environ.get('AIO_MEDIA_STORE'),
+                   help='Kho media dùng chung giữa các thư mục/job: mục đã có được hardlink/copy thay vì tải lại '
+                        '(mặc định $AIO_MEDIA_STORE)')
+    p.add_argument('--store-max', default=None, help='Dung lượng tối đa của kho, xoá mục dùng lâu nhất khi vượt (vd: 200G)')
+    p.add_argument('--proxy')
+    p.add_argument('--aria2', action='store_true', help='Dùng aria2c nếu có')
+    p.add_argument('--segments', type=int, default=0,
+                   help='Tải mỗi file (format 1 file) bằng N kết nối range song song trong tiến trình, thay aria2c (0 = tắt)')
+    p.add_argument('--auto-tune', action='store_true',
+                   help='Tự chỉnh --frags / http chunk size theo throughput đo được, nhớ theo host + loại format')
+    p.add_argument('--no-archive', action='store_true', help='Không dùng download_archive.txt')
+    add_cookies(p)
+    add_autoscale(p)
+    p.set_defaults(func=_cmd_download)
+
+    p = sub.add_parser('enrich', help='Lấy metadata chi tiết (tags, chapters, transcript...)')
+    p.add_argument('inputs', nargs='+', help='ID/URL video hoặc file .xlsx/.csv')
+    p.add_argument('--out-excel', help='Đường dẫn file Excel kết quả')
+    p.add_argument('--workers', type=int, default=8)
+    p.add_argument('--no-transcript', action='store_true')
+    p.add_argument('--transcript-workers', type=int, default=4,
+                   help='Số luồng riêng của tầng transcript (--workers chỉ áp cho tầng metadata)')
+    p.add_argument('--transcript-rate', type=float, default=None, help='Giới hạn request transcript/giây')
+    p.add_argument('--metadata-rate', type=float, default=None, help='Giới hạn request metadata/giây')
+    add_autoscale(p)
+    p.set_defaults(func=_cmd_enrich)
+
+    p = sub.add_parser('serve', help='Chạy job server HTTP cục bộ (hàng đợi job dùng chung)')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8765)
+    p.add_argument('--root', default='aio_jobs', help='Thư mục chứa input/kết quả của các job')
+    p.add_argument('--max-jobs', type=int, default=2, help='Số job chạy song song')
+    p.add_argument('--worker-budget', type=int, default=16, help='Tổng số worker chia cho các job đang chạy')
+    p.add_argument('--rate', type=float, default=None, help='Giới hạn request/giây toàn host')
+    p.add_argument('--burst', type=int, default=1)
+    p.set_defaults(func=_cmd_serve)
+
+    p = sub.add_parser('shard-enqueue', help='Coordinator: đưa file checker vào queue dùng chung')
+    p.add_argument('file')
+    p.add_argument('--queue', required=True)
+    p.set_defaults(func=_cmd_shard_enqueue)
+
+    p = sub.add_parser('shard-serve', help='Coordinator: phơi queue SQLite qua HTTP cho worker máy khác')
+    p.add_argument('--queue', required=True)
+    p.add_argument('--host', default='127.0.0.1', help='0.0.0.0 để worker máy khác kết nối (cần --token)')
+    p.add_argument('--port', type=int, default=8766)
+    add_shard_token(p)
+    p.set_defaults(func=_cmd_shard_serve)
+
+    p = sub.add_parser('shard-work', help='Worker: lease item từ queue và kiểm tra')
+    p.add_argument('--queue', required=True)
+    p.add_argument('--workers', type=int, default=6)
+    p.add_argument('--batch', type=int, default=20, help='Số item mỗi lần lease')
+    p.add_argument('--lease', type=float, default=180, help='Thời hạn lease (giây)')
+    p.add_argument('--wait', action='store_true', help='Không thoát khi queue rỗng, chờ item mới')
+    p.add_argument('--rate', type=float, default=None, help='Giới hạn request/giây của host này')
+    add_shard_token(p)
+    add_cookies(p)
+    p.set_defaults(func=_cmd_shard_work)
+
+    p = sub.add_parser('shard-status', help='Thống kê queue')
+    p.add_argument('--queue', required=True)
+    add_shard_token(p)
+    p.set_defaults(func=_cmd_shard_status)
+
+    p = sub.add_parser('shard-merge', help='Ghép kết quả thành 1 file Excel')
+    p.add_argument('--queue', required=True)
+    p.add_argument('--out')
+    p.set_defaults(func=_cmd_shard_merge)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit as e:
+        return EXIT_USAGE if e.code else EXIT_OK
+
+    # stdout chỉ dành cho JSON lines; mọi print() lạc (yt-dlp, warning) chuyển sang stderr
+    em = JsonLinesEmitter(sys.stdout, detail_interval=args.detail_interval)
+    stop_event = threading.Event()
+
+    def _on_signal(signum, _frame):
+        em.emit('signal', signal=signum)
+        stop_event.set()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            signal.signal(sig, _on_signal)
+        except (ValueError, OSError):
+            pass
+
+    from core.timing import JobTimings
+    args.job_timings = JobTimings(args.command)
+    args.monitor = None
+    args.failed_items = 0
+
+    em.emit('start', command=args.command, pid=os.getpid())
+    started = time.time()
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            metrics_server, metrics_writer = _start_metrics(args, em)
+            try:
+                result = args.func(args, em, stop_event)
+            finally:
+                _emit_timings(args, em)
+                _stop_metrics(args, metrics_server, metrics_writer)
+    except Exception as e:
+        em.emit('error', error=f"{type(e).__name__}: {e}")
+        return EXIT_FAILED
+
+    elapsed = round(time.time() - started, 3)
+    if stop_event.is_set():
+        em.emit('result', ok=False, stopped=True, output=result, elapsed=elapsed)
+        return EXIT_INTERRUPTED
+    if result and args.failed_items:
+        em.emit('result', ok=False, partial=True, failed=args.failed_items, output=result, elapsed=elapsed)
+        return EXIT_PARTIAL
+    em.emit('result', ok=bool(result), output=result, elapsed=elapsed)
+    return EXIT_OK if result else EXIT_FAILED
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+core/archive_index.py
+Index trong RAM cho download_archive.txt + các file đã có trong thư mục tải, nạp 1 lần trước khi xếp hàng.
+
+- DownloadIndex(out_folder, archive_path): đọc archive ("youtube <id>" mỗi dòng) và quét out_folder theo phần
+  `[<id>]` của outtmpl ('%(uploader)s - %(title)s [%(id)s].%(ext)s') -> set.
+- has_video(id|url): lọc ngay các ID đã tải trước khi tạo YoutubeDL / extract.
+- Truyền chính index làm `download_archive` cho YoutubeDL: yt-dlp nhận object không phải path như 1 set
+  (`in` / `.add`) -> không đọc lại file archive mỗi lượt tải, và mọi dòng mới đi qua 1 thread ghi duy nhất.
+"""
+import os
+import re
+import queue
+import threading
+from typing import Optional, Set
+
+_FILE_ID = re.compile(r'\[([0-9A-Za-z_-]{6,})\]\.[0-9A-Za-z]+$')
+_PARTIAL_EXTS = ('.part', '.ytdl', '.temp', '.tmp')
+_YOUTUBE_ID = re.compile(r'^[0-9A-Za-z_-]{11}$')
+_YOUTUBE_URL_ID = re.compile(r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/)([0-9A-Za-z_-]{11})')
+
+
+def youtube_id(video: str) -> Optional[str]:
+    """ID YouTube từ ID trần / URL watch, youtu.be, shorts...; None nếu không nhận ra"""
+    video = (video or '').strip()
+    if _YOUTUBE_ID.match(video):
+        return video
+    m = _YOUTUBE_URL_ID.search(video)
+    return m.group(1) if m else None
+
+
+class DownloadIndex:
+    """Set các archive id ('youtube <id>') + ID của file đã có; dùng được làm download_archive của yt-dlp"""
+
+    def __init__(self, out_folder: str, archive_path: Optional[str] = None, scan: bool = True):
+        self.out_folder = out_folder
+        self.archive_path = archive_path
+        self._archive: Set[str] = set()
+        self._file_ids: Set[str] = set()
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        if archive_path:
+            self._load_archive(archive_path)
+        if scan:
+            self._scan(out_folder)
+
+    # ---- nạp ----
+    def _load_archive(self, path: str):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._archive.update(line.strip() for line in f if line.strip())
+        except FileNotFoundError:
+            pass
+
+    def _scan(self, folder: str):
+        try:
+            entries = list(os.scandir(folder))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            name = entry.name
+            if name.endswith(_PARTIAL_EXTS) or not entry.is_file():
+                continue
+            m = _FILE_ID.search(name)
+            if m:
+                self._file_ids.add(m.group(1))
+
+    # ---- tra cứu ----
+    def has_video(self, video: str) -> bool:
+        vid = youtube_id(video)
+        if not vid:
+            return False
+        with self._lock:
+            return f'youtube {vid}' in self._archive or vid in self._file_ids
+
+    # ---- giao diện set cho yt-dlp (YoutubeDL.archive) ----
+    def __contains__(self, archive_id: str) -> bool:
+        with self._lock:
+            if archive_id in self._archive:
+                return True
+            return archive_id.rpartition(' ')[2] in self._file_ids
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._archive | {f'youtube {v}' for v in self._file_ids})
+
+    def __bool__(self) -> bool:
+        return True  # yt-dlp bỏ qua kiểm tra archive khi `not self.archive`
+
+    def add(self, archive_id: str):
+        """Ghi nhận 1 item tải xong (yt-dlp gọi qua record_download_archive) -> thread ghi duy nhất append"""
+        with self._lock:
+            if archive_id in self._archive:
+                return
+            self._archive.add(archive_id)
+            if not self.archive_path:
+                return
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name='archive-writer', daemon=True)
+                self._writer.start()
+        self._queue.put(archive_id)
+
+    def close(self):
+        """Chờ ghi hết các dòng archive đang chờ"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join(timeout=10)
+            self._writer = None
+
+    def _write_loop(self):
+        with open(self.archive_path, 'a', encoding='utf-8') as f:
+            while True:
+                line = self._queue.get()
+                if line is None:
+                    break
+                f.write(line + '\n')
+                f.flush()
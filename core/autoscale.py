@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+core/autoscale.py
+Tự chỉnh số việc chạy song song (in-flight) trong lúc job chạy, thay cho số worker cố định.
+
+- Autoscaler: mỗi cửa sổ `interval` giây đo items/s, tỉ lệ lỗi (429 / timeout / sign-in / metadata missing)
+  và CPU/RAM còn trống, rồi quyết định:
+    * gặp 429 -> giảm một nửa; lỗi >= error_threshold -> giảm 1; CPU/RAM quá ngưỡng -> giảm 1
+    * còn lại -> thăm dò tăng dần (+step) tới khi throughput không còn cải thiện thì lùi lại 1 và giữ một lúc
+  Mọi quyết định được log (prefix của job) và lưu trong `history`.
+- run_bounded(): thay cho "submit hết rồi as_completed" - chỉ giữ `scaler.inflight()` future chạy cùng lúc,
+  lấp chỗ trống ngay khi 1 future xong, nên giới hạn mới có hiệu lực ngay ở lần submit kế tiếp.
+
+Tắt autoscale (enabled=False) thì limit cố định = số worker ban đầu, hành vi như cũ.
+"""
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import psutil
+except ImportError:  # psutil là tuỳ chọn cho core; không có thì bỏ qua điều kiện tài nguyên
+    psutil = None
+
+from core import metrics
+
+AUTOSCALE_INTERVAL = 15.0   # giây / cửa sổ đo
+AUTOSCALE_MAX = 32          # trần mặc định
+ERROR_THRESHOLD = 0.2       # tỉ lệ lỗi (trên số item của cửa sổ) bắt đầu giảm
+MIN_GAIN = 0.05             # tăng worker phải cải thiện >= 5% items/s mới giữ
+CPU_LIMIT = 90.0
+MEMORY_LIMIT = 90.0
+PLATEAU_HOLD = 4            # số cửa sổ giữ nguyên sau khi chạm trần throughput / sau khi giảm
+
+# Nhóm lỗi (core.metrics.classify_error) coi là tín hiệu quá tải / bị chặn
+_PRESSURE_CLASSES = ('rate_limited', 'timeout', 'sign_in', 'metadata_missing')
+
+
+class Autoscaler:
+    """Hill-climbing trên items/s, lùi nhanh khi có lỗi / hết tài nguyên. Thread-safe."""
+
+    def __init__(self, start: int, min_workers: int = 1, max_workers: Optional[int] = None,
+                 enabled: bool = True, interval: float = AUTOSCALE_INTERVAL, step: int = 1,
+                 tasks: Optional[int] = None, log_func: Optional[Callable] = None, prefix: str = 'Autoscale'):
+        """start: số worker ban đầu; max_workers=None -> min(AUTOSCALE_MAX, 2 x start); tasks: trần theo số việc"""
+        self.enabled = enabled
+        self.min_workers = max(1, min_workers)
+        start = max(self.min_workers, int(start or 1))
+        ceiling = int(max_workers or (min(AUTOSCALE_MAX, start * 2) if enabled else start))
+        if tasks:
+            start, ceiling = min(start, max(1, tasks)), min(ceiling, max(1, tasks))
+        self.max_workers = max(start, ceiling)
+        self.limit = start
+        self.interval = interval
+        self.step = max(1, step)
+        self.log_func = log_func
+        self.prefix = prefix
+        self.history: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._items = 0
+        self._errors = 0
+        self._rate_limited_seen = _rate_limited_total()
+        self._prev_rate: Optional[float] = None
+        self._last_action = 'start'
+        self._hold = 0
+        if psutil is not None:
+            psutil.cpu_percent(None)
+        if enabled:
+            self._log(f'🎚️ Autoscale on: start {self.limit}, range {self.min_workers}-{self.max_workers}, '
+                      f'window {interval:.0f}s')
+
+    def inflight(self) -> int:
+        """Số future tối đa được giữ cùng lúc. Khi tắt autoscale giữ thêm 1 lượt chờ để pool không rảnh."""
+        return self.limit if self.enabled else self.limit * 2
+
+    def record(self, rows: Optional[Iterable[dict]] = None, failed: int = 0):
+        """Ghi nhận 1 lần hoàn thành (batch kết quả hoặc số việc lỗi), có thể đổi limit"""
+        items = errors = failed
+        for row in rows or []:
+            items += 1
+            if isinstance(row, dict):
+                status = row.get('Tình trạng', row.get('Trạng thái', row.get('error')))
+                if metrics.classify_error(status) in _PRESSURE_CLASSES:
+                    errors += 1
+        with self._lock:
+            self._items += items
+            self._errors += errors
+        self.maybe_adjust()
+
+    def maybe_adjust(self) -> int:
+        if not self.enabled:
+            return self.limit
+        with self._lock:
+            now = time.time()
+            elapsed = now - self._window_start
+            if elapsed < self.interval or self._items == 0:
+                return self.limit
+            items, errors = self._items, self._errors
+            rate = items / elapsed
+            rate_limited = _rate_limited_total()
+            throttled = rate_limited - self._rate_limited_seen
+            self._rate_limited_seen = rate_limited
+            self._window_start, self._items, self._errors = now, 0, 0
+            cpu = psutil.cpu_percent(None) if psutil is not None else 0.0
+            mem = psutil.virtual_memory().percent if psutil is not None else 0.0
+            old = self.limit
+            new, action, reason = self._decide(rate, errors / items, throttled, cpu, mem)
+            self.limit = max(self.min_workers, min(self.max_workers, new))
+            self._prev_rate = rate
+            self._last_action = action if self.limit != old else 'hold'
+            decision = {'ts': round(now, 3), 'from': old, 'to': self.limit, 'action': self._last_action,
+                        'reason': reason, 'items_per_s': round(rate, 3), 'error_ratio': round(errors / items, 3),
+                        'rate_limited': int(throttled), 'cpu': cpu, 'memory': mem}
+            self.history.append(decision)
+        arrow = f'{old} → {self.limit}' if self.limit != old else f'{old} (hold)'
+        self._log(f'🎚️ Workers {arrow}: {reason} | {rate:.2f} items/s | err {errors}/{items} | '
+                  f'429 {int(throttled)} | CPU {cpu:.0f}% | RAM {mem:.0f}%')
+        return self.limit
+
+    def _decide(self, rate: float, error_ratio: float, throttled: float, cpu: float, mem: float) -> Tuple[int, str, str]:
+        limit = self.limit
+        if throttled > 0:
+            self._hold = PLATEAU_HOLD
+            return max(self.min_workers, limit // 2), 'down', 'rate limited (429)'
+        if error_ratio >= ERROR_THRESHOLD:
+            self._hold = PLATEAU_HOLD
+            return limit - 1, 'down', f'error ratio {error_ratio:.0%}'
+        if cpu >= CPU_LIMIT or mem >= MEMORY_LIMIT:
+            self._hold = PLATEAU_HOLD
+            return limit - 1, 'down', 'no CPU/RAM headroom'
+        if self._last_action == 'up' and self._prev_rate is not None and rate < self._prev_rate * (1 + MIN_GAIN):
+            self._hold = PLATEAU_HOLD
+            return limit - self.step, 'down', 'no throughput gain, step back'
+        if self._hold > 0:
+            self._hold -= 1
+            return limit, 'hold', 'holding'
+        if limit >= self.max_workers:
+            return limit, 'hold', 'at max'
+        return limit + self.step, 'up', 'probing'
+
+    def set_limit(self, limit: int, reason: str = 'manual') -> int:
+        """Đặt limit từ bên ngoài (người dùng kéo slider...), nới trần nếu cần; áp dụng ở lần submit kế tiếp"""
+        with self._lock:
+            old = self.limit
+            self.limit = max(self.min_workers, int(limit))
+            self.max_workers = max(self.max_workers, self.limit)
+            self._hold = PLATEAU_HOLD
+            self.history.append({'ts': round(time.time(), 3), 'from': old, 'to': self.limit, 'action': 'set',
+                                 'reason': reason})
+        if self.limit != old:
+            self._log(f'🎚️ Workers {old} → {self.limit}: {reason}')
+        return self.limit
+
+    def summary(self) -> str:
+        changes = [d for d in self.history if d['from'] != d['to']]
+        return f'workers {self.limit} (range {self.min_workers}-{self.max_workers}, {len(changes)} changes)'
+
+    def _log(self, msg: str):
+        if self.log_func:
+            try:
+                self.log_func(msg, prefix=self.prefix)
+            except Exception:
+                pass
+
+
+def _rate_limited_total() -> float:
+    return metrics.current().snapshot()['rate_limited_total']
+
+
+def run_bounded(executor, calls: Iterable[Tuple[Any, Callable, tuple]], scaler: Autoscaler,
+                poll: float = 0.5) -> Iterator[Tuple[Any, Any]]:
+    """Submit (key, fn, args) theo giới hạn in-flight của scaler; yield (future, key) khi xong.
+    Vòng lặp gọi tự kiểm tra stop_event sau mỗi future như với as_completed."""
+    pending = iter(calls)
+    inflight: Dict[Any, Any] = {}
+    exhausted = False
+    while True:
+        while not exhausted and len(inflight) < scaler.inflight():
+            try:
+                key, fn, args = next(pending)
+            except StopIteration:
+                exhausted = True
+                break
+            inflight[executor.submit(fn, *args)] = key
+        if not inflight:
+            return
+        done, _ = wait(list(inflight), timeout=poll, return_when=FIRST_COMPLETED)
+        for fut in done:
+            yield fut, inflight.pop(fut)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+core/bandwidth.py
+Ngân sách băng thông chung cho cả job tải (thay cho rate_limit cố định của từng lượt tải).
+
+- BandwidthBudget(rate): tổng byte/s cho mọi lượt tải đang chạy; rate=None -> không giới hạn (chỉ đo).
+- Mỗi lượt tải giữ 1 lease (`with budget.lease(vid) as lease`); progress hook gọi lease.consume(delta_bytes)
+  sau mỗi block -> thread đang tải (kể cả các thread fragment của concurrent_frags) ngủ vừa đủ để lượt đó
+  không vượt phần được chia.
+- Phần chia = rate / số lượt đang thực sự nhận dữ liệu: lượt đã xong, đang post-process hoặc đứng yên
+  quá `stall_seconds` không được tính -> phần của nó dồn cho các lượt còn lại ngay ở block kế tiếp.
+- set_rate() đổi tổng ngân sách khi đang chạy (GUI / job server), áp dụng từ block kế tiếp.
+
+    budget = BandwidthBudget(parse_rate('5M'))
+    with budget.lease(vid) as lease:
+        ... hook: lease.consume(delta, stop_event)
+"""
+import re
+import time
+import threading
+from typing import Callable, Dict, Optional, Union
+
+STALL_SECONDS = 5.0     # không nhận byte nào trong khoảng này -> coi là đứng, không chia băng thông
+BURST_SECONDS = 0.5     # mỗi lượt được "nợ"/dư tối đa bằng phần chia x BURST_SECONDS
+MAX_SLEEP = 0.5         # ngủ từng đoạn ngắn để dừng job / đổi rate có hiệu lực nhanh
+
+_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_rate(value: Union[str, int, float, None]) -> Optional[float]:
+    """'5M', '800K', '1.5M/s', 1048576 -> byte/s; rỗng / 0 -> None (không giới hạn)"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+    m = re.match(r'^\s*([\d.]+)\s*([KMG]?)i?B?(?:/s)?\s*$', str(value), re.I)
+    if not m:
+        if not str(value).strip():
+            return None
+        raise ValueError(f'Băng thông không hợp lệ: {value!r} (vd: 5M, 800K)')
+    rate = float(m.group(1)) * _UNITS[m.group(2).upper()]
+    return rate if rate > 0 else None
+
+
+def format_rate(rate: Optional[float]) -> str:
+    if not rate:
+        return 'unlimited'
+    for unit, size in (('G', 1024 ** 3), ('M', 1024 ** 2), ('K', 1024)):
+        if rate >= size:
+            return f'{rate / size:.1f}{unit}B/s'
+    return f'{rate:.0f}B/s'
+
+
+class BandwidthLease:
+    """Phần băng thông của 1 lượt tải; consume() an toàn khi gọi từ nhiều thread fragment"""
+
+    def __init__(self, budget: 'BandwidthBudget', key: str):
+        self.budget = budget
+        self.key = key
+        self.bytes = 0
+        self.started = time.time()
+        self.last_data = self.started
+        self.paused = False     # đang post-process: không nhận byte, nhường phần chia
+        self._tokens = 0.0
+        self._refilled = time.monotonic()
+
+    def consume(self, nbytes: int, stop_event: Optional[object] = None) -> float:
+        """Ghi nhận nbytes vừa nhận; ngủ nếu lượt này vượt phần chia. Trả về số giây đã ngủ."""
+        if nbytes <= 0:
+            return 0.0
+        wait = self.budget._charge(self, nbytes)
+        slept = 0.0
+        while wait > 0:
+            if stop_event is not None and hasattr(stop_event, 'is_set') and stop_event.is_set():
+                break
+            step = min(wait, MAX_SLEEP)
+            time.sleep(step)
+            slept += step
+            wait -= step
+            # rate đổi / lượt khác xong trong lúc ngủ -> tính lại phần nợ còn lại
+            wait = min(wait, self.budget._debt_seconds(self))
+        return slept
+
+    def pause(self):
+        with self.budget._lock:
+            self.paused = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.budget.release(self)
+        return False
+
+
+class BandwidthBudget:
+    """Tổng băng thông của job, chia đều động cho các lượt tải đang nhận dữ liệu"""
+
+    def __init__(self, rate: Optional[float] = None, stall_seconds: float = STALL_SECONDS,
+                 log_func: Optional[Callable] = None, prefix: str = 'Bandwidth'):
+        self.rate = parse_rate(rate)
+        self.stall_seconds = stall_seconds
+        self.log_func = log_func
+        self.prefix = prefix
+        self.total_bytes = 0
+        self.throttled_seconds = 0.0
+        self._leases: Dict[int, BandwidthLease] = {}
+        self._lock = threading.Lock()
+
+    # ---- cấu hình ----
+    def set_rate(self, rate: Union[str, int, float, None], reason: str = 'manual') -> Optional[float]:
+        new = parse_rate(rate)
+        with self._lock:
+            old, self.rate = self.rate, new
+        if new != old:
+            self._log(f'📶 Bandwidth {format_rate(old)} → {format_rate(new)} ({reason})')
+        return new
+
+    # ---- lease ----
+    def lease(self, key: str = '') -> BandwidthLease:
+        lease = BandwidthLease(self, key)
+        with self._lock:
+            self._leases[id(lease)] = lease
+        return lease
+
+    def release(self, lease: BandwidthLease):
+        with self._lock:
+            self._leases.pop(id(lease), None)
+
+    @property
+    def active(self) -> int:
+        with self._lock:
+            return self._active_count(time.time())
+
+    def share(self) -> Optional[float]:
+        """Phần byte/s hiện tại của mỗi lượt đang nhận dữ liệu (None = không giới hạn)"""
+        with self._lock:
+            return self._share(time.time())
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.time()
+            return {'rate': self.rate, 'share': self._share(now), 'active': self._active_count(now),
+                    'leases': len(self._leases), 'total_bytes': self.total_bytes,
+                    'throttled_seconds': round(self.throttled_seconds, 3)}
+
+    # ---- nội bộ (giữ _lock) ----
+    def _active_count(self, now: float) -> int:
+        return sum(1 for l in self._leases.values()
+                   if not l.paused and now - l.last_data < self.stall_seconds)
+
+    def _share(self, now: float) -> Optional[float]:
+        if not self.rate:
+            return None
+        return self.rate / max(1, self._active_count(now))
+
+    def _refill(self, lease: BandwidthLease, share: float):
+        mono = time.monotonic()
+        lease._tokens = min(share * BURST_SECONDS, lease._tokens + share * (mono - lease._refilled))
+        lease._refilled = mono
+
+    def _charge(self, lease: BandwidthLease, nbytes: int) -> float:
+        with self._lock:
+            now = time.time()
+            lease.bytes += nbytes
+            lease.last_data = now
+            lease.paused = False
+            self.total_bytes += nbytes
+            share = self._share(now)
+            if share is None:
+                return 0.0
+            self._refill(lease, share)
+            lease._tokens -= nbytes
+            if lease._tokens >= 0:
+                return 0.0
+            wait = -lease._tokens / share
+            self.throttled_seconds += wait
+            return wait
+
+    def _debt_seconds(self, lease: BandwidthLease) -> float:
+        with self._lock:
+            share = self._share(time.time())
+            if share is None:
+                return 0.0
+            self._refill(lease, share)
+            return max(0.0, -lease._tokens / share)
+
+    def _log(self, msg: str):
+        if self.log_func:
+            try:
+                self.log_func(msg, prefix=self.prefix)
+            except Exception:
+                pass
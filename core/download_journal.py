@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+core/download_journal.py
+Hàng đợi tải lưu trên đĩa (SQLite, WAL) để batch tải dài chạy tiếp được qua nhiều phiên.
+
+Mỗi item có trạng thái:
+    pending -> extracting -> downloading (bytes_done / bytes_total) -> postprocessing -> done
+                                                                      \\-> failed (error)
+- run_downloader(journal=...) ghi trạng thái theo progress hook (byte được ghi tối đa 1 lần/giây/item).
+- Mở lại: reset_interrupted() đưa extracting/downloading/postprocessing về pending; file .part / fragment
+  của yt-dlp được giữ nguyên nên `continuedl` tải tiếp từ chỗ dừng.
+- retry_failed(): chỉ đưa các item failed về pending.
+
+    journal = DownloadJournal(os.path.join(out_folder, JOURNAL_NAME))
+    journal.add_many(ids); journal.unfinished(); journal.stats()
+"""
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+JOURNAL_NAME = 'download_queue.db'
+STATES = ('pending', 'extracting', 'downloading', 'postprocessing', 'done', 'failed')
+ACTIVE_STATES = ('extracting', 'downloading', 'postprocessing')
+PROGRESS_INTERVAL = 1.0     # giây giữa 2 lần ghi bytes_done của cùng 1 item
+
+
+class DownloadJournal:
+    """Trạng thái từng item của hàng đợi tải; thread-safe (1 connection + lock như SQLiteWorkQueue)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._last_progress: Dict[str, float] = {}
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                vid TEXT NOT NULL UNIQUE,
+                priority REAL NOT NULL DEFAULT 0,
+                state TEXT NOT NULL DEFAULT 'pending',
+                bytes_done INTEGER NOT NULL DEFAULT 0,
+                bytes_total INTEGER,
+                path TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated REAL
+            );
+            CREATE INDEX IF NOT EXISTS items_state ON items(state, id);
+        ''')
+
+    def _tx(self, fn):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                out = fn(self._conn)
+                self._conn.execute('COMMIT')
+                return out
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    # ---- hàng đợi ----
+    def add_many(self, vids: Iterable[str], priorities: Optional[Iterable[float]] = None) -> int:
+        """Thêm item mới (pending); item đã có giữ nguyên trạng thái. Trả về số item mới."""
+        vids = list(vids)
+        prios = list(priorities) if priorities is not None else [0.0] * len(vids)
+        now = time.time()
+        return self._tx(lambda c: c.executemany(
+            'INSERT OR IGNORE INTO items(vid, priority, updated) VALUES (?, ?, ?)',
+            [(str(v), float(p or 0), now) for v, p in zip(vids, prios)]).rowcount)
+
+    def reset_interrupted(self) -> int:
+        """Item đang chạy dở khi app bị tắt -> pending (giữ bytes_done để hiển thị, file .part vẫn còn)"""
+        marks = ','.join('?' * len(ACTIVE_STATES))
+        return self._tx(lambda c: c.execute(
+            f"UPDATE items SET state='pending', updated=? WHERE state IN ({marks})",
+            (time.time(), *ACTIVE_STATES)).rowcount)
+
+    def retry_failed(self) -> int:
+        return self._tx(lambda c: c.execute(
+            "UPDATE items SET state='pending', error=NULL, updated=? WHERE state='failed'", (time.time(),)).rowcount)
+
+    def unfinished(self) -> List[Tuple[str, float]]:
+        """(vid, priority) chưa xong và chưa lỗi, theo thứ tự thêm vào"""
+        marks = ','.join('?' * (len(ACTIVE_STATES) + 1))
+        with self._lock:
+            rows = self._conn.execute(f'SELECT vid, priority FROM items WHERE state IN ({marks}) ORDER BY id',
+                                      ('pending', *ACTIVE_STATES)).fetchall()
+        return [(vid, prio) for vid, prio in rows]
+
+    def states(self, vids: Iterable[str]) -> Dict[str, str]:
+        vids = list(vids)
+        out: Dict[str, str] = {}
+        with self._lock:
+            for i in range(0, len(vids), 500):
+                chunk = vids[i:i + 500]
+                out.update(self._conn.execute(
+                    f"SELECT vid, state FROM items WHERE vid IN ({','.join('?' * len(chunk))})", chunk).fetchall())
+        return out
+
+    # ---- trạng thái từng item ----
+    def mark(self, vid: str, state: str, path: Optional[str] = None, error: Optional[str] = None):
+        if state not in STATES:
+            raise ValueError(f'state phải là một trong {STATES}')
+        attempts = 1 if state == 'extracting' else 0
+        self._last_progress.pop(vid, None)
+        self._tx(lambda c: c.execute(
+            'UPDATE items SET state=?, path=COALESCE(?, path), error=?, attempts=attempts+?, updated=? WHERE vid=?',
+            (state, path, error, attempts, time.time(), vid)))
+
+    def progress(self, vid: str, done: int, total: Optional[int] = None):
+        """bytes_done của item đang tải; bỏ qua nếu vừa ghi < PROGRESS_INTERVAL giây trước"""
+        now = time.time()
+        if now - self._last_progress.get(vid, 0.0) < PROGRESS_INTERVAL:
+            return
+        self._last_progress[vid] = now
+        self._tx(lambda c: c.execute(
+            "UPDATE items SET state='downloading', bytes_done=?, bytes_total=COALESCE(?, bytes_total), updated=? "
+            "WHERE vid=? AND state IN ('extracting', 'downloading')",
+            (int(done or 0), int(total) if total else None, now, vid)))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute('SELECT state, COUNT(*) FROM items GROUP BY state').fetchall()
+        out = {state: 0 for state in STATES}
+        out.update({state: count for state, count in rows})
+        out['total'] = sum(out[s] for s in STATES)
+        return out
+
+    def failed(self) -> List[Tuple[str, Optional[str]]]:
+        with self._lock:
+            return self._conn.execute("SELECT vid, error FROM items WHERE state='failed' ORDER BY id").fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+core/download_progress.py
+Gộp progress của mọi lượt tải đang chạy thành 1 snapshot, phát theo nhịp cố định thay vì mỗi tick của yt-dlp.
+
+- hook(key) trả về callback cho download_video(progress_callback=...): chỉ cập nhật dict dưới lock (rẻ),
+  không log / không gọi UI. Mỗi key (video) có thể có nhiều file (video + audio của format merge).
+- 1 thread nền mỗi `interval` giây dựng snapshot và gọi emit(snapshot) (detail_callback), mỗi
+  `log_interval` giây ghi 1 dòng log tổng hợp.
+
+Snapshot ({'phase': 'downloads', ...}):
+    active      [{id, filename, downloaded, total, percent, speed, eta}] - các lượt đang tải
+    count       số lượt đang tải
+    downloaded  tổng byte đã tải của các lượt đang chạy; total: tổng byte đã biết của chúng
+    speed       tổng byte/s; eta: (total - downloaded) / speed
+    finished    số lượt đã xong bước mạng; finished_bytes: tổng byte của chúng
+"""
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, Optional
+
+EMIT_INTERVAL = 1.0     # giây giữa 2 snapshot gửi detail_callback
+LOG_INTERVAL = 10.0     # giây giữa 2 dòng log tổng hợp
+
+
+def _mb(n: float) -> str:
+    return f'{(n or 0) / 1024 / 1024:.1f}MB'
+
+
+class DownloadProgress:
+    """Bộ gộp progress nhiều lượt tải, phát snapshot theo nhịp"""
+
+    def __init__(self, emit: Optional[Callable[[dict], None]] = None, log_func: Optional[Callable] = None,
+                 interval: float = EMIT_INTERVAL, log_interval: Optional[float] = LOG_INTERVAL,
+                 prefix: str = '[Downloader]'):
+        self.emit = emit
+        self.log_func = log_func
+        self.interval = interval
+        self.log_interval = log_interval
+        self.prefix = prefix
+        self.finished = 0
+        self.finished_bytes = 0
+        self._files: Dict[Any, Dict[str, Dict[str, Any]]] = {}   # key -> filename -> tick mới nhất
+        self._phase: Dict[Any, str] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_log = time.time()
+        self._halt = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='download-progress', daemon=True)
+        self._thread.start()
+
+    # ---- gọi từ thread tải ----
+    def hook(self, key: Any) -> Callable[[dict], None]:
+        def _update(payload: dict):
+            phase = payload.get('phase')
+            with self._lock:
+                self._phase[key] = phase
+                if phase == 'downloading':
+                    self._files.setdefault(key, {})[payload.get('filename') or ''] = payload
+                elif phase == 'finished':
+                    tick = self._files.setdefault(key, {}).get(payload.get('filename') or '')
+                    if tick is not None:
+                        tick.update(speed=0, eta=0, percent=1.0, downloaded=tick.get('total') or tick.get('downloaded'))
+                self._dirty = True
+        return _update
+
+    def finish(self, key: Any):
+        """Lượt tải rời slot mạng (xong / lỗi / chuyển sang hậu xử lý)"""
+        with self._lock:
+            files = self._files.pop(key, {})
+            self._phase.pop(key, None)
+            self.finished += 1
+            self.finished_bytes += sum(f.get('downloaded') or 0 for f in files.values())
+            self._dirty = True
+
+    # ---- snapshot ----
+    def snapshot(self) -> dict:
+        with self._lock:
+            active = []
+            for key, files in self._files.items():
+                downloaded = sum(f.get('downloaded') or 0 for f in files.values())
+                total = sum(f.get('total') or 0 for f in files.values())
+                speed = sum(f.get('speed') or 0 for f in files.values())
+                current = max(files.values(), key=lambda f: f.get('downloaded') or 0) if files else {}
+                active.append({'id': key, 'filename': os.path.basename(current.get('filename') or ''),
+                               'phase': self._phase.get(key), 'downloaded': downloaded, 'total': total,
+                               'percent': downloaded / total if total else None, 'speed': speed,
+                               'eta': (total - downloaded) / speed if total and speed else None})
+            finished, finished_bytes = self.finished, self.finished_bytes
+        downloaded = sum(a['downloaded'] for a in active)
+        total = sum(a['total'] for a in active)
+        speed = sum(a['speed'] for a in active)
+        return {'phase': 'downloads', 'active': active, 'count': len(active), 'downloaded': downloaded,
+                'total': total, 'percent': downloaded / total if total else None, 'speed': speed,
+                'eta': (total - downloaded) / speed if total and speed else None,
+                'finished': finished, 'finished_bytes': finished_bytes}
+
+    def summary_line(self, snap: Optional[dict] = None) -> str:
+        snap = snap or self.snapshot()
+        parts = [f"{snap['count']} đang tải", f"{_mb(snap['downloaded'])}/{_mb(snap['total'])}",
+                 f"{(snap['speed'] or 0) / 1024 / 1024:.2f} MB/s"]
+        if snap['eta'] is not None:
+            parts.append(f"ETA {int(snap['eta'])}s")
+        parts.append(f"xong {snap['finished']} ({_mb(snap['finished_bytes'])})")
+        return ' | '.join(parts)
+
+    # ---- thread phát ----
+    def _loop(self):
+        while not self._halt.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, False
+        if not dirty:
+            return
+        snap = self.snapshot()
+        if self.emit:
+            try:
+                self.emit(snap)
+            except Exception:
+                pass
+        now = time.time()
+        if self.log_func and self.log_interval and snap['count'] and now - self._last_log >= self.log_interval:
+            self._last_log = now
+            try:
+                self.log_func(self.summary_line(snap), prefix=self.prefix)
+            except TypeError:
+                self.log_func(f'{self.prefix} {self.summary_line(snap)}')
+            except Exception:
+                pass
+
+    def stop(self):
+        self._halt.set()
+        self._thread.join(timeout=2)
+        self.flush()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+core/download_queue.py
+Hàng đợi tải cho run_downloader: số lượt tải song song cấu hình được (đổi được khi đang chạy),
+thứ tự FIFO hoặc theo độ ưu tiên, chỉ giữ đúng `limit` lượt đang chạy và lấp chỗ ngay khi 1 lượt xong.
+
+    scheduler = DownloadScheduler(concurrency=3, order='priority')
+    scheduler.add(id, priority)              # từng item, close() khi hết input
+    for future, vid in scheduler.run(executor, _task): ...
+    scheduler.set_concurrency(6)             # từ thread khác (GUI slider), áp dụng ở lần lấp chỗ kế tiếp
+    scheduler.add(id, block=True)            # producer stream (playlist đang liệt kê): chờ khi đã có maxsize item chờ
+
+Số lượt song song nằm trong core.autoscale.Autoscaler (autoscale=True -> tự chỉnh theo items/s + lỗi).
+"""
+import heapq
+import itertools
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from core.autoscale import Autoscaler
+
+DOWNLOAD_MAX_WORKERS = 16   # trần cứng số lượt tải song song (kích thước thread pool)
+DOWNLOAD_QUEUE_SIZE = 64    # số item chờ tối đa khi producer thêm với block=True
+ORDERS = ('fifo', 'priority')
+
+
+class DownloadScheduler:
+    """Hàng đợi ưu tiên + giới hạn in-flight; thread-safe cho add()/set_concurrency()/clear()"""
+
+    def __init__(self, concurrency: int = 2, order: str = 'fifo', autoscale: bool = False,
+                 autoscale_max: Optional[int] = None, log_func: Optional[Callable] = None,
+                 maxsize: int = DOWNLOAD_QUEUE_SIZE):
+        if order not in ORDERS:
+            raise ValueError(f"order phải là một trong {', '.join(ORDERS)}")
+        self.order = order
+        concurrency = max(1, min(int(concurrency or 1), DOWNLOAD_MAX_WORKERS))
+        self.scaler = Autoscaler(concurrency, enabled=autoscale,
+                                 max_workers=min(autoscale_max or concurrency * 2, DOWNLOAD_MAX_WORKERS) if autoscale else None,
+                                 log_func=log_func, prefix='Downloader')
+        self._heap = []
+        self._seq = itertools.count()
+        self.maxsize = max(1, int(maxsize or DOWNLOAD_QUEUE_SIZE))
+        self._closed = False
+        self._cancelled = False
+        self._cv = threading.Condition()
+
+    # ---- input ----
+    def add(self, item: Any, priority: float = 0.0, block: bool = False) -> bool:
+        """priority lớn hơn chạy trước (order='priority'); FIFO giữ nguyên thứ tự thêm vào.
+        block=True: chờ tới khi hàng đợi còn dưới maxsize item (producer không chạy quá xa lượt tải).
+        Trả về False nếu hàng đợi đã bị clear() (job dừng) -> item bị bỏ."""
+        key = -float(priority or 0) if self.order == 'priority' else 0.0
+        with self._cv:
+            while block and len(self._heap) >= self.maxsize and not self._cancelled:
+                self._cv.wait()
+            if self._cancelled:
+                return False
+            heapq.heappush(self._heap, (key, next(self._seq), item))
+            self._cv.notify_all()
+        return True
+
+    def close(self):
+        """Không còn item mới -> run() kết thúc khi hàng đợi và các lượt đang chạy đều xong"""
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+
+    def clear(self) -> int:
+        """Bỏ các item chưa bắt đầu (dừng job), add() sau đó bị bỏ qua; trả về số item bị bỏ"""
+        with self._cv:
+            n = len(self._heap)
+            self._heap.clear()
+            self._cancelled = True
+            self._cv.notify_all()
+        return n
+
+    # ---- concurrency ----
+    @property
+    def concurrency(self) -> int:
+        return self.scaler.limit
+
+    def set_concurrency(self, n: int, reason: str = 'manual') -> int:
+        n = max(1, min(int(n), DOWNLOAD_MAX_WORKERS))
+        self.scaler.set_limit(n, reason)
+        with self._cv:
+            self._cv.notify_all()
+        return n
+
+    @property
+    def pending(self) -> int:
+        return len(self._heap)
+
+    def peek(self, n: int) -> List[Any]:
+        """n item sẽ chạy kế tiếp (không lấy ra khỏi hàng đợi) - cho prefetch metadata"""
+        with self._cv:
+            return [item for _, _, item in heapq.nsmallest(n, self._heap)]
+
+    # ---- chạy ----
+    def run(self, executor, fn: Callable[[Any], Any], poll: float = 0.5) -> Iterator[Tuple[Any, Any]]:
+        """Submit fn(item) khi còn slot; yield (future, item) ngay khi 1 lượt xong (slot được lấp ở vòng kế)"""
+        inflight: Dict[Any, Any] = {}
+        while True:
+            with self._cv:
+                while self._heap and len(inflight) < self.scaler.limit:
+                    _, _, item = heapq.heappop(self._heap)
+                    inflight[executor.submit(fn, item)] = item
+                    self._cv.notify_all()  # producer đang chờ chỗ trống (add block=True)
+                if not inflight:
+                    if self._closed and not self._heap:
+                        return
+                    self._cv.wait(poll)
+                    continue
+            done, _ = wait(list(inflight), timeout=poll, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut, inflight.pop(fut)
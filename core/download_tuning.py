@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+core/download_tuning.py
+Tự chỉnh concurrent_fragment_downloads / http_chunk_size theo từng (host, loại format) thay cho giá trị cố định.
+
+- Loại format: 'fragmented' (DASH / HLS: tải theo fragment -> chỉnh số fragment song song) và 'progressive'
+  (1 file qua http/https, kể cả từng luồng video/audio DASH của YouTube -> chỉnh kích thước chunk range).
+- Mỗi lượt tải là 1 phép đo: throughput trong PROBE_SECONDS giây đầu (file ngắn hơn thì cả file) với giá trị đang thử.
+- Hill-climbing trên thang giá trị (FRAG_STEPS / CHUNK_STEPS) như core.autoscale: tăng dần khi throughput cải thiện
+  >= MIN_GAIN, không cải thiện thì quay về giá trị tốt nhất và giữ HOLD_ITEMS lượt rồi thăm dò lại; lượt lỗi -> lùi 1 bậc.
+- Giá trị tốt theo (host, loại) được lưu ở `download_tuning.json` (thư mục tải) để các lượt / phiên sau dùng ngay.
+
+    tuner = DownloadTuner(path=os.path.join(out, TUNING_NAME), log_func=log)
+    key = tuning_key(info); frags, chunk = tuner.settings(key)
+    probe = tuner.probe(key, frags, chunk)  ->  probe.update(d) trong progress hook  ->  tuner.report(probe, ok)
+"""
+import os
+import json
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+TUNING_NAME = 'download_tuning.json'
+MB = 1024 * 1024
+FRAG_STEPS = (1, 2, 4, 6, 8, 12, 16, 24, 32)
+CHUNK_STEPS = (1 * MB, 2 * MB, 4 * MB, 6 * MB, 8 * MB, 10 * MB, 16 * MB, 24 * MB)
+PROBE_SECONDS = 5.0     # cửa sổ đo đầu mỗi lượt tải
+MIN_PROBE_SECONDS = 1.0  # lượt ngắn hơn thế không đủ tin cậy -> bỏ qua
+MIN_GAIN = 0.05
+HOLD_ITEMS = 6          # số lượt giữ giá trị tốt nhất trước khi thăm dò lại
+EWMA = 0.5
+
+
+def _host_group(url: str) -> str:
+    """rr3---sn-xxx.googlevideo.com -> googlevideo.com (các node CDN cùng nhóm)"""
+    host = (urlsplit(url).hostname or '').lower()
+    parts = host.split('.')
+    return '.'.join(parts[-2:]) if len(parts) > 2 and not host.replace('.', '').isdigit() else host
+
+
+def tuning_key(info: Dict[str, Any]) -> Tuple[str, str]:
+    """(host, 'fragmented' | 'progressive') của các format đã chọn"""
+    formats = info.get('requested_formats') or [info]
+    protocols = ' '.join(str(f.get('protocol') or '') for f in formats)
+    kind = 'fragmented' if ('m3u8' in protocols or 'dash' in protocols or any(f.get('fragments') for f in formats)) \
+        else 'progressive'
+    url = next((f.get('url') for f in formats if f.get('url')), '') or ''
+    return _host_group(url), kind
+
+
+def _nearest(steps: Tuple[int, ...], value: int) -> int:
+    return min(range(len(steps)), key=lambda i: abs(steps[i] - value))
+
+
+class ThroughputProbe:
+    """Đo byte/s trong PROBE_SECONDS giây đầu của 1 lượt tải (gọi update() từ progress hook)"""
+
+    def __init__(self, key: Tuple[str, str], frags: int, chunk: int):
+        self.key = key
+        self.frags = frags
+        self.chunk = chunk
+        self.rate: Optional[float] = None
+        self._seen: Dict[str, int] = {}
+        self._bytes = 0
+        self._start: Optional[float] = None
+        self._last = 0.0
+
+    def update(self, d: Dict[str, Any]):
+        if self.rate is not None or d.get('status') not in ('downloading', 'finished'):
+            return
+        now = time.time()
+        if self._start is None:
+            self._start = now
+        name = d.get('filename') or ''
+        got = d.get('downloaded_bytes') or 0
+        # tick đầu của mỗi file chỉ làm mốc (phần tải tiếp từ .part không tính vào phép đo)
+        if name in self._seen and got > self._seen[name]:
+            self._bytes += got - self._seen[name]
+        self._seen[name] = got
+        self._last = now
+        if now - self._start >= PROBE_SECONDS:
+            self._freeze(now)
+
+    def _freeze(self, now: float):
+        elapsed = now - (self._start or now)
+        if elapsed >= MIN_PROBE_SECONDS and self._bytes > 0:
+            self.rate = self._bytes / elapsed
+
+    def finish(self) -> Optional[float]:
+        if self.rate is None and self._start is not None:
+            self._freeze(self._last)
+        return self.rate
+
+
+class DownloadTuner:
+    """Bảng giá trị theo (host, loại) + hill-climbing; thread-safe, dùng chung cho mọi lượt tải của job"""
+
+    def __init__(self, frags: int = 8, chunk: int = 10 * MB, path: Optional[str] = None,
+                 log_func: Optional[Callable] = None):
+        self.default_frags = frags
+        self.default_chunk = chunk
+        self.path = path
+        self.log_func = log_func
+        self.history: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._state: Dict[str, Dict[str, Any]] = {}
+        if path:
+            self._load(path)
+
+    # ---- lưu / nạp ----
+    def _load(self, path: str):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for name, st in (saved or {}).items():
+            if isinstance(st, dict) and st.get('value'):
+                # phiên mới: bắt đầu ở giá trị tốt nhất đã biết, thăm dò lại sau HOLD_ITEMS lượt
+                idx = _nearest(self._steps(name), int(st['value']))
+                self._state[name] = {'idx': idx, 'best': idx, 'best_rate': None, 'dir': 1, 'hold': HOLD_ITEMS, 'rates': {}}
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {name: {'value': self._steps(name)[st['best']],
+                           'rate': round(st['best_rate'] or 0), 'updated': time.strftime('%Y-%m-%d %H:%M:%S')}
+                    for name, st in self._state.items()}
+        tmp = f'{self.path}.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    # ---- tra cứu ----
+    @staticmethod
+    def _name(key: Tuple[str, str]) -> str:
+        return f'{key[0]}|{key[1]}'
+
+    @staticmethod
+    def _steps(name: str) -> Tuple[int, ...]:
+        return FRAG_STEPS if name.endswith('|fragmented') else CHUNK_STEPS
+
+    def _get(self, name: str) -> Dict[str, Any]:
+        st = self._state.get(name)
+        if st is None:
+            default = self.default_frags if name.endswith('|fragmented') else self.default_chunk
+            idx = _nearest(self._steps(name), default)
+            st = self._state[name] = {'idx': idx, 'best': idx, 'best_rate': None, 'dir': 1, 'hold': 0, 'rates': {}}
+        return st
+
+    def settings(self, key: Tuple[str, str]) -> Tuple[int, int]:
+        """(concurrent_frags, http_chunk_size) cho lượt tải kế tiếp của key"""
+        name = self._name(key)
+        with self._lock:
+            value = self._steps(name)[self._get(name)['idx']]
+        if key[1] == 'fragmented':
+            return value, self.default_chunk
+        return self.default_frags, value
+
+    def probe(self, key: Tuple[str, str], frags: int, chunk: int) -> ThroughputProbe:
+        return ThroughputProbe(key, frags, chunk)
+
+    # ---- hill-climbing ----
+    def report(self, probe: ThroughputProbe, ok: bool = True):
+        name = self._name(probe.key)
+        steps = self._steps(name)
+        rate = probe.finish()
+        with self._lock:
+            st = self._get(name)
+            tried = _nearest(steps, probe.frags if probe.key[1] == 'fragmented' else probe.chunk)
+            before = st['idx']
+            if not ok:
+                st['idx'] = max(0, min(st['idx'], tried) - 1)
+                st['best'] = min(st['best'], st['idx'])
+                st['dir'], st['hold'] = 1, HOLD_ITEMS
+                reason = 'lỗi'
+            elif rate is None:
+                return
+            else:
+                prev = st['rates'].get(tried)
+                st['rates'][tried] = rate if prev is None else EWMA * rate + (1 - EWMA) * prev
+                if tried != st['idx']:
+                    return  # lượt chạy với giá trị cũ (song song) -> chỉ cập nhật trung bình
+                if st['best_rate'] is None or tried == st['best']:
+                    st['best'], st['best_rate'] = tried, st['rates'][tried]
+                    reason = 'mốc'
+                elif st['rates'][tried] >= st['best_rate'] * (1 + MIN_GAIN):
+                    st['best'], st['best_rate'] = tried, st['rates'][tried]
+                    reason = 'nhanh hơn'
+                else:
+                    st['idx'], st['hold'] = st['best'], HOLD_ITEMS
+                    st['dir'] = -st['dir'] if tried > st['best'] else 1
+                    reason = 'không cải thiện'
+                if st['idx'] == st['best']:
+                    if st['hold'] > 0:
+                        st['hold'] -= 1
+                    else:
+                        nxt = st['best'] + st['dir']
+                        if not 0 <= nxt < len(steps):
+                            st['dir'] = -st['dir']
+                            nxt = st['best'] + st['dir']
+                        st['idx'] = max(0, min(len(steps) - 1, nxt))
+            after = st['idx']
+            self.history.append({'key': name, 'tried': steps[tried], 'rate': rate, 'ok': ok,
+                                 'next': steps[after], 'reason': reason, 'ts': time.time()})
+        if after != before:
+            self._log(f"🎛️ {name}: {self._fmt(name, steps[before])} -> {self._fmt(name, steps[after])} "
+                      f"({reason}, {(rate or 0) / MB:.2f} MB/s với {self._fmt(name, steps[tried])})")
+            self.save()
+
+    @staticmethod
+    def _fmt(name: str, value: int) -> str:
+        return f'{value} frags' if name.endswith('|fragmented') else f'chunk {value // MB}MB'
+
+    def summary(self) -> str:
+        with self._lock:
+            parts = [f"{name}: {self._fmt(name, self._steps(name)[st['best']])}"
+                     + (f" ({st['best_rate'] / MB:.2f} MB/s)" if st['best_rate'] else '')
+                     for name, st in self._state.items()]
+        return ' | '.join(parts) or 'chưa có số đo'
+
+    def _log(self, msg: str):
+        if self.log_func:
+            try:
+                self.log_func(msg, prefix='Tuning')
+            except TypeError:
+                self.log_func(f'[Tuning] {msg}')
@@ -5,6 +5,11 @@ Phase 2: Batch Detail Enrichment cho YouTube video bằng yt-dlp (không dùng G
 - Đầu vào: list ID/URL hoặc file .xlsx/.csv có cột 'ID Video'
 - Đầu ra: DataFrame + file Excel chứa trường nâng cao (tags, chapters, description, like_count, ...)
 
+Pipeline 2 tầng: metadata (yt-dlp, max_workers luồng, autoscale, metadata_rate request/giây) -> transcript
+(transcript_workers luồng riêng, transcript_rate request/giây riêng). Lookup transcript chậm không giữ slot metadata; ngôn ngữ transcript được chọn
+từ chỉ mục subtitles / automatic_captions của metadata nên chỉ gọi 1 lần cho đúng ngôn ngữ, video không có phụ đề
+thì không gọi.
+
 Yêu cầu: yt-dlp, pandas
 Tuỳ chọn: youtube-transcript-api (để lấy transcript_text)
 """
@@ -13,12 +18,22 @@ from __future__ import annotations
 import os
 import re
 import json
+import time
+import threading
 from typing import Optional, List, Dict, Tuple, Iterable, Union
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 
 import pandas as pd
 import yt_dlp
 
+from core import throttle
+from core import timing
+from core import metrics
+from core.autoscale import Autoscaler, run_bounded
+
+TRANSCRIPT_LANGS = ("vi", "en")   # thứ tự ưu tiên: phụ đề thủ công trước, rồi auto-generated
+TRANSCRIPT_WORKERS = 4
+
 
 def _read_ids(input_value: Union[str, List[str]]) -> List[str]:
     """Nhận vào: đường dẫn file (.xlsx/.csv) hoặc list hoặc 1 chuỗi ID/URL.
@@ -65,9 +80,13 @@ def _to_watch_url(s: str) -> str:
     return s
 
 
-def _extract_detail(url_or_id: str, include_transcript: bool = True) -> Dict:
+def _extract_detail(url_or_id: str, include_transcript: bool = True,
+                    timings: Optional[Dict[str, float]] = None,
+                    limiter: Optional[throttle.RateLimiter] = None) -> Dict:
     """Lấy metadata chi tiết 1 video bằng yt-dlp (không tải).
-       Trả về dict đã chuẩn hoá các field nâng cao."""
+       Trả về dict đã chuẩn hoá các field nâng cao.
+       timings (tuỳ chọn): dict cộng dồn thời gian theo stage (core.timing).
+       limiter (tuỳ chọn): giới hạn request/giây riêng của tầng metadata (ngoài limiter toàn cục)."""
     url = _to_watch_url(url_or_id)
     opts = {
         "quiet": True,
@@ -75,13 +94,18 @@ def _extract_detail(url_or_id: str, include_transcript: bool = True) -> Dict:
         "nocheckcertificate": True,
         "ignoreerrors": True,
     }
+    if limiter is not None:
+        timing.add(timings, timing.STAGE_RATE_WAIT, limiter.acquire())
+    timing.add(timings, timing.STAGE_RATE_WAIT, throttle.acquire())
     with yt_dlp.YoutubeDL(opts) as ydl:
-        info = ydl.extract_info(url, download=False)
+        with timing.measure(timings, timing.STAGE_EXTRACT), metrics.request():
+            info = ydl.extract_info(url, download=False)
 
     if not info:
         return {"id": url_or_id, "error": "Không lấy được metadata"}
 
     # Chuẩn hóa các trường mong muốn
+    parse_start = time.perf_counter()
     out = {
         "id": info.get("id"),
         "title": info.get("title"),
@@ -101,41 +125,58 @@ def _extract_detail(url_or_id: str, include_transcript: bool = True) -> Dict:
         "subtitles": _subtitles_index(info.get("subtitles")),
         "automatic_captions": _subtitles_index(info.get("automatic_captions")),
     }
+    timing.add(timings, timing.STAGE_PARSE, time.perf_counter() - parse_start)
 
-    # Lấy transcript_text nếu có thư viện youtube-transcript-api
+    # Lấy transcript_text nếu có thư viện youtube-transcript-api (enrich() chạy bước này ở tầng riêng)
     if include_transcript:
+        _fill_transcript(out, timings)
+
+    return out
+
+
+def _pick_transcript(subtitles: List[str], automatic: List[str],
+                     preferred: Iterable[str] = TRANSCRIPT_LANGS) -> Optional[Tuple[str, bool]]:
+    """(mã ngôn ngữ, auto-generated?) nên lấy, chọn từ chỉ mục phụ đề của metadata; None nếu không có ngôn ngữ hợp.
+       automatic_captions của YouTube liệt kê cả bản dịch máy - có mã '<lang>-orig' thì chỉ đó là bản gốc."""
+    originals = [c[:-len("-orig")] for c in automatic if c.endswith("-orig")]
+    generated = originals or list(automatic)
+    for codes, is_generated in ((subtitles, False), (generated, True)):
+        for lang in preferred:
+            for code in codes:
+                if code == lang or code.startswith(f"{lang}-"):
+                    return code, is_generated
+    return None
+
+
+def _fetch_transcript(vid: str, lang: str) -> Optional[str]:
+    """1 lần gọi youtube-transcript-api cho đúng ngôn ngữ đã chọn (API cũ: get_transcript, >=1.0: fetch)"""
+    from youtube_transcript_api import YouTubeTranscriptApi
+    if hasattr(YouTubeTranscriptApi, "get_transcript"):
+        lines = YouTubeTranscriptApi.get_transcript(vid, languages=[lang])
+    else:
+        lines = YouTubeTranscriptApi().fetch(vid, languages=[lang]).to_raw_data()
+    return " ".join([seg.get("text", "") for seg in lines]).strip() or None
+
+
+def _fill_transcript(out: Dict, timings: Optional[Dict[str, float]] = None,
+                     limiter: Optional[throttle.RateLimiter] = None):
+    """Điền transcript_text / transcript_lang cho 1 dòng metadata (tầng transcript của enrich)"""
+    out["transcript_text"] = None
+    out["transcript_lang"] = None
+    vid = out.get("id") or _maybe_extract_id_from_url(out.get("webpage_url") or "")
+    choice = _pick_transcript(out.get("subtitles") or [], out.get("automatic_captions") or [])
+    if not vid or choice is None:
+        return
+    if limiter is not None:
+        timing.add(timings, timing.STAGE_RATE_WAIT, limiter.acquire())
+    timing.add(timings, timing.STAGE_RATE_WAIT, throttle.acquire())
+    with timing.measure(timings, timing.STAGE_TRANSCRIPT):
         try:
-            from youtube_transcript_api import YouTubeTranscriptApi
-            vid = out["id"] or _maybe_extract_id_from_url(out["webpage_url"])
-            if vid:
-                # cố gắng lấy transcript với ngôn ngữ ưu tiên
-                transcript_list = YouTubeTranscriptApi.list_transcripts(vid)
-                # ưu tiên vi, en (tự điều chỉnh nếu cần)
-                preferred = ["vi", "en"]
-                text = None
-                for lang in preferred:
-                    try:
-                        trs = transcript_list.find_transcript([lang])
-                        lines = trs.fetch()
-                        text = " ".join([seg.get("text", "") for seg in lines]).strip()
-                        if text:
-                            break
-                    except Exception:
-                        continue
-                # Nếu vẫn chưa có, thử auto-generated
-                if not text:
-                    try:
-                        trs = transcript_list.find_generated_transcript(["vi", "en"])
-                        lines = trs.fetch()
-                        text = " ".join([seg.get("text", "") for seg in lines]).strip()
-                    except Exception:
-                        pass
-                out["transcript_text"] = text
+            out["transcript_text"] = _fetch_transcript(vid, choice[0])
+            out["transcript_lang"] = f"{choice[0]} (auto)" if choice[1] else choice[0]
         except Exception:
             # Không có thư viện hoặc bị chặn -> bỏ qua
-            out["transcript_text"] = None
-
-    return out
+            pass
 
 
 def _format_duration(seconds: Optional[Union[int, float]]) -> str:
@@ -178,12 +219,26 @@ def enrich(
     out_excel: Optional[str] = None,
     progress: Optional[callable] = None,
     log: Optional[callable] = None,
+    item_callback: Optional[callable] = None,
+    timings: Optional[timing.JobTimings] = None,
+    autoscale: bool = False,
+    autoscale_max: Optional[int] = None,
+    transcript_workers: int = TRANSCRIPT_WORKERS,
+    transcript_rate: Optional[float] = None,
+    metadata_rate: Optional[float] = None,
 ) -> Tuple[pd.DataFrame, Optional[str]]:
     """Batch enrichment:
        - Đọc ID/URL từ file/list
        - Đa luồng lấy metadata chi tiết bằng yt-dlp
        - Xuất DataFrame và (tuỳ chọn) file Excel.
+       item_callback (tuỳ chọn) nhận dict của từng video ngay khi xong.
+       timings (tuỳ chọn) nhận histogram theo stage (core.timing.JobTimings).
+       autoscale: tự chỉnh số luồng trong lúc chạy (max_workers = điểm bắt đầu, autoscale_max = trần).
+       metadata_rate: giới hạn request/giây riêng của tầng metadata (cộng thêm limiter toàn cục của host).
+       transcript_workers / transcript_rate: số luồng + giới hạn request/giây riêng của tầng transcript
+       (max_workers / autoscale chỉ áp cho tầng metadata); dòng được trả về khi cả 2 tầng xong.
     """
+    timings = timings if timings is not None else timing.JobTimings("enricher")
     ids = _read_ids(input_value)
     total = len(ids)
     if progress:
@@ -194,23 +249,61 @@ def enrich(
     rows: List[Dict] = []
     done = 0
     workers = max(1, min(max_workers, 16))
-    with ThreadPoolExecutor(max_workers=workers) as ex:
-        futures = {ex.submit(_extract_detail, vid, include_transcript): vid for vid in ids}
-        for fut in as_completed(futures):
-            vid = futures[fut]
+    scaler = Autoscaler(workers, max_workers=autoscale_max, enabled=autoscale, tasks=total,
+                        log_func=log, prefix="Enricher")
+    if include_transcript:
+        try:
+            import youtube_transcript_api  # noqa: F401
+        except ImportError:
+            include_transcript = False
+            if log:
+                log("Chưa cài youtube-transcript-api -> bỏ qua transcript", prefix="Enricher")
+    t_workers = max(1, min(int(transcript_workers or TRANSCRIPT_WORKERS), 16))
+    m_limiter = throttle.RateLimiter(metadata_rate) if metadata_rate else None
+    t_limiter = throttle.RateLimiter(transcript_rate) if transcript_rate else None
+    lock = threading.Lock()
+    transcripts: List[Future] = []
+
+    def _finish(data: Dict, item_timings: Dict[str, float]):
+        # gọi từ thread chính (tầng metadata) và từ callback của tầng transcript
+        nonlocal done
+        with lock:
+            rows.append(data)
+            timings.observe_all(item_timings)
+            if item_callback:
+                try:
+                    item_callback(data)
+                except Exception:
+                    pass
+            done += 1
+            if progress:
+                progress(done, total)
+            if log and done % 10 == 0:
+                log(f"Đã enrich {done}/{total}", prefix="Enricher")
+
+    def _calls():
+        for vid in ids:
+            item_timings: Dict[str, float] = {}
+            yield (vid, item_timings), _extract_detail, (vid, False, item_timings, m_limiter)
+
+    with ThreadPoolExecutor(max_workers=scaler.max_workers) as ex, \
+            ThreadPoolExecutor(max_workers=t_workers, thread_name_prefix="enrich-transcript") as tx:
+        for fut, (vid, item_timings) in run_bounded(ex, _calls(), scaler):
             try:
                 data = fut.result()
-                rows.append(data)
             except Exception as e:
-                rows.append({"id": vid, "error": str(e)})
-            finally:
-                done += 1
-                if progress:
-                    progress(done, total)
-                if log and done % 10 == 0:
-                    log(f"Đã enrich {done}/{total}", prefix="Enricher")
+                data = {"id": vid, "error": str(e)}
+            scaler.record([data])
+            if include_transcript and not data.get("error"):
+                tf = tx.submit(_fill_transcript, data, item_timings, t_limiter)
+                tf.add_done_callback(lambda _f, d=data, t=item_timings: _finish(d, t))
+                transcripts.append(tf)
+            else:
+                _finish(data, item_timings)
+        wait(transcripts)
 
     # Lưu DataFrame
+    serialize_start = time.perf_counter()
     df = pd.DataFrame(rows)
 
     # Sắp xếp cột cho dễ đọc
@@ -219,19 +312,21 @@ def enrich(
         "duration", "duration_str", "upload_date",
         "view_count", "like_count", "dislike_count", "comment_count",
         "tags", "chapters", "description",
-        "subtitles", "automatic_captions", "transcript_text", "error"
+        "subtitles", "automatic_captions", "transcript_lang", "transcript_text", "error"
     ]
     # Đảm bảo cột tồn tại
     for c in preferred_cols:
         if c not in df.columns:
             df[c] = None
     df = df[preferred_cols]
+    timings.observe(timing.STAGE_SERIALIZE, time.perf_counter() - serialize_start)
 
     saved_path = None
     if out_excel:
         try:
             os.makedirs(os.path.dirname(out_excel) or ".", exist_ok=True)
-            df.to_excel(out_excel, index=False)
+            with timings.stage(timing.STAGE_EXCEL):
+                df.to_excel(out_excel, index=False)
             saved_path = out_excel
             if log:
                 log(f"Đã lưu: {saved_path}", prefix="Enricher")
@@ -239,4 +334,6 @@ def enrich(
             if log:
                 log(f"Lỗi lưu Excel: {e}", prefix="Enricher")
 
+    if log:
+        log(f"Stages: {timings.summary()}", prefix="Enricher")
     return df, saved_path
@@ -0,0 +1,498 @@
+# -*- coding: utf-8 -*-
+"""
+core/job_server.py
+Job server HTTP cục bộ: nhận job scrape/check/enrich/download, xếp hàng và chạy song song
+dưới ngân sách worker + rate limit dùng chung cho cả host.
+
+    python -m core serve --port 8765 --max-jobs 3 --worker-budget 24 --rate 8
+
+API (JSON):
+    POST   /jobs                      {"kind": "check", "params": {...}}  -> {"id": ...}
+    GET    /jobs                      danh sách job
+    GET    /jobs/<id>                 trạng thái + progress/detail (ProgressTracker.get_progress_info)
+    GET    /jobs/<id>/logs?since=N    log mới từ seq N
+    GET    /jobs/<id>/items?since=N   kết quả từng item từ seq N
+    GET    /jobs/<id>/timings         histogram thời gian theo stage (core.timing)
+    GET    /metrics                   OpenMetrics cho Prometheus (performance_monitor.PerformanceMonitor)
+    GET    /jobs/<id>/files           danh sách file kết quả
+    GET    /jobs/<id>/files/<name>    tải 1 file kết quả
+    GET    /jobs/<id>/result          tải file kết quả chính
+    POST   /jobs/<id>/cancel          dừng job (DELETE /jobs/<id> tương đương)
+    POST   /jobs/<id>/bandwidth       {"max_rate": "5M"} đổi tổng băng thông của job download đang chạy (null = bỏ giới hạn)
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import shutil
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+from typing import Any, Dict, List, Optional
+
+from core import throttle
+from core import timing
+
+JOB_KINDS = ('scrape', 'check', 'enrich', 'download')
+DEFAULT_WORKERS = {'scrape': 8, 'check': 6, 'enrich': 8, 'download': 2}
+FINAL_STATES = ('done', 'failed', 'cancelled')
+
+
+class Job:
+    """Một job trong hàng đợi, giữ progress/detail/log/item gần nhất cho client poll"""
+
+    def __init__(self, kind: str, params: Dict[str, Any], root: str, monitor=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.workdir = os.path.join(root, self.id)
+        self.state = 'queued'
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.workers = 0
+        self.progress = {'done': 0, 'total': 0}
+        self.detail: Dict[str, Any] = {}
+        self.result_path: Optional[str] = None
+        self.error: Optional[str] = None
+        self.failed = 0         # số mục lỗi (download); job 'done' mà failed > 0 = xong một phần
+        self.stop_event = threading.Event()
+        self.timings = timing.JobTimings(kind)
+        self.monitor = monitor
+        self.bandwidth = None  # core.bandwidth.BandwidthBudget của job download
+        self._lock = threading.Lock()
+        self._logs: deque = deque(maxlen=1000)
+        self._items: deque = deque(maxlen=1000)
+        self._log_seq = 0
+        self._item_seq = 0
+
+    # ---- callbacks truyền vào run_* ----
+    def log(self, msg, prefix=''):
+        with self._lock:
+            self._log_seq += 1
+            self._logs.append({'seq': self._log_seq, 'ts': round(time.time(), 3),
+                               'prefix': str(prefix).strip('[]'), 'msg': str(msg)})
+
+    def on_progress(self, done, total=0, *_):
+        with self._lock:
+            self.progress = {'done': int(done or 0), 'total': int(total or 0)}
+
+    def on_detail(self, data: Dict[str, Any]):
+        if isinstance(data, dict):
+            with self._lock:
+                self.detail = dict(data)
+
+    def on_item(self, data: Dict[str, Any]):
+        if self.monitor:
+            self.monitor.observe_item(self.kind, data)
+        with self._lock:
+            self._item_seq += 1
+            self._items.append({'seq': self._item_seq, 'data': data})
+
+    # ---- truy vấn ----
+    def logs_since(self, since: int = 0) -> List[dict]:
+        with self._lock:
+            return [l for l in self._logs if l['seq'] > since]
+
+    def items_since(self, since: int = 0) -> List[dict]:
+        with self._lock:
+            return [i for i in self._items if i['seq'] > since]
+
+    def files(self) -> List[str]:
+        if not os.path.isdir(self.workdir):
+            return []
+        out = []
+        for base, _dirs, names in os.walk(self.workdir):
+            for name in names:
+                out.append(os.path.relpath(os.path.join(base, name), self.workdir).replace(os.sep, '/'))
+        return sorted(out)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'id': self.id, 'kind': self.kind, 'state': self.state, 'params': self.params,
+                'created': self.created, 'started': self.started, 'finished': self.finished,
+                'workers': self.workers, 'progress': dict(self.progress), 'detail': dict(self.detail),
+                'items': self._item_seq, 'logs': self._log_seq,
+                'result': os.path.basename(self.result_path) if self.result_path else None,
+                'error': self.error, 'failed': self.failed,
+            }
+
+
+class JobManager:
+    """Hàng đợi FIFO + max_jobs job chạy song song, chia chung WorkerBudget và RateLimiter"""
+
+    def __init__(self, root: str, max_jobs: int = 2, worker_budget: int = 16,
+                 rate: Optional[float] = None, burst: int = 1):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self.budget = throttle.WorkerBudget(worker_budget)
+        if rate:
+            throttle.install(throttle.RateLimiter(rate, burst=burst))
+        self.jobs: Dict[str, Job] = {}
+        self.monitor = _make_monitor()
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self._threads = [threading.Thread(target=self._dispatch, name=f'aio-job-{i}', daemon=True)
+                         for i in range(max(1, max_jobs))]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, kind: str, params: Optional[Dict[str, Any]] = None) -> Job:
+        if kind not in JOB_KINDS:
+            raise ValueError(f"kind phải là một trong {', '.join(JOB_KINDS)}")
+        params = dict(params or {})
+        _validate_params(kind, params)
+        job = Job(kind, params, self.root, monitor=self.monitor)
+        self.jobs[job.id] = job
+        self._queue.put(job)
+        job.log(f'Queued ({self._queue.qsize()} in queue)', prefix='JobServer')
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job and job.state not in FINAL_STATES:
+            job.stop_event.set()
+            if job.state == 'queued':
+                job.state = 'cancelled'
+                job.finished = time.time()
+        return job
+
+    def shutdown(self):
+        for job in self.jobs.values():
+            job.stop_event.set()
+        for _ in self._threads:
+            self._queue.put(None)
+
+    def stats(self) -> Dict[str, Any]:
+        states: Dict[str, int] = {}
+        for job in list(self.jobs.values()):
+            states[job.state] = states.get(job.state, 0) + 1
+        limiter = throttle.current()
+        return {'queued': self._queue.qsize(), 'states': states,
+                'workers_in_use': self.budget.in_use, 'worker_budget': self.budget.total,
+                'rate_limit': limiter.rate if limiter else None}
+
+    def render_metrics(self) -> str:
+        """OpenMetrics: số job theo trạng thái + item còn lại theo loại job, cộng metrics của monitor"""
+        states = {state: 0 for state in ('queued', 'running') + FINAL_STATES}
+        remaining = {kind: 0 for kind in JOB_KINDS}
+        for job in list(self.jobs.values()):
+            states[job.state] = states.get(job.state, 0) + 1
+            if job.state == 'running':
+                remaining[job.kind] += max(0, job.progress['total'] - job.progress['done'])
+        for state, n in states.items():
+            self.monitor.set_gauge('aio_jobs', n, state=state)
+        for kind, n in remaining.items():
+            self.monitor.set_gauge('aio_queue_depth', n, job=kind)
+        return self.monitor.render_openmetrics()
+
+    def _dispatch(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            if job.stop_event.is_set():
+                continue
+            requested = int(job.params.get('workers') or DEFAULT_WORKERS[job.kind])
+            granted = self.budget.acquire(requested, job.stop_event)
+            if not granted:
+                job.state, job.finished = 'cancelled', time.time()
+                continue
+            try:
+                self._run(job, granted)
+            finally:
+                self.budget.release(granted)
+
+    def _run(self, job: Job, workers: int):
+        job.state, job.started, job.workers = 'running', time.time(), workers
+        os.makedirs(job.workdir, exist_ok=True)
+        job.log(f'Start {job.kind} with {workers} workers', prefix='JobServer')
+        if self.monitor:
+            self.monitor.watch_timings(job.timings)
+        try:
+            job.result_path = _RUNNERS[job.kind](job, workers)
+            if job.stop_event.is_set():
+                job.state = 'cancelled'
+            elif job.result_path:
+                job.state = 'done'
+            else:
+                job.state, job.error = 'failed', job.error or 'No result'
+        except Exception as e:
+            job.state, job.error = 'failed', f"{type(e).__name__}: {e}"
+            job.log(f'❌ {job.error}', prefix='JobServer')
+        finally:
+            job.finished = time.time()
+            if self.monitor:
+                self.monitor.add_timings(job.timings)
+            job.log(f'Finished: {job.state}', prefix='JobServer')
+
+
+def _make_monitor():
+    try:
+        from performance_monitor import PerformanceMonitor
+    except ImportError:  # chạy ngoài thư mục gốc của repo
+        return None
+    return PerformanceMonitor()
+
+
+# ===== Runners cho từng loại job =====
+def _validate_params(kind: str, params: Dict[str, Any]):
+    if kind == 'scrape' and not params.get('channel'):
+        raise ValueError("scrape cần params.channel")
+    if kind in ('check', 'enrich', 'download') and not (params.get('file') or params.get('ids')):
+        raise ValueError(f"{kind} cần params.file (đường dẫn trên server) hoặc params.ids (list)")
+    if params.get('file') and not os.path.isfile(params['file']):
+        raise ValueError(f"Không tìm thấy file: {params['file']}")
+    if params.get('ids') is not None and not isinstance(params['ids'], list):
+        raise ValueError("params.ids phải là list")
+    if kind == 'download' and params.get('order', 'fifo') not in ('fifo', 'priority'):
+        raise ValueError("params.order phải là 'fifo' hoặc 'priority'")
+    if kind == 'download' and params.get('max_rate') is not None:
+        from core.bandwidth import parse_rate
+        parse_rate(params['max_rate'])
+
+
+def _cookies(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {'cookies_file': params.get('cookies_file') or None,
+            'cookies_from_browser': params.get('cookies_from_browser') or None}
+
+
+def _autoscale(job: Job, workers: int) -> Dict[str, Any]:
+    """params.autoscale: chỉnh số worker trong phạm vi đã được cấp từ WorkerBudget (không vượt ngân sách chung)"""
+    if not job.params.get('autoscale'):
+        return {}
+    return {'autoscale': True, 'autoscale_max': workers}
+
+
+def _input_file(job: Job) -> str:
+    """Đưa input vào workdir của job để file kết quả (…_checked.xlsx) nằm trong workdir"""
+    src = job.params.get('file')
+    if src:
+        dst = os.path.join(job.workdir, os.path.basename(src))
+        shutil.copyfile(src, dst)
+        return dst
+    import pandas as pd
+    dst = os.path.join(job.workdir, 'input.csv')
+    pd.DataFrame({'ID Video': [str(x).strip() for x in job.params['ids'] if str(x).strip()]}).to_csv(dst, index=False)
+    return dst
+
+
+def _run_scrape(job: Job, workers: int) -> Optional[str]:
+    from core.ScraperChecker import run_scraper
+    return run_scraper(
+        job.params['channel'], job.workdir, log_func=job.log,
+        progress_callback=job.on_progress, detail_callback=job.on_detail, item_callback=job.on_item,
+        stop_event=job.stop_event, turbo_mode=job.params.get('turbo', True), max_workers=workers,
+        timings=job.timings, **_autoscale(job, workers), **_cookies(job.params)
+    )
+
+
+def _run_check(job: Job, workers: int) -> Optional[str]:
+    from core.ScraperChecker import run_checker
+    return run_checker(
+        _input_file(job), max_workers=workers,
+        progress_callback=job.on_progress, detail_callback=job.on_detail, item_callback=job.on_item,
+        log_func=job.log, stop_event=job.stop_event, turbo_mode=job.params.get('turbo', True),
+        timings=job.timings, **_autoscale(job, workers), **_cookies(job.params)
+    )
+
+
+def _run_enrich(job: Job, workers: int) -> Optional[str]:
+    from core.enricher import enrich
+    _df, saved = enrich(
+        job.params.get('file') or job.params['ids'], max_workers=workers,
+        include_transcript=job.params.get('transcript', True),
+        transcript_workers=int(job.params.get('transcript_workers', 4)), transcript_rate=job.params.get('transcript_rate'),
+        metadata_rate=job.params.get('metadata_rate'),
+        out_excel=os.path.join(job.workdir, 'enriched.xlsx'),
+        progress=job.on_progress, log=job.log, item_callback=job.on_item, timings=job.timings,
+        **_autoscale(job, workers)
+    )
+    return saved
+
+
+def _run_download(job: Job, workers: int) -> Optional[str]:
+    from core.ScraperChecker import DownloadTally, run_downloader
+    from core.bandwidth import BandwidthBudget
+    p = job.params
+    job.bandwidth = BandwidthBudget(p.get('max_rate'), log_func=job.log)
+    tally = DownloadTally(job.on_item)
+    media = os.path.join(job.workdir, 'media')
+    report = run_downloader(
+        p.get('file') or p['ids'], media,
+        quality=p.get('quality', 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best'),
+        audio_only=p.get('audio_only', False), audio_format=p.get('audio_format', 'mp3'), max_workers=workers,
+        concurrent_frags=int(p.get('concurrent_frags', 8)), proxy=p.get('proxy'),
+        progress_callback=job.on_progress, detail_callback=job.on_detail, item_callback=tally,
+        log_func=job.log, stop_event=job.stop_event, enable_aria2=p.get('aria2', False),
+        use_archive=p.get('use_archive', True), timings=job.timings, order=p.get('order', 'fifo'),
+        bandwidth=job.bandwidth, postprocess_workers=p.get('postprocess_workers'), prefetch=int(p.get('prefetch', 4)),
+        media_store=p.get('store') or os.environ.get('AIO_MEDIA_STORE'), store_max_size=p.get('store_max'),
+        segment_connections=int(p.get('segments') or 0) or None, auto_tune=bool(p.get('auto_tune', False)),
+        **_autoscale(job, workers), **_cookies(p)
+    )
+    job.failed = tally.failed
+    if not tally.succeeded:
+        job.error = f'{tally.failed} mục lỗi, không mục nào tải được'
+        return None
+    if tally.partial:
+        job.error = f'{tally.failed} mục lỗi, {tally.ok} mục tải được'
+    return report or media  # 1 mục / đã tải hết từ trước -> không có báo cáo
+
+
+_RUNNERS = {'scrape': _run_scrape, 'check': _run_check, 'enrich': _run_enrich, 'download': _run_download}
+
+
+# ===== HTTP layer =====
+class _Handler(BaseHTTPRequestHandler):
+    manager: JobManager = None  # gán bởi make_server
+    server_version = 'AIOJobServer/1.0'
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send_json(self, obj: Any, status: int = 200):
+        body = json.dumps(obj, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, path: str):
+        size = os.path.getsize(path)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(size))
+        self.send_header('Content-Disposition', f'attachment; filename="{os.path.basename(path)}"')
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+
+    def _send_metrics(self):
+        from performance_monitor import OPENMETRICS_CONTENT_TYPE
+        body = self.manager.render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job_or_404(self, job_id: str) -> Optional[Job]:
+        job = self.manager.jobs.get(job_id)
+        if not job:
+            self._send_json({'error': 'job not found'}, 404)
+        return job
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [unquote(p) for p in url.path.strip('/').split('/') if p]
+        query = parse_qs(url.query)
+        try:
+            since = int((query.get('since') or ['0'])[0] or 0)
+        except ValueError:
+            return self._send_json({'error': 'since phải là số nguyên'}, 400)
+
+        if parts == ['health']:
+            return self._send_json({'ok': True, **self.manager.stats()})
+        if parts == ['jobs']:
+            return self._send_json([j.to_dict() for j in self.manager.jobs.values()])
+        if parts == ['metrics'] and self.manager.monitor:
+            return self._send_metrics()
+        if len(parts) < 2 or parts[0] != 'jobs':
+            return self._send_json({'error': 'not found'}, 404)
+
+        job = self._job_or_404(parts[1])
+        if not job:
+            return
+        if len(parts) == 2:
+            return self._send_json(job.to_dict())
+        if parts[2] == 'logs':
+            return self._send_json(job.logs_since(since))
+        if parts[2] == 'items':
+            return self._send_json(job.items_since(since))
+        if parts[2] == 'timings':
+            return self._send_json(job.timings.snapshot())
+        if parts[2] == 'files' and len(parts) == 3:
+            return self._send_json(job.files())
+        if parts[2] == 'result':
+            if not job.result_path or not os.path.isfile(job.result_path):
+                return self._send_json({'error': 'no result yet', 'state': job.state}, 404)
+            return self._send_file(job.result_path)
+        if parts[2] == 'files':
+            root = os.path.realpath(job.workdir)
+            path = os.path.realpath(os.path.join(root, *parts[3:]))
+            if not path.startswith(root + os.sep) or not os.path.isfile(path):
+                return self._send_json({'error': 'file not found'}, 404)
+            return self._send_file(path)
+        return self._send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        parts = [p for p in urlparse(self.path).path.strip('/').split('/') if p]
+        if parts == ['jobs']:
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                job = self.manager.submit(body.get('kind'), body.get('params'))
+            except (ValueError, TypeError, AttributeError) as e:
+                return self._send_json({'error': str(e)}, 400)
+            return self._send_json(job.to_dict(), 201)
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'cancel':
+            job = self._job_or_404(parts[1])
+            if job:
+                self.manager.cancel(job.id)
+                self._send_json(job.to_dict())
+            return
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'bandwidth':
+            job = self._job_or_404(parts[1])
+            if not job:
+                return
+            if job.bandwidth is None:
+                return self._send_json({'error': 'job không có ngân sách băng thông (chỉ download đang chạy)'}, 409)
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                job.bandwidth.set_rate(body.get('max_rate'), reason='api')
+            except (ValueError, TypeError, AttributeError) as e:
+                return self._send_json({'error': str(e)}, 400)
+            return self._send_json(job.bandwidth.snapshot())
+        self._send_json({'error': 'not found'}, 404)
+
+    def do_DELETE(self):
+        parts = [p for p in urlparse(self.path).path.strip('/').split('/') if p]
+        if len(parts) == 2 and parts[0] == 'jobs':
+            job = self._job_or_404(parts[1])
+            if job:
+                self.manager.cancel(job.id)
+                self._send_json(job.to_dict())
+            return
+        self._send_json({'error': 'not found'}, 404)
+
+
+def make_server(manager: JobManager, host: str = '127.0.0.1', port: int = 8765) -> ThreadingHTTPServer:
+    handler = type('AIOJobHandler', (_Handler,), {'manager': manager})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(root: str = 'aio_jobs', host: str = '127.0.0.1', port: int = 8765, max_jobs: int = 2,
+          worker_budget: int = 16, rate: Optional[float] = None, burst: int = 1,
+          log_func: Optional[callable] = None, stop_event: Optional[threading.Event] = None):
+    """Chạy job server tới khi bị ngắt (Ctrl+C hoặc stop_event được set)"""
+    manager = JobManager(root, max_jobs=max_jobs, worker_budget=worker_budget, rate=rate, burst=burst)
+    server = make_server(manager, host, port)
+    if stop_event is not None:
+        threading.Thread(target=lambda: (stop_event.wait(), server.shutdown()), daemon=True).start()
+    log_func and log_func(f'Listening on http://{host}:{server.server_address[1]} '
+                          f'(max_jobs={max_jobs}, worker_budget={worker_budget}, rate={rate or "∞"}/s)',
+                          prefix='JobServer')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.shutdown()
+        server.server_close()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+core/log_sink.py
+Ghi log ra đĩa bằng 1 thread nền, bộ nhớ có giới hạn, xoay vòng file theo dung lượng / thời gian.
+
+- write(line): chỉ put_nowait vào queue có maxsize -> không bao giờ chặn worker; queue đầy thì bỏ dòng
+  và đếm `dropped` (ghi 1 dòng cảnh báo vào file khi queue thông trở lại).
+- Mỗi phiên tạo các segment <prefix>_<YYYYmmdd_HHMMSS>_<NNN>.log trong `directory`; segment đóng lại
+  được nén .gz (tuỳ chọn) và chỉ giữ `keep` segment gần nhất của phiên.
+- export(path): flush rồi ghép các segment của phiên (kể cả .gz) thành 1 file text.
+"""
+import os
+import gzip
+import glob
+import queue
+import shutil
+import threading
+import time
+from typing import List, Optional
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024   # xoay vòng khi segment vượt 10MB
+DEFAULT_ROTATE_SECONDS = 3600          # ... hoặc sau 1 giờ
+DEFAULT_KEEP = 20                      # số segment giữ lại của phiên
+DEFAULT_QUEUE_LINES = 10000            # số dòng tối đa chờ ghi trong RAM
+
+
+class RotatingLogSink:
+    """Sink log xoay vòng, ghi bất đồng bộ"""
+
+    def __init__(self, directory: str, prefix: str = 'aio', max_bytes: int = DEFAULT_MAX_BYTES,
+                 rotate_seconds: Optional[float] = DEFAULT_ROTATE_SECONDS, keep: int = DEFAULT_KEEP,
+                 compress: bool = True, max_queue: int = DEFAULT_QUEUE_LINES, flush_interval: float = 1.0):
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.session = f"{prefix}_{time.strftime('%Y%m%d_%H%M%S')}"
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.keep = max(1, keep)
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._index = 0
+        self._file = None
+        self._opened = 0.0
+        self._size = 0
+        self._reported_drops = 0
+        self._io_lock = threading.Lock()  # giữa thread ghi và export()/close()
+        self._thread = threading.Thread(target=self._run, name='log-sink', daemon=True)
+        self._thread.start()
+
+    # ---- gọi từ bất kỳ thread nào ----
+    def write(self, line: str):
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Chờ thread ghi xử lý hết các dòng đã write() trước đó"""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+
+    @property
+    def current_path(self) -> Optional[str]:
+        return self._file.name if self._file else None
+
+    def segments(self) -> List[str]:
+        """Các segment của phiên này, cũ -> mới (gồm cả .gz)"""
+        paths = glob.glob(os.path.join(self.directory, f"{self.session}_*.log*"))
+        return sorted(p for p in paths if not p.endswith('.tmp'))
+
+    def export(self, path: str) -> str:
+        """Ghép toàn bộ log của phiên (giải nén .gz) ra 1 file"""
+        self.flush()
+        with self._io_lock:
+            if self._file:
+                self._file.flush()
+            with open(path, 'wb') as out:
+                for seg in self.segments():
+                    opener = gzip.open if seg.endswith('.gz') else open
+                    with opener(seg, 'rb') as f:
+                        shutil.copyfileobj(f, out, 1024 * 1024)
+        return path
+
+    # ---- thread ghi ----
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                with self._io_lock:
+                    if self._file:
+                        self._file.flush()
+                    self._maybe_rotate()
+                continue
+            if item is None:
+                break
+            if isinstance(item, threading.Event):
+                with self._io_lock:
+                    if self._file:
+                        self._file.flush()
+                item.set()
+                continue
+            with self._io_lock:
+                self._write(item)
+        with self._io_lock:
+            self._close_segment()
+
+    def _write(self, line: str):
+        if self._file is None:
+            self._open_segment()
+        if self.dropped != self._reported_drops:
+            note = f"{time.strftime('%H:%M:%S')} | [LogSink] ⚠️ {self.dropped - self._reported_drops} dòng log bị bỏ (queue đầy)\n"
+            self._reported_drops = self.dropped
+            self._put(note)
+        self._put(line if line.endswith('\n') else line + '\n')
+        self._maybe_rotate()
+
+    def _put(self, text: str):
+        # file mở text mode -> write() trả số ký tự; max_bytes tính theo byte UTF-8 (tiếng Việt, emoji)
+        self._file.write(text)
+        self._size += len(text.encode('utf-8'))
+
+    def _maybe_rotate(self):
+        if self._file is None:
+            return
+        too_big = self.max_bytes and self._size >= self.max_bytes
+        too_old = self.rotate_seconds and time.time() - self._opened >= self.rotate_seconds and self._size
+        if too_big or too_old:
+            self._close_segment()
+
+    def _open_segment(self):
+        self._index += 1
+        path = os.path.join(self.directory, f"{self.session}_{self._index:03d}.log")
+        self._file = open(path, 'w', encoding='utf-8')
+        self._opened = time.time()
+        self._size = 0
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        path = self._file.name
+        self._file.close()
+        self._file = None
+        if self.compress:
+            try:
+                with open(path, 'rb') as src, gzip.open(path + '.gz.tmp', 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.replace(path + '.gz.tmp', path + '.gz')
+                os.remove(path)
+            except OSError:
+                pass
+        for old in self.segments()[:-self.keep]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
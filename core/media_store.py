@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+core/media_store.py
+Kho media dùng chung giữa các thư mục tải / job, khoá theo (video ID, format selector).
+
+- download_video(media_store=store): mục đã có trong kho -> hardlink (khác ổ đĩa: copy) vào out_folder, không tải lại;
+  tải xong -> file được hardlink vào kho (cùng ổ đĩa: không tốn thêm dung lượng).
+- Chỉ mục SQLite (<root>/media_store.db) ghi kích thước + lần dùng cuối; vượt max_bytes thì xoá mục dùng lâu nhất (LRU).
+  Kích thước tính theo file trong kho: file đã hardlink ra thư mục dự án vẫn còn sau khi kho xoá bản của mình.
+
+    store = MediaStore('D:/media_store', max_bytes='200G')
+    store.materialize(vid, selector, out_folder)   # -> path trong out_folder hoặc None
+    store.put(vid, selector, downloaded_path)
+"""
+import os
+import re
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+from typing import Callable, Dict, Optional, Union
+
+STORE_DB = 'media_store.db'
+_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(value: Union[str, int, float, None]) -> Optional[int]:
+    """'200G', '500M', 1073741824 -> byte; rỗng / 0 -> None (không giới hạn)"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value) if value > 0 else None
+    m = re.match(r'^\s*([\d.]+)\s*([KMGT]?)i?B?\s*$', str(value), re.I)
+    if not m:
+        if not str(value).strip():
+            return None
+        raise ValueError(f'Dung lượng không hợp lệ: {value!r} (vd: 200G, 500M)')
+    size = int(float(m.group(1)) * _UNITS[m.group(2).upper()])
+    return size if size > 0 else None
+
+
+def selector_key(quality: str, audio_only: bool = False, audio_codec: str = 'mp3') -> str:
+    """Khoá format: selector yt-dlp (+ codec khi tách audio) - cùng selector cho cùng kết quả"""
+    return f'audio:{audio_codec}|bestaudio/best' if audio_only else f'video|{quality}'
+
+
+def _link_or_copy(src: str, dst: str) -> str:
+    """Hardlink src -> dst, khác ổ đĩa / FS không hỗ trợ thì copy; trả về 'link' / 'copy'"""
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    tmp = f'{dst}.store-tmp'
+    try:
+        os.link(src, tmp)
+        how = 'link'
+    except OSError:
+        shutil.copy2(src, tmp)
+        how = 'copy'
+    os.replace(tmp, dst)
+    return how
+
+
+class MediaStore:
+    """Kho content-addressed + LRU theo dung lượng; thread-safe (1 connection + lock như DownloadJournal)"""
+
+    def __init__(self, root: str, max_bytes: Union[str, int, None] = None, log_func: Optional[Callable] = None):
+        self.root = os.path.abspath(root)
+        self.max_bytes = parse_size(max_bytes)
+        self.log_func = log_func
+        self.hits = 0
+        self.stored = 0
+        self.evicted = 0
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.root, STORE_DB), timeout=30,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS objects (
+                vid TEXT NOT NULL,
+                selector TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL,
+                last_used REAL,
+                PRIMARY KEY (vid, selector)
+            );
+            CREATE INDEX IF NOT EXISTS objects_lru ON objects(last_used);
+        ''')
+
+    def _log(self, msg: str):
+        if self.log_func:
+            try:
+                self.log_func(msg, prefix='MediaStore')
+            except TypeError:
+                self.log_func(f'[MediaStore] {msg}')
+
+    def _object_path(self, vid: str, selector: str, filename: str) -> str:
+        digest = hashlib.sha1(selector.encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.root, vid[:2], vid, digest, filename)
+
+    # ---- tra cứu ----
+    def lookup(self, vid: str, selector: str) -> Optional[str]:
+        """Path trong kho (đánh dấu vừa dùng) hoặc None; mục mất file bị xoá khỏi chỉ mục"""
+        with self._lock:
+            row = self._conn.execute('SELECT path FROM objects WHERE vid=? AND selector=?', (vid, selector)).fetchone()
+            if row is None:
+                return None
+            if not os.path.isfile(row[0]):
+                self._conn.execute('DELETE FROM objects WHERE vid=? AND selector=?', (vid, selector))
+                return None
+            self._conn.execute('UPDATE objects SET last_used=? WHERE vid=? AND selector=?', (time.time(), vid, selector))
+            return row[0]
+
+    def materialize(self, vid: str, selector: str, out_folder: str) -> Optional[str]:
+        """Đưa bản trong kho vào out_folder (giữ tên file gốc); None nếu kho chưa có"""
+        src = self.lookup(vid, selector)
+        if src is None:
+            return None
+        dst = os.path.join(out_folder, os.path.basename(src))
+        try:
+            if os.path.exists(dst) and os.path.samefile(src, dst):
+                how = 'link'
+            else:
+                how = _link_or_copy(src, dst)
+        except OSError as e:
+            self._log(f'Không lấy được {vid} từ kho: {e}')
+            return None
+        self.hits += 1
+        self._log(f'{vid}: dùng lại từ kho ({how}) -> {dst}')
+        return dst
+
+    # ---- ghi ----
+    def put(self, vid: str, selector: str, path: str) -> Optional[str]:
+        """Thêm file vừa tải vào kho (hardlink nếu được) rồi dọn LRU; trả về path trong kho"""
+        if not vid or not path or not os.path.isfile(path):
+            return None
+        dst = self._object_path(vid, selector, os.path.basename(path))
+        try:
+            if not (os.path.exists(dst) and os.path.samefile(path, dst)):
+                _link_or_copy(path, dst)
+        except OSError as e:
+            self._log(f'Không lưu được {vid} vào kho: {e}')
+            return None
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute('SELECT path FROM objects WHERE vid=? AND selector=?', (vid, selector)).fetchone()
+            self._conn.execute('INSERT OR REPLACE INTO objects(vid, selector, path, size, created, last_used) '
+                               'VALUES (?, ?, ?, ?, ?, ?)', (vid, selector, dst, os.path.getsize(dst), now, now))
+        if old and old[0] != dst:
+            self._remove_file(old[0])
+        self.stored += 1
+        self.evict(keep=(vid, selector))
+        return dst
+
+    def evict(self, keep: Optional[tuple] = None) -> int:
+        """Xoá mục dùng lâu nhất tới khi tổng dung lượng <= max_bytes (không xoá `keep`); trả về số mục đã xoá"""
+        if not self.max_bytes:
+            return 0
+        removed = []
+        with self._lock:
+            used = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+            if used <= self.max_bytes:
+                return 0
+            for vid, selector, path, size in self._conn.execute(
+                    'SELECT vid, selector, path, size FROM objects ORDER BY last_used').fetchall():
+                if used <= self.max_bytes:
+                    break
+                if keep is not None and (vid, selector) == tuple(keep):
+                    continue
+                self._conn.execute('DELETE FROM objects WHERE vid=? AND selector=?', (vid, selector))
+                removed.append(path)
+                used -= size
+        for path in removed:
+            self._remove_file(path)
+        self.evicted += len(removed)
+        if removed:
+            self._log(f'LRU: xoá {len(removed)} mục, còn {used / 1024 / 1024:.1f}MB / {self.max_bytes / 1024 / 1024:.1f}MB')
+        return len(removed)
+
+    def _remove_file(self, path: str):
+        try:
+            os.remove(path)
+            os.removedirs(os.path.dirname(path))  # dọn thư mục rỗng, dừng ở thư mục còn file (root có .db)
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            count, used = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects').fetchone()
+        return {'objects': count, 'bytes': used, 'hits': self.hits, 'stored': self.stored, 'evicted': self.evicted}
+
+    def summary(self) -> str:
+        st = self.stats()
+        return (f"kho {st['objects']} mục / {st['bytes'] / 1024 / 1024:.1f}MB | dùng lại {st['hits']} | "
+                f"thêm {st['stored']} | LRU xoá {st['evicted']}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+core/metrics.py
+Bộ đếm dùng chung giữa process chính và worker process (giống RateLimiter trong core/throttle.py):
+số request đang chạy (in-flight), tổng request, số lần gặp 429, số byte đã tải.
+
+- SharedCounters giữ giá trị trong multiprocessing.Value -> truyền cho ProcessPoolExecutor qua initializer
+  (xem ScraperChecker._pool_kwargs) để mọi worker cộng vào cùng một chỗ.
+- performance_monitor.PerformanceMonitor đọc snapshot() để xuất OpenMetrics.
+"""
+import multiprocessing
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+COUNTERS = ('requests_total', 'rate_limited_total', 'downloaded_bytes_total')
+GAUGES = ('inflight_requests',)
+
+# Nhóm lỗi cho nhãn error_class (từ cột 'Tình trạng' / 'Trạng thái' / 'error' của kết quả)
+ERROR_CLASSES = (
+    ('429', 'rate_limited'), ('too many requests', 'rate_limited'), ('rate limited', 'rate_limited'),
+    ('sign in', 'sign_in'), ('sign-in', 'sign_in'),
+    ('timed out', 'timeout'), ('timeout', 'timeout'),
+    ('private', 'private'), ('unavailable', 'unavailable'), ('livestream', 'upcoming'),
+    ('metadata missing', 'metadata_missing'), ('không lấy được metadata', 'metadata_missing'),
+    ('cancelled', 'cancelled'),
+)
+
+
+class SharedCounters:
+    """Bộ đếm float trong shared memory, an toàn giữa các process"""
+
+    def __init__(self):
+        self._values = {name: multiprocessing.Value('d', 0.0, lock=False) for name in COUNTERS + GAUGES}
+        self._lock = multiprocessing.Lock()
+
+    def add(self, name: str, delta: float = 1.0):
+        value = self._values.get(name)
+        if value is None:
+            return
+        with self._lock:
+            value.value += delta
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {name: v.value for name, v in self._values.items()}
+
+
+_counters: Optional[SharedCounters] = None
+
+
+def install(counters: Optional[SharedCounters]):
+    """Initializer của worker process: dùng chung bộ đếm của process cha"""
+    global _counters
+    _counters = counters
+
+
+def current() -> SharedCounters:
+    """Bộ đếm của process hiện tại (tạo khi gọi lần đầu ở process chính)"""
+    global _counters
+    if _counters is None:
+        _counters = SharedCounters()
+    return _counters
+
+
+def add(name: str, delta: float = 1.0):
+    current().add(name, delta)
+
+
+@contextmanager
+def request():
+    """with metrics.request(): ... -> đếm in-flight + tổng request quanh 1 lần gọi YouTube"""
+    counters = current()
+    counters.add('requests_total')
+    counters.add('inflight_requests', 1)
+    try:
+        yield
+    finally:
+        counters.add('inflight_requests', -1)
+
+
+def classify_error(status: Optional[str]) -> Optional[str]:
+    """'OK'/None -> None; còn lại trả về nhóm lỗi ngắn gọn dùng làm nhãn metric"""
+    if status is None:
+        return None
+    text = str(status).strip().lower()
+    if not text or text == 'ok' or text == 'nan':
+        return None
+    for needle, label in ERROR_CLASSES:
+        if needle in text:
+            return label
+    return 'other'
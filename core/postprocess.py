@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+core/postprocess.py
+Pool CPU riêng cho bước hậu xử lý FFmpeg (merge video+audio, FFmpegExtractAudio, FFmpegMetadata, EmbedThumbnail).
+
+download_video(..., postprocess_pool=pool) chỉ giữ slot mạng trong lúc tải; khi yt-dlp tới bước post_process
+thì trạng thái được giữ lại và chạy trên pool này -> slot mạng nhận ngay item kế tiếp trong lúc CPU chuyển mã.
+
+- workers mặc định = số core; mỗi tiến trình ffmpeg được giới hạn `ffmpeg_threads` thread
+  (mặc định core / workers, tối thiểu 1) để các lượt chuyển mã song song không tranh nhau CPU.
+- ffmpeg là subprocess nên ThreadPoolExecutor là đủ (thread chỉ chờ tiến trình con).
+"""
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# audio_format của download_video / CLI: 4 giá trị đầu remux luồng gốc (FFmpegExtractAudio copy khi codec trùng),
+# còn lại chuyển mã trên pool này
+AUDIO_FORMATS = ('best', 'm4a', 'aac', 'opus', 'mp3', 'vorbis', 'flac', 'alac', 'wav')
+
+
+def cpu_count() -> int:
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except (AttributeError, OSError):
+        return max(1, os.cpu_count() or 1)
+
+
+class PostProcessPool:
+    """ThreadPoolExecutor cho FFmpeg + số thread mỗi tiến trình ffmpeg (ffmpeg_args)"""
+
+    def __init__(self, workers: Optional[int] = None, ffmpeg_threads: Optional[int] = None):
+        cores = cpu_count()
+        self.workers = max(1, int(workers or cores))
+        self.ffmpeg_threads = max(1, int(ffmpeg_threads or cores // self.workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='aio-pp')
+
+    def ffmpeg_args(self) -> Dict[str, List[str]]:
+        """postprocessor_args cho yt-dlp: áp '-threads N' cho output đầu tiên của mọi post-processor FFmpeg"""
+        return {'default': ['-threads', str(self.ffmpeg_threads)]}
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        return False
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+core/prefetch.py
+Prefetch metadata cho downloader: extract_info(download=False) (tải trang, player JS, chọn format) của N item
+kế tiếp trong hàng đợi chạy nền, để slot tải nhận info đã sẵn sàng và bắt đầu kéo byte ngay.
+
+- MetadataPrefetcher(opts, lookahead, workers): refill(items) nhận danh sách item sắp chạy
+  (DownloadScheduler.peek), tự bỏ qua item đã có / đang extract; take(item) trả info đã chọn format
+  (chờ nếu đang extract dở), None nếu lỗi / hết hạn -> download_video tự extract như cũ.
+- URL đã ký (YouTube: tham số `expire=` trong URL format) được kiểm tra lúc take(): còn dưới
+  EXPIRY_MARGIN giây thì extract lại; URL không có expire thì coi info quá MAX_AGE giây là cũ.
+"""
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import yt_dlp
+
+from core import metrics
+from core import throttle
+from core import timing
+
+PREFETCH_LOOKAHEAD = 4      # số item kế tiếp được extract trước
+PREFETCH_WORKERS = 2        # số extract chạy nền cùng lúc
+EXPIRY_MARGIN = 300         # URL còn hạn < 5 phút -> extract lại
+MAX_AGE = 1800              # info không có expire= quá 30 phút -> extract lại
+
+
+def _format_urls(info: Dict[str, Any]):
+    for fmt in info.get('requested_formats') or [info]:
+        if fmt.get('url'):
+            yield fmt['url']
+
+
+def expires_at(info: Dict[str, Any]) -> Optional[float]:
+    """Thời điểm sớm nhất một URL format đã chọn hết hạn (tham số expire= của URL ký), None nếu không rõ"""
+    stamps = []
+    for url in _format_urls(info):
+        try:
+            value = parse_qs(urlparse(url).query).get('expire')
+            if value:
+                stamps.append(float(value[0]))
+        except (ValueError, TypeError):
+            continue
+    return min(stamps) if stamps else None
+
+
+class MetadataPrefetcher:
+    """Extract nền cho các item sắp tải; thread-safe"""
+
+    def __init__(self, opts: Dict[str, Any], lookahead: int = PREFETCH_LOOKAHEAD, workers: int = PREFETCH_WORKERS,
+                 url_for: Callable[[Any], str] = str, stop_event: Optional[object] = None,
+                 log_func: Optional[Callable] = None):
+        # Không post-process / không ghi file ở bước prefetch; archive giữ nguyên để bỏ qua item đã tải
+        self.opts = {**opts, 'postprocessors': [], 'progress_hooks': [], 'postprocessor_hooks': []}
+        self.lookahead = max(0, int(lookahead))
+        self.url_for = url_for
+        self.stop_event = stop_event
+        self.log_func = log_func
+        self.hits = 0
+        self.misses = 0
+        self.refreshed = 0
+        self._entries: Dict[Any, Tuple[Future, Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='aio-prefetch')
+
+    def refill(self, upcoming: Iterable[Any]):
+        """Bắt đầu extract cho các item sắp chạy chưa có trong cache (tối đa lookahead đang giữ)"""
+        if not self.lookahead:
+            return
+        with self._lock:
+            for item in upcoming:
+                if len(self._entries) >= self.lookahead:
+                    break
+                if item in self._entries:
+                    continue
+                item_timings: Dict[str, float] = {}
+                self._entries[item] = (self._executor.submit(self._extract, item, item_timings), item_timings)
+
+    def take(self, item: Any, timings: Optional[Dict[str, float]] = None) -> Optional[Dict[str, Any]]:
+        """Lấy info đã prefetch (chờ nếu đang extract); None nếu chưa prefetch / lỗi / URL sắp hết hạn"""
+        with self._lock:
+            entry = self._entries.pop(item, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        fut, item_timings = entry
+        info, fetched = fut.result()
+        for stage, seconds in item_timings.items():
+            timing.add(timings, stage, seconds)
+        if not info:
+            self.misses += 1
+            return None
+        if self._stale(info, fetched):
+            self.refreshed += 1
+            return None
+        self.hits += 1
+        return info
+
+    def shutdown(self):
+        with self._lock:
+            for fut, _ in self._entries.values():
+                fut.cancel()
+            self._entries.clear()
+        self._executor.shutdown(wait=False)
+
+    def summary(self) -> str:
+        return f'prefetch hit {self.hits}, miss {self.misses}, refreshed {self.refreshed}'
+
+    # ---- nội bộ ----
+    def _extract(self, item: Any, item_timings: Dict[str, float]) -> Tuple[Optional[Dict[str, Any]], float]:
+        if self.stop_event is not None and hasattr(self.stop_event, 'is_set') and self.stop_event.is_set():
+            return None, time.time()
+        try:
+            timing.add(item_timings, timing.STAGE_RATE_WAIT, throttle.acquire(self.stop_event))
+            with yt_dlp.YoutubeDL(self.opts) as ydl:
+                with timing.measure(item_timings, timing.STAGE_EXTRACT), metrics.request():
+                    info = ydl.extract_info(self.url_for(item), download=False)
+                # chỉ giữ video đơn đã chọn format; playlist / item bị archive bỏ qua -> download_video tự xử lý
+                if not info or info.get('_type', 'video') != 'video':
+                    return None, time.time()
+                return ydl.sanitize_info(info), time.time()
+        except Exception as e:
+            if self.log_func:
+                try:
+                    self.log_func(f'Prefetch {item}: {e}', prefix='Prefetch')
+                except Exception:
+                    pass
+            return None, time.time()
+
+    @staticmethod
+    def _stale(info: Dict[str, Any], fetched: float) -> bool:
+        now = time.time()
+        expire = expires_at(info)
+        if expire is not None:
+            return expire - now < EXPIRY_MARGIN
+        return now - fetched > MAX_AGE
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+core/segmented.py
+Bộ tải nhiều kết nối trong tiến trình (thay aria2c) cho format progressive / 1 file (protocol http/https).
+
+- Chia file thành các segment byte-range (1..10MB, ~4 segment / kết nối) và tải song song bằng
+  `connections` thread; mỗi thread giữ 1 kết nối keep-alive (http.client) dùng lại cho các segment kế tiếp.
+- File .part được cấp phát trước đủ kích thước, mỗi segment ghi thẳng vào vị trí của mình.
+- Trạng thái từng segment lưu ở `<file>.part.segments` (ghi lại mỗi giây): dừng / lỗi giữa chừng thì lần sau
+  chỉ tải tiếp phần còn thiếu của từng segment.
+- Đăng ký vào yt-dlp như 1 external downloader tên 'aiosegmented':
+      ydl_opts['external_downloader'] = {'http': 'aiosegmented'}   # DASH/HLS vẫn dùng bộ tải native
+  Server không trả Content-Range / có proxy -> quay về HttpFD của yt-dlp.
+- Progress hook nhận tổng byte của mọi segment, gọi từ từng thread segment ngoài lock: thread nào đang ngủ vì
+  cap băng thông (BandwidthBudget / ratelimit) thì chỉ chặn kết nối của nó, các kết nối khác vẫn báo tiến độ
+  và tự trả phần nợ băng thông của mình.
+"""
+import os
+import json
+import time
+import socket
+import threading
+import http.client
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+import yt_dlp
+from yt_dlp.downloader import external as _external
+from yt_dlp.downloader.external import ExternalFD
+from yt_dlp.downloader.http import HttpFD
+
+NAME = 'aiosegmented'
+SEGMENT_CONNECTIONS = 8
+MIN_SEGMENT = 1024 * 1024
+MAX_SEGMENT = 10 * 1024 * 1024     # = http_chunk_size mặc định, YouTube bóp tốc độ range lớn hơn
+SEGMENTS_PER_CONNECTION = 4
+READ_BLOCK = 64 * 1024
+STATE_SUFFIX = '.segments'
+STATE_INTERVAL = 1.0
+RETRY_STATUS = (429, 500, 502, 503, 504)   # lỗi tạm thời của CDN -> thử lại segment, các 4xx khác dừng luôn
+
+
+class _KeepAlivePool:
+    """1 kết nối keep-alive cho mỗi (thread, host); đóng hết khi xong file"""
+
+    def __init__(self, timeout: float = 20.0):
+        self.timeout = timeout
+        self._local = threading.local()
+        self._all: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def _conn(self, scheme: str, netloc: str, fresh: bool = False) -> http.client.HTTPConnection:
+        conns = getattr(self._local, 'conns', None)
+        if conns is None:
+            conns = self._local.conns = {}
+        key = (scheme, netloc)
+        if fresh and key in conns:
+            conns.pop(key).close()
+        if key not in conns:
+            cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            conns[key] = cls(netloc, timeout=self.timeout)
+            with self._lock:
+                self._all.append(conns[key])
+        return conns[key]
+
+    def get(self, url: str, headers: Dict[str, str], redirects: int = 5,
+            fresh: bool = False) -> http.client.HTTPResponse:
+        """fresh=True: bỏ kết nối cũ của thread (lượt trước lỗi giữa chừng, còn response chưa đọc hết)"""
+        for _ in range(redirects + 1):
+            parts = urlsplit(url)
+            path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+            for attempt in range(2):
+                conn = self._conn(parts.scheme, parts.netloc, fresh=fresh or attempt > 0)
+                try:
+                    conn.request('GET', path, headers=headers)
+                    resp = conn.getresponse()
+                    break
+                except (http.client.HTTPException, BrokenPipeError, ConnectionResetError, socket.timeout):
+                    if attempt:  # kết nối keep-alive cũ bị server đóng / hỏng -> thử lại 1 lần với kết nối mới
+                        raise
+            fresh = False
+            if resp.status in (301, 302, 303, 307, 308) and resp.getheader('Location'):
+                resp.read()
+                url = urljoin(url, resp.getheader('Location'))
+                continue
+            return resp
+        raise yt_dlp.utils.DownloadError(f'Quá nhiều redirect: {url}')
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+
+
+class SegmentedFD(ExternalFD):
+    """External downloader 'aiosegmented': range song song + resume theo segment"""
+    SUPPORTED_PROTOCOLS = ('http', 'https')
+
+    @classmethod
+    def get_basename(cls):
+        return NAME
+
+    @classmethod
+    def available(cls, path=None):
+        return True  # chạy trong tiến trình, không cần binary
+
+    # ---- yt-dlp entry ----
+    def real_download(self, filename, info_dict):
+        if self.params.get('proxy'):
+            return self._native(filename, info_dict)
+        url = info_dict['url']
+        headers = dict(info_dict.get('http_headers') or {})
+        cookies = self._cookie_header(url)
+        if cookies:
+            headers['Cookie'] = cookies
+        pool = _KeepAlivePool(self.params.get('socket_timeout') or 20.0)
+        try:
+            size = self._probe(pool, url, headers)
+            if not size:
+                return self._native(filename, info_dict)
+            self.report_destination(filename)
+            tmpfilename = self.temp_name(filename)
+            segments = self._prepare(tmpfilename, size)
+            self._run(pool, url, headers, filename, tmpfilename, size, segments, info_dict)
+        finally:
+            pool.close()
+        self.try_rename(tmpfilename, filename)
+        self._hook_progress({'filename': filename, 'status': 'finished', 'downloaded_bytes': size,
+                             'total_bytes': size, 'elapsed': time.time() - self._started}, info_dict)
+        return True
+
+    def _native(self, filename, info_dict):
+        fd = HttpFD(self.ydl, self.params)
+        for ph in self._progress_hooks:
+            fd.add_progress_hook(ph)
+        return fd.real_download(filename, info_dict)
+
+    def _cookie_header(self, url: str) -> Optional[str]:
+        try:
+            return self.ydl.cookiejar.get_cookie_header(url)
+        except Exception:
+            return None
+
+    def _probe(self, pool: _KeepAlivePool, url: str, headers: Dict[str, str]) -> Optional[int]:
+        """Tổng kích thước qua Range 0-0; None nếu server không hỗ trợ range"""
+        resp = pool.get(url, {**headers, 'Range': 'bytes=0-0'})
+        resp.read()
+        content_range = resp.getheader('Content-Range') or ''
+        if resp.status != 206 or '/' not in content_range:
+            return None
+        total = content_range.rpartition('/')[2]
+        return int(total) if total.isdigit() and int(total) > 0 else None
+
+    # ---- segment + resume ----
+    def _plan(self, size: int) -> List[List[int]]:
+        connections = max(1, int(self.params.get('aio_segment_connections') or SEGMENT_CONNECTIONS))
+        seg = -(-size // (connections * SEGMENTS_PER_CONNECTION))
+        seg = max(MIN_SEGMENT, min(MAX_SEGMENT, seg))
+        return [[start, min(start + seg, size) - 1, start] for start in range(0, size, seg)]  # [start, end, pos]
+
+    def _prepare(self, tmpfilename: str, size: int) -> List[List[int]]:
+        state_path = tmpfilename + STATE_SUFFIX
+        if self.params.get('continuedl', True) and os.path.isfile(state_path) and os.path.isfile(tmpfilename):
+            try:
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                if state.get('size') == size and os.path.getsize(tmpfilename) == size:
+                    self.to_screen(f'[{NAME}] Tải tiếp {tmpfilename}')
+                    return [list(s) for s in state['segments']]
+            except (OSError, ValueError, KeyError):
+                pass
+        with open(tmpfilename, 'wb') as f:
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+            except (AttributeError, OSError):
+                f.truncate(size)
+        segments = self._plan(size)
+        self._save_state(state_path, size, segments)
+        return segments
+
+    @staticmethod
+    def _save_state(path: str, size: int, segments: List[List[int]]):
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'size': size, 'segments': segments}, f)
+        os.replace(tmp, path)
+
+    # ---- tải ----
+    def _run(self, pool, url, headers, filename, tmpfilename, size, segments, info_dict):
+        state_path = tmpfilename + STATE_SUFFIX
+        lock = threading.Lock()
+        state_guard = threading.Lock()
+        abort = threading.Event()
+        errors: List[BaseException] = []
+        todo = [i for i, (start, end, pos) in enumerate(segments) if pos <= end]
+        resumed = sum(pos - start for start, _, pos in segments)
+        done = [resumed]
+        self._started = start_time = time.time()
+        last_state = [start_time]
+        retries = self.params.get('retries', 10)
+        retries = 10 if retries is None or retries == float('inf') else int(retries)
+
+        def _progress(nbytes: int):
+            # lock chỉ giữ bộ đếm; slow_down / hook (có thể ngủ vì cap băng thông) chạy ngoài lock
+            with lock:
+                done[0] += nbytes
+                downloaded = done[0]
+                now = time.time()
+                save = now - last_state[0] >= STATE_INTERVAL
+                if save:
+                    last_state[0] = now
+                    snapshot = [list(s) for s in segments]
+            fresh = downloaded - resumed
+            self.slow_down(start_time, now, fresh)
+            self._hook_progress({
+                'status': 'downloading', 'filename': filename, 'tmpfilename': tmpfilename,
+                'downloaded_bytes': downloaded, 'total_bytes': size, 'elapsed': now - start_time,
+                'speed': self.calc_speed(start_time, now, fresh),
+                'eta': self.calc_eta(start_time, now, size - resumed, fresh),
+            }, info_dict)
+            if save and state_guard.acquire(blocking=False):
+                try:
+                    self._save_state(state_path, size, snapshot)
+                finally:
+                    state_guard.release()
+
+        def _segment(idx: int):
+            seg = segments[idx]
+            fresh = False
+            for attempt in range(retries + 1):
+                resp = None
+                try:
+                    resp = pool.get(url, {**headers, 'Range': f'bytes={seg[2]}-{seg[1]}'}, fresh=fresh)
+                    if resp.status in RETRY_STATUS:
+                        raise http.client.HTTPException(f'HTTP {resp.status} cho range {seg[2]}-{seg[1]}')
+                    if resp.status != 206:
+                        resp.close()
+                        raise yt_dlp.utils.DownloadError(f'HTTP {resp.status} cho range {seg[2]}-{seg[1]}')
+                    with open(tmpfilename, 'r+b') as f:
+                        f.seek(seg[2])
+                        while seg[2] <= seg[1]:
+                            if abort.is_set():
+                                resp.close()
+                                return
+                            block = resp.read(min(READ_BLOCK, seg[1] - seg[2] + 1))
+                            if not block:
+                                raise http.client.IncompleteRead(b'', seg[1] - seg[2] + 1)
+                            f.write(block)
+                            seg[2] += len(block)
+                            _progress(len(block))
+                    return
+                except (http.client.HTTPException, OSError) as e:
+                    # response dở dang còn nằm trên kết nối -> đóng, lượt sau mở kết nối mới
+                    if resp is not None:
+                        resp.close()
+                    fresh = True
+                    if attempt >= retries or abort.is_set():
+                        raise
+                    self.report_retry(e, attempt + 1, retries)
+                    time.sleep(min(0.5 * 2 ** attempt, 5.0))
+
+        def _worker():
+            while not abort.is_set():
+                with lock:
+                    if not todo:
+                        return
+                    idx = todo.pop(0)
+                try:
+                    _segment(idx)
+                except BaseException as e:
+                    errors.append(e)
+                    abort.set()
+                    return
+
+        connections = max(1, int(self.params.get('aio_segment_connections') or SEGMENT_CONNECTIONS))
+        threads = [threading.Thread(target=_worker, name=f'{NAME}-{i}', daemon=True)
+                   for i in range(min(connections, len(todo)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            with state_guard:
+                self._save_state(state_path, size, segments)  # lần sau tải tiếp từ vị trí từng segment
+            raise errors[0]
+        try:
+            os.remove(state_path)
+        except OSError:
+            pass
+
+
+# yt-dlp chọn external downloader qua bảng tên nội bộ; bảng đổi tên / kiểu sau khi nâng cấp thì bỏ qua
+# (REGISTERED=False -> _build_ydl_opts_for_download không đặt external_downloader, dùng bộ tải native)
+_registry = getattr(_external, '_BY_NAME', None)
+REGISTERED = isinstance(_registry, dict)
+if REGISTERED:
+    _registry[NAME] = SegmentedFD
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+"""
+core/sharding.py
+Chia việc checker cho nhiều worker/nhiều máy qua một hàng đợi dùng chung có lease.
+
+- Coordinator: enqueue_checker_file() đưa từng (index, ID Video) vào queue.
+- Worker:      run_shard_worker() lease từng lô item, kiểm tra song song, trả kết quả về queue.
+               Lease hết hạn (worker chết) -> item tự quay lại trạng thái pending.
+- Merge:       merge_results() ghép toàn bộ kết quả thành 1 file giống run_checker.
+
+Backend cắm được qua open_queue(url):
+    sqlite:///path/queue.db   - một host / test (nhiều process cùng máy)
+    http://host:port          - worker ở máy khác, nói chuyện với `python -m core shard-serve`
+                                (token chung qua --token / $AIO_SHARD_TOKEN; HTTP chỉ phơi các lệnh của worker)
+Backend mới: register_backend('scheme', factory).
+"""
+import os
+import json
+import time
+import hmac
+import uuid
+import socket
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from core import timing
+
+# (item_id, index trong file gốc, video id)
+Lease = Tuple[int, int, str]
+
+
+class WorkQueue:
+    """Interface của backend hàng đợi. Mọi thao tác phải an toàn giữa nhiều worker."""
+
+    def put_many(self, items: Iterable[Tuple[int, str]]) -> int:
+        raise NotImplementedError
+
+    def lease(self, worker_id: str, n: int, lease_seconds: float) -> List[Lease]:
+        raise NotImplementedError
+
+    def heartbeat(self, worker_id: str, item_ids: List[int], lease_seconds: float) -> int:
+        raise NotImplementedError
+
+    def complete(self, worker_id: str, results: List[Tuple[int, dict]]) -> int:
+        raise NotImplementedError
+
+    def requeue_expired(self) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def results(self) -> List[dict]:
+        raise NotImplementedError
+
+    def set_meta(self, key: str, value: str):
+        raise NotImplementedError
+
+    def get_meta(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """Backend SQLite (WAL) - dùng cho 1 host hoặc làm kho của coordinator"""
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idx INTEGER NOT NULL,
+                vid TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT
+            );
+            CREATE INDEX IF NOT EXISTS items_state ON items(state, lease_until);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        ''')
+
+    def _tx(self, fn):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                out = fn(self._conn)
+                self._conn.execute('COMMIT')
+                return out
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def put_many(self, items: Iterable[Tuple[int, str]]) -> int:
+        rows = [(int(idx), str(vid)) for idx, vid in items]
+        self._tx(lambda c: c.executemany('INSERT INTO items(idx, vid) VALUES (?, ?)', rows))
+        return len(rows)
+
+    def _requeue_expired(self, c) -> int:
+        now = time.time()
+        c.execute('''UPDATE items SET state='failed', worker=NULL,
+                         result='{"error": "Lease expired ' || attempts || ' times"}'
+                     WHERE state='leased' AND lease_until < ? AND attempts >= ?''', (now, self.max_attempts))
+        cur = c.execute("UPDATE items SET state='pending', worker=NULL, lease_until=NULL "
+                        "WHERE state='leased' AND lease_until < ?", (now,))
+        return cur.rowcount
+
+    def requeue_expired(self) -> int:
+        return self._tx(self._requeue_expired)
+
+    def lease(self, worker_id: str, n: int, lease_seconds: float) -> List[Lease]:
+        def _lease(c):
+            self._requeue_expired(c)
+            rows = c.execute("SELECT id, idx, vid FROM items WHERE state='pending' ORDER BY id LIMIT ?",
+                             (int(n),)).fetchall()
+            if rows:
+                until = time.time() + lease_seconds
+                c.executemany("UPDATE items SET state='leased', worker=?, lease_until=?, attempts=attempts+1 "
+                              "WHERE id=?", [(worker_id, until, r[0]) for r in rows])
+            return [(r[0], r[1], r[2]) for r in rows]
+        return self._tx(_lease)
+
+    def heartbeat(self, worker_id: str, item_ids: List[int], lease_seconds: float) -> int:
+        if not item_ids:
+            return 0
+        until = time.time() + lease_seconds
+        return self._tx(lambda c: c.executemany(
+            "UPDATE items SET lease_until=? WHERE id=? AND worker=? AND state='leased'",
+            [(until, i, worker_id) for i in item_ids]).rowcount)
+
+    def complete(self, worker_id: str, results: List[Tuple[int, dict]]) -> int:
+        # Kết quả đến muộn (lease đã bị lấy lại) vẫn được nhận nếu item chưa xong
+        return self._tx(lambda c: c.executemany(
+            "UPDATE items SET state='done', worker=?, lease_until=NULL, result=? WHERE id=? AND state!='done'",
+            [(worker_id, json.dumps(r, ensure_ascii=False, default=str), i) for i, r in results]).rowcount)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute('SELECT state, COUNT(*) FROM items GROUP BY state').fetchall()
+        out = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        out.update({state: count for state, count in rows})
+        out['total'] = sum(out[k] for k in ('pending', 'leased', 'done', 'failed'))
+        return out
+
+    def results(self) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute('SELECT idx, vid, state, result FROM items ORDER BY idx, id').fetchall()
+        out = []
+        for idx, vid, state, result in rows:
+            data = json.loads(result) if result else {}
+            if state != 'done':
+                data = {'index': idx, 'ID Video': vid,
+                        'Tình trạng': f"Error: {data.get('error') or 'Not processed'}"}
+            out.append(data)
+        return out
+
+    def set_meta(self, key: str, value: str):
+        self._tx(lambda c: c.execute('INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)', (key, value)))
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM meta WHERE key=?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class HTTPWorkQueue(WorkQueue):
+    """Client cho coordinator chạy `python -m core shard-serve` (worker ở máy khác)"""
+
+    def __init__(self, base_url: str, timeout: float = 30, token: Optional[str] = None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.token = token or os.environ.get(TOKEN_ENV)
+
+    def _call(self, method: str, **params):
+        body = json.dumps(params, ensure_ascii=False).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        req = Request(f'{self.base_url}/{method}', data=body, headers=headers)
+        with urlopen(req, timeout=self.timeout) as r:
+            return json.loads(r.read() or b'null')
+
+    def put_many(self, items):
+        return self._call('put_many', items=[[int(i), str(v)] for i, v in items])
+
+    def lease(self, worker_id, n, lease_seconds):
+        return [tuple(x) for x in self._call('lease', worker_id=worker_id, n=n, lease_seconds=lease_seconds)]
+
+    def heartbeat(self, worker_id, item_ids, lease_seconds):
+        return self._call('heartbeat', worker_id=worker_id, item_ids=item_ids, lease_seconds=lease_seconds)
+
+    def complete(self, worker_id, results):
+        return self._call('complete', worker_id=worker_id, results=[[i, r] for i, r in results])
+
+    def requeue_expired(self):
+        return self._call('requeue_expired')
+
+    def stats(self):
+        return self._call('stats')
+
+    def results(self):
+        return self._call('results')
+
+    def set_meta(self, key, value):
+        return self._call('set_meta', key=key, value=value)
+
+    def get_meta(self, key):
+        return self._call('get_meta', key=key)
+
+
+_BACKENDS: Dict[str, Callable[[str], WorkQueue]] = {
+    'sqlite': lambda url, **_: SQLiteWorkQueue(url[len('sqlite://'):]),
+    'http': HTTPWorkQueue,
+    'https': HTTPWorkQueue,
+}
+
+
+def register_backend(scheme: str, factory: Callable[[str], WorkQueue]):
+    _BACKENDS[scheme] = factory
+
+
+def open_queue(url: str, token: Optional[str] = None) -> WorkQueue:
+    """sqlite://duong/dan.db (sqlite:///abs/path.db) | http://host:port | đường dẫn .db trần
+    token: token chung của coordinator HTTP (mặc định $AIO_SHARD_TOKEN)"""
+    scheme = urlparse(url).scheme
+    if not scheme or len(scheme) == 1:  # đường dẫn thường (kể cả C:\\...)
+        return SQLiteWorkQueue(url)
+    if scheme not in _BACKENDS:
+        raise ValueError(f'Không hỗ trợ queue backend: {scheme}')
+    return _BACKENDS[scheme](url, token=token) if token else _BACKENDS[scheme](url)
+
+
+# ===== Coordinator =====
+def enqueue_checker_file(fp: str, queue: WorkQueue, log_func: Optional[Callable] = None) -> int:
+    """Đọc file .xlsx/.csv có cột 'ID Video' và đưa từng dòng vào queue"""
+    ext = os.path.splitext(fp)[1].lower()
+    if ext in ('.xls', '.xlsx'):
+        df = pd.read_excel(fp)
+    elif ext == '.csv':
+        df = pd.read_csv(fp)
+    else:
+        df = None
+    if df is None or 'ID Video' not in df.columns:
+        raise ValueError("Invalid file or missing 'ID Video' column.")
+    items = [(idx, str(vid).strip()) for idx, vid in df['ID Video'].items() if str(vid).strip()]
+    n = queue.put_many(items)
+    queue.set_meta('input', os.path.abspath(fp))
+    log_func and log_func(f'📥 Enqueued {n} videos from {fp}', prefix='ShardCoordinator')
+    return n
+
+
+def merge_results(queue: WorkQueue, out_path: Optional[str] = None, log_func: Optional[Callable] = None) -> Optional[str]:
+    """Ghép kết quả của mọi worker thành 1 file Excel (cùng cột với run_checker)"""
+    from core.ScraperChecker import checker_output_frame
+    if not out_path:
+        src = queue.get_meta('input') or 'shard_input.xlsx'
+        out_path = os.path.splitext(src)[0] + '_checked_SHARDED.xlsx'
+    stats = queue.stats()
+    df_out = checker_output_frame(queue.results())
+    df_out.to_excel(out_path, index=False)
+    ok = int((df_out['Tình trạng'] == 'OK').sum()) if len(df_out) else 0
+    log_func and log_func(f'🎉 Merged {len(df_out)} rows ({ok} OK, pending={stats["pending"]}, '
+                          f'leased={stats["leased"]}, failed={stats["failed"]})', prefix='ShardCoordinator')
+    log_func and log_func(f'📁 File: {out_path}', prefix='ShardCoordinator')
+    return out_path
+
+
+# ===== Worker =====
+def run_shard_worker(queue: WorkQueue, max_workers: int = 6, batch_size: int = 20, lease_seconds: float = 180,
+                     worker_id: Optional[str] = None, idle_exit: bool = True, poll_interval: float = 5.0,
+                     progress_callback: Optional[Callable[[int, int], None]] = None,
+                     log_func: Optional[Callable] = None, stop_event: Optional[object] = None,
+                     item_callback: Optional[Callable[[dict], None]] = None,
+                     cookies_file: Optional[str] = None, cookies_from_browser: Optional[str] = None,
+                     timings: Optional[timing.JobTimings] = None) -> int:
+    """Lease lô item -> kiểm tra song song bằng process pool -> complete. Trả về số item đã xử lý."""
+    from core.ScraperChecker import _check_video, _pool_kwargs
+    timings = timings if timings is not None else timing.JobTimings('shard-worker')
+    worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+    processed = 0
+    outstanding: Dict[int, Lease] = {}
+    out_lock = threading.Lock()
+    done_event = threading.Event()
+
+    def _heartbeat():
+        while not done_event.wait(max(1.0, lease_seconds / 3)):
+            with out_lock:
+                ids = list(outstanding)
+            try:
+                queue.heartbeat(worker_id, ids, lease_seconds)
+            except Exception as e:
+                log_func and log_func(f'⚠️ Heartbeat failed: {e}', prefix='ShardWorker')
+
+    threading.Thread(target=_heartbeat, daemon=True).start()
+    log_func and log_func(f'🚀 Worker {worker_id}: {max_workers} processes, lease {batch_size} items',
+                          prefix='ShardWorker')
+
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, **_pool_kwargs()) as executor:
+            while not (stop_event and stop_event.is_set()):
+                leased = queue.lease(worker_id, batch_size, lease_seconds)
+                if not leased:
+                    stats = queue.stats()
+                    if idle_exit and stats['pending'] == 0 and stats['leased'] == 0:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                with out_lock:
+                    outstanding.update({item[0]: item for item in leased})
+                futures = {executor.submit(_check_video, idx, vid, cookies_file, cookies_from_browser): item_id
+                           for item_id, idx, vid in leased}
+                for fut in as_completed(futures):
+                    item_id = futures[fut]
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        _, idx, vid = outstanding[item_id]
+                        result = {'index': idx, 'ID Video': vid, 'Tình trạng': f'Error: Worker error: {str(e)[:50]}'}
+                    timings.absorb([result])
+                    queue.complete(worker_id, [(item_id, result)])
+                    with out_lock:
+                        outstanding.pop(item_id, None)
+                    processed += 1
+                    if item_callback:
+                        try:
+                            item_callback(result)
+                        except Exception:
+                            pass
+
+                stats = queue.stats()
+                if progress_callback:
+                    progress_callback(stats['done'] + stats['failed'], stats['total'])
+                log_func and log_func(f"✅ {processed} processed by this worker | queue: {stats['done']}/{stats['total']} done, "
+                                      f"{stats['pending']} pending", prefix='ShardWorker')
+    finally:
+        done_event.set()
+        log_func and log_func(f'⏱️ Stages: {timings.summary()}', prefix='ShardWorker')
+
+    return processed
+
+
+# ===== Coordinator HTTP (cho worker ở máy khác) =====
+# chỉ các lệnh worker / shard-status cần; enqueue, set_meta, merge chạy ở coordinator trên queue SQLite
+_RPC_METHODS = ('lease', 'heartbeat', 'complete', 'requeue_expired', 'stats')
+TOKEN_ENV = 'AIO_SHARD_TOKEN'
+_LOOPBACK = ('127.0.0.1', 'localhost', '::1')
+
+
+def make_queue_server(queue: WorkQueue, host: str = '127.0.0.1', port: int = 8766,
+                      token: Optional[str] = None) -> ThreadingHTTPServer:
+    """Phơi queue qua HTTP (POST /<method> với body JSON = tham số, header Authorization: Bearer <token>).
+    Bind ra ngoài loopback bắt buộc có token."""
+    token = token or os.environ.get(TOKEN_ENV)
+    if not token and host not in _LOOPBACK:
+        raise ValueError(f'Coordinator bind {host} cần token (--token hoặc ${TOKEN_ENV})')
+    expected = f'Bearer {token}'.encode('utf-8') if token else None
+
+    class _QueueHandler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_POST(self):
+            if expected is not None and not hmac.compare_digest(
+                    (self.headers.get('Authorization') or '').encode('utf-8'), expected):
+                self.send_error(401)
+                return
+            method = self.path.strip('/')
+            if method not in _RPC_METHODS:
+                self.send_error(404)
+                return
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                params = json.loads(self.rfile.read(length) or b'{}')
+                if method == 'put_many':
+                    params['items'] = [tuple(x) for x in params['items']]
+                if method == 'complete':
+                    params['results'] = [tuple(x) for x in params['results']]
+                out = getattr(queue, method)(**params)
+                body, status = json.dumps(out, ensure_ascii=False, default=str).encode('utf-8'), 200
+            except Exception as e:
+                body, status = json.dumps({'error': str(e)}).encode('utf-8'), 400
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), _QueueHandler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+core/throttle.py
+Giới hạn tốc độ request dùng chung giữa nhiều thread VÀ nhiều process (ProcessPoolExecutor).
+
+- RateLimiter: token-spacing limiter, trạng thái nằm trong multiprocessing.Value nên
+  các worker process (truyền qua initializer của pool) cùng chia một ngân sách request/giây.
+- install()/acquire(): limiter toàn cục của process hiện tại; get_video_info, enricher,
+  downloader gọi acquire() trước mỗi lần chạm tới YouTube. Không cài = không giới hạn.
+"""
+import time
+import threading
+import multiprocessing
+from typing import Optional
+
+
+class RateLimiter:
+    """Giới hạn N request/giây, cho phép burst nhỏ. An toàn giữa các process."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self._interval = multiprocessing.Value('d', 1.0 / rate if rate and rate > 0 else 0.0, lock=False)
+        self._next_slot = multiprocessing.Value('d', 0.0, lock=False)
+        self._burst = max(1, int(burst))
+        self._lock = multiprocessing.Lock()
+
+    @property
+    def rate(self) -> float:
+        interval = self._interval.value
+        return 1.0 / interval if interval > 0 else 0.0
+
+    def set_rate(self, rate: float):
+        """Đổi tốc độ khi đang chạy (0 hoặc None = không giới hạn)"""
+        with self._lock:
+            self._interval.value = 1.0 / rate if rate and rate > 0 else 0.0
+
+    def reserve(self) -> float:
+        """Giữ chỗ 1 slot, trả về số giây cần chờ (không sleep)"""
+        with self._lock:
+            interval = self._interval.value
+            if interval <= 0:
+                return 0.0
+            now = time.time()
+            slot = max(now - interval * (self._burst - 1), self._next_slot.value)
+            self._next_slot.value = slot + interval
+        return max(0.0, slot - now)
+
+    def acquire(self, stop_event: Optional[object] = None) -> float:
+        """Chờ tới lượt; trả về thời gian đã chờ (giây)"""
+        wait = self.reserve()
+        if wait > 0:
+            if stop_event is not None and hasattr(stop_event, 'wait'):
+                stop_event.wait(wait)
+            else:
+                time.sleep(wait)
+        return wait
+
+
+class WorkerBudget:
+    """Ngân sách worker dùng chung giữa các job chạy song song (trong 1 process)"""
+
+    def __init__(self, total: int):
+        self.total = max(1, int(total))
+        self.in_use = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, n: int, stop_event: Optional[object] = None) -> int:
+        """Chờ tới khi đủ n worker rảnh (n bị chặn bởi total); trả về số worker được cấp"""
+        n = max(1, min(int(n), self.total))
+        with self._cond:
+            while self.total - self.in_use < n:
+                if stop_event is not None and stop_event.is_set():
+                    return 0
+                self._cond.wait(timeout=0.5)
+            self.in_use += n
+        return n
+
+    def release(self, n: int):
+        with self._cond:
+            self.in_use = max(0, self.in_use - n)
+            self._cond.notify_all()
+
+
+# ===== Limiter toàn cục của process =====
+_limiter: Optional[RateLimiter] = None
+
+
+def install(limiter: Optional[RateLimiter]):
+    """Cài limiter cho process hiện tại (dùng làm initializer cho ProcessPoolExecutor)"""
+    global _limiter
+    _limiter = limiter
+
+
+def current() -> Optional[RateLimiter]:
+    return _limiter
+
+
+def acquire(stop_event: Optional[object] = None) -> float:
+    """Chờ limiter toàn cục nếu có; trả về thời gian đã chờ"""
+    limiter = _limiter
+    if limiter is None:
+        return 0.0
+    return limiter.acquire(stop_event)
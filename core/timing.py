@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+core/timing.py
+Đo thời gian theo từng giai đoạn (stage) của pipeline, gom thành histogram cho mỗi job.
+
+- Trong worker (kể cả process con): dùng dict thường `{stage: seconds}` cho từng item qua add()
+  rồi gắn vào dòng kết quả với khoá '_timings' (pickle được, không cần shared state).
+- Ở process chính: JobTimings.absorb() lấy '_timings' ra khỏi dòng kết quả và cộng vào histogram;
+  các stage chạy ở process chính (listing, ghi Excel...) đo trực tiếp bằng `with timings.stage(...)`.
+- Xuất: JobTimings.snapshot() (dict JSON được) -> performance_monitor.monitor.add_timings(...).
+"""
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+# ===== Tên stage =====
+STAGE_LISTING = 'channel_listing'      # lấy danh sách video/shorts của kênh
+STAGE_RATE_WAIT = 'rate_limit_wait'    # chờ RateLimiter + nhịp nghỉ của worker
+STAGE_EXTRACT = 'extract_network'      # yt-dlp extract_info (tải trang + parse nội bộ của yt-dlp)
+STAGE_PARSE = 'parse'                  # chuẩn hoá info dict -> dòng kết quả
+STAGE_BACKOFF = 'retry_backoff'        # sleep giữa các lần retry
+STAGE_TRANSCRIPT = 'transcript'        # youtube-transcript-api (enricher)
+STAGE_DOWNLOAD = 'download'            # extract + tải media (downloader)
+STAGE_POSTPROCESS = 'postprocess'      # FFmpeg post-processors (downloader)
+STAGE_SERIALIZE = 'serialize'          # dựng DataFrame đầu ra
+STAGE_EXCEL = 'excel_write'            # ghi file .xlsx
+
+STAGES = (STAGE_LISTING, STAGE_RATE_WAIT, STAGE_EXTRACT, STAGE_PARSE, STAGE_BACKOFF, STAGE_TRANSCRIPT,
+          STAGE_DOWNLOAD, STAGE_POSTPROCESS, STAGE_SERIALIZE, STAGE_EXCEL)
+
+# Cận trên các bucket (ms), bucket cuối là +Inf
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+
+
+def add(timings: Optional[Dict[str, float]], stage: str, seconds: float):
+    """Cộng dồn thời gian của 1 item vào dict `timings` (None = không đo)"""
+    if timings is not None and seconds is not None:
+        timings[stage] = timings.get(stage, 0.0) + max(0.0, float(seconds))
+
+
+@contextmanager
+def measure(timings: Optional[Dict[str, float]], stage: str):
+    """with measure(item_timings, STAGE_PARSE): ... -> add() khi khối lệnh kết thúc"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(timings, stage, time.perf_counter() - t0)
+
+
+class Histogram:
+    """Histogram bucket cố định (log-scale, ms) - gộp được giữa các job/process"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000.0
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.buckets[i] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def merge(self, other: 'Histogram'):
+        for i, n in enumerate(other.buckets):
+            self.buckets[i] += n
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Ước lượng phân vị (giây) bằng nội suy tuyến tính trong bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                lo = BUCKETS_MS[i - 1] / 1000.0 if i > 0 else 0.0
+                hi = BUCKETS_MS[i] / 1000.0 if i < len(BUCKETS_MS) else self.max
+                value = lo + (hi - lo) * ((rank - seen) / n)
+                return min(max(value, self.min), self.max)
+            seen += n
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count, 'sum_s': round(self.total, 6),
+            'mean_s': round(self.total / self.count, 6) if self.count else None,
+            'min_s': self.min, 'max_s': self.max,
+            'p50_s': self.quantile(0.5), 'p95_s': self.quantile(0.95), 'p99_s': self.quantile(0.99),
+            'buckets_ms': {**{str(b): n for b, n in zip(BUCKETS_MS, self.buckets)}, '+Inf': self.buckets[-1]},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Histogram':
+        h = cls()
+        buckets = data.get('buckets_ms') or {}
+        h.buckets = [int(buckets.get(str(b), 0)) for b in BUCKETS_MS] + [int(buckets.get('+Inf', 0))]
+        h.count = int(data.get('count') or 0)
+        h.total = float(data.get('sum_s') or 0.0)
+        h.min, h.max = data.get('min_s'), data.get('max_s')
+        return h
+
+
+class JobTimings:
+    """Histogram theo stage cho 1 job; thread-safe"""
+
+    def __init__(self, job: str = ''):
+        self.job = job
+        self.started = time.time()
+        self._hist: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            self._hist.setdefault(stage, Histogram()).observe(seconds)
+
+    def observe_all(self, timings: Optional[Dict[str, float]]):
+        for stage, seconds in (timings or {}).items():
+            self.observe(stage, seconds)
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def absorb(self, rows: Iterable[dict]):
+        """Lấy '_timings' ra khỏi các dòng kết quả (từ worker) và cộng vào histogram"""
+        for row in rows or []:
+            if isinstance(row, dict):
+                self.observe_all(row.pop('_timings', None))
+
+    def merge(self, other: 'JobTimings'):
+        with other._lock:
+            items = list(other._hist.items())
+        with self._lock:
+            for stage, h in items:
+                self._hist.setdefault(stage, Histogram()).merge(h)
+
+    def histogram(self, stage: str) -> Optional[Histogram]:
+        return self._hist.get(stage)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            order = [s for s in STAGES if s in self._hist] + sorted(s for s in self._hist if s not in STAGES)
+            stages = {s: self._hist[s].to_dict() for s in order}
+        return {'job': self.job, 'started': self.started, 'elapsed_s': round(time.time() - self.started, 3),
+                'stages': stages}
+
+    def summary(self) -> str:
+        """1 dòng: stage tổng/p50/p95, sắp theo tổng thời gian giảm dần"""
+        parts: List[str] = []
+        stages = self.snapshot()['stages']
+        for name, h in sorted(stages.items(), key=lambda kv: -kv[1]['sum_s']):
+            parts.append(f"{name} {h['sum_s']:.1f}s (n={h['count']}, p50={_fmt_ms(h['p50_s'])}, "
+                         f"p95={_fmt_ms(h['p95_s'])})")
+        return ' | '.join(parts) if parts else 'no timings'
+
+
+def _fmt_ms(seconds: Optional[float]) -> str:
+    return 'N/A' if seconds is None else f'{seconds * 1000:.0f}ms'
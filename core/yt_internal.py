@@ -27,8 +27,8 @@ async def autodiscover(channel: str, proxy: Optional[str]=None, cookies: Optiona
     Lấy (api_key, context) từ HTML kênh.
     """
     url = _build_channel_url(channel)
-    async with httpx.AsyncClient(http2=True, cookies=cookies) as session:
-        r = await session.get(url, proxy=proxy, timeout=30)
+    async with httpx.AsyncClient(http2=True, cookies=cookies, proxy=proxy) as session:
+        r = await session.get(url, timeout=30)
         r.raise_for_status()
         html = r.text
 
@@ -63,9 +63,10 @@ async def autodiscover(channel: str, proxy: Optional[str]=None, cookies: Optiona
 
     return key, ctx
 
-async def _post_json(session: httpx.AsyncClient, endpoint: str, payload: dict, key: str, proxy: Optional[str]=None):
+async def _post_json(session: httpx.AsyncClient, endpoint: str, payload: dict, key: str):
+    # proxy gắn ở AsyncClient (httpx >= 0.28 bỏ tham số proxy theo từng request)
     params = {"key": key}
-    r = await session.post(f"{API_BASE}/{endpoint}", params=params, json=payload, proxy=proxy, timeout=30)
+    r = await session.post(f"{API_BASE}/{endpoint}", params=params, json=payload, timeout=30)
     r.raise_for_status()
     return r.json()
 
@@ -86,8 +87,8 @@ async def browse_channel_items(channel: str, key: str, context: dict, tab: str="
     """
     items: List[dict] = []
     payload = {"context": context, "browseId": channel, "params": "EgZ2aWRlb3M" if tab=="videos" else "EgZzaG9ydHM"}
-    async with httpx.AsyncClient(http2=True, cookies=cookies) as session:
-        data = await _post_json(session, "browse", payload, key, proxy)
+    async with httpx.AsyncClient(http2=True, cookies=cookies, proxy=proxy) as session:
+        data = await _post_json(session, "browse", payload, key)
         contents = (data.get("contents", {}).get("twoColumnBrowseResultsRenderer", {})
                     .get("tabs", [])[0].get("tabRenderer", {}).get("content", {})
                     .get("sectionListRenderer", {}).get("contents", [])[0]
@@ -111,12 +112,12 @@ async def player_info_many(video_ids: List[str], key: str, context: dict, proxy:
     import asyncio as _asyncio
     sem = _asyncio.Semaphore(concurrency)
     results: List[dict] = []
-    async with httpx.AsyncClient(http2=True, cookies=cookies) as session:
+    async with httpx.AsyncClient(http2=True, cookies=cookies, proxy=proxy) as session:
         async def fetch(vid):
             async with sem:
                 payload = {"context": context, "videoId": vid}
                 try:
-                    data = await _post_json(session, "player", payload, key, proxy)
+                    data = await _post_json(session, "player", payload, key)
                     if "videoDetails" not in data:
                         data["videoId"] = vid
                     results.append(data)
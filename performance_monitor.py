@@ -2,22 +2,212 @@
 """
 performance_monitor.py - Monitor hiệu suất Turbo Mode
 Tạo file này trong thư mục gốc để theo dõi performance
+
+Tài nguyên: ResourceSampler (thread nền) lấy mẫu CPU / RSS / kết nối mạng của process chính và từng
+worker process vào ring buffer; log_stats, finish(), /metrics và GUI chỉ đọc mẫu mới nhất, không tự gọi psutil.
+
+Metrics OpenMetrics (Prometheus scrape được):
+    monitor.serve_metrics(9464)                  -> GET http://127.0.0.1:9464/metrics
+    monitor.start_metrics_file("aio.prom", 15)   -> ghi file định kỳ (textfile collector / chạy headless)
 """
 import time
+import json
 import psutil
 import os
+import threading
+from collections import deque
 from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+try:
+    from core import metrics as core_metrics
+except ImportError:  # chạy riêng file này, không có package core
+    core_metrics = None
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# name -> (type, help); counter được xuất với hậu tố _total
+METRICS = {
+    'aio_items_processed': ('counter', 'Items finished by a job (any status)'),
+    'aio_errors': ('counter', 'Items finished with an error, by error class'),
+    'aio_requests': ('counter', 'YouTube extraction requests started (all processes)'),
+    'aio_rate_limited': ('counter', 'HTTP 429 responses seen by retry logic (all processes)'),
+    'aio_inflight_requests': ('gauge', 'YouTube extraction requests in flight (all processes)'),
+    'aio_downloaded_bytes': ('counter', 'Media bytes downloaded (all processes)'),
+    'aio_queue_depth': ('gauge', 'Items not yet finished in a job'),
+    'aio_jobs': ('gauge', 'Jobs by state (job server)'),
+    'aio_process_resident_memory_bytes': ('gauge', 'RSS of the main process and pool workers'),
+    'aio_process_cpu_seconds': ('counter', 'CPU time of the main process and pool workers'),
+    'aio_process_open_connections': ('gauge', 'Open inet connections of the main process and pool workers'),
+    'aio_stage_seconds': ('histogram', 'Per-item / per-job time spent in each pipeline stage'),
+}
+
+
+SAMPLE_INTERVAL = 1.0     # giây giữa 2 mẫu tài nguyên
+SAMPLE_CAPACITY = 900     # số mẫu giữ lại (~15 phút ở 1s/mẫu)
+STATS_CAPACITY = 5000     # số dòng log_stats giữ lại cho báo cáo
+
+
+class ResourceSampler(threading.Thread):
+    """Lấy mẫu tài nguyên định kỳ vào ring buffer (deque maxlen), quy cho process chính + từng process con.
+
+    Mỗi mẫu: CPU/RAM toàn máy, tốc độ mạng toàn máy (psutil không tách byte mạng theo process),
+    byte media app đã tải/giây (core.metrics), và theo từng process: cpu %, cpu giây, RSS, số kết nối inet.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, capacity=SAMPLE_CAPACITY, pid=None):
+        super().__init__(name='resource-sampler', daemon=True)
+        self.interval = interval
+        self.buffer = deque(maxlen=capacity)
+        self._root = psutil.Process(pid or os.getpid())
+        self._procs = {}  # pid -> psutil.Process (giữ lại để cpu_percent() tính theo khoảng giữa 2 mẫu)
+        self._last_net = None
+        self._last_app_bytes = None
+        self._last_ts = None
+        self._halt = threading.Event()
+        psutil.cpu_percent(None)  # mồi cho lần đọc không chặn đầu tiên
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                pass
+
+    def stop(self):
+        self._halt.set()
+
+    def sample(self):
+        """Lấy 1 mẫu ngay (gọi từ thread nền; cũng gọi được trực tiếp)"""
+        now = time.time()
+        dt = (now - self._last_ts) if self._last_ts else None
+        mem = psutil.virtual_memory()
+        sample = {
+            'ts': now,
+            'cpu_percent': psutil.cpu_percent(None),
+            'memory_percent': mem.percent,
+            'memory_gb': mem.used / (1024 ** 3),
+            'net_sent_bps': None, 'net_recv_bps': None, 'app_bytes_per_s': None,
+            'processes': self._sample_processes(),
+        }
+        try:
+            net = psutil.net_io_counters()
+        except Exception:
+            net = None
+        if net and self._last_net and dt:
+            sample['net_sent_bps'] = max(0.0, (net.bytes_sent - self._last_net.bytes_sent) / dt)
+            sample['net_recv_bps'] = max(0.0, (net.bytes_recv - self._last_net.bytes_recv) / dt)
+        self._last_net = net
+        if core_metrics is not None:
+            app_bytes = core_metrics.current().snapshot()['downloaded_bytes_total']
+            if self._last_app_bytes is not None and dt:
+                sample['app_bytes_per_s'] = max(0.0, (app_bytes - self._last_app_bytes) / dt)
+            self._last_app_bytes = app_bytes
+        procs = sample['processes']
+        sample['total'] = {
+            'processes': len(procs),
+            'cpu_percent': sum(p['cpu_percent'] for p in procs),
+            'rss': sum(p['rss'] for p in procs),
+            'connections': sum(p['connections'] for p in procs),
+        }
+        self._last_ts = now
+        self.buffer.append(sample)
+        return sample
+
+    def _sample_processes(self):
+        try:
+            children = self._root.children(recursive=True)
+        except psutil.Error:
+            children = []
+        live = {self._root.pid: self._root}
+        for child in children:
+            live[child.pid] = self._procs.get(child.pid, child)
+        self._procs = live
+
+        out = []
+        for pid, proc in live.items():
+            try:
+                with proc.oneshot():
+                    name = proc.name()
+                    cpu = proc.cpu_times()
+                    row = {
+                        'pid': pid,
+                        'role': 'main' if pid == self._root.pid else ('worker' if 'python' in name.lower() else name),
+                        'cpu_percent': proc.cpu_percent(None),
+                        'cpu_s': cpu.user + cpu.system,
+                        'rss': proc.memory_info().rss,
+                        'connections': _count_connections(proc),
+                    }
+            except psutil.Error:
+                continue
+            out.append(row)
+        return out
+
+    # ---- đọc ----
+    def latest(self):
+        return self.buffer[-1] if self.buffer else None
+
+    def samples(self, since=None):
+        items = list(self.buffer)
+        return [s for s in items if s['ts'] > since] if since else items
+
+    def peaks(self, since=None):
+        """Đỉnh trong buffer: CPU/RAM toàn máy, CPU/RSS/kết nối tổng của app và RSS đỉnh từng process"""
+        items = self.samples(since)
+        if not items:
+            return {}
+        per_process = {}
+        for s in items:
+            for p in s['processes']:
+                key = (p['pid'], p['role'])
+                per_process[key] = max(per_process.get(key, 0), p['rss'])
+        return {
+            'cpu_percent': max(s['cpu_percent'] for s in items),
+            'memory_percent': max(s['memory_percent'] for s in items),
+            'app_cpu_percent': max(s['total']['cpu_percent'] for s in items),
+            'app_rss': max(s['total']['rss'] for s in items),
+            'app_connections': max(s['total']['connections'] for s in items),
+            'processes': max(s['total']['processes'] for s in items),
+            'net_recv_bps': max((s['net_recv_bps'] or 0) for s in items),
+            'rss_by_process': per_process,
+        }
+
+
+def _count_connections(proc):
+    try:
+        getter = getattr(proc, 'net_connections', None) or proc.connections
+        return len(getter(kind='inet'))
+    except (psutil.Error, OSError):
+        return 0
 
 
 class PerformanceMonitor:
     def __init__(self):
         self.start_time = None
-        self.stats = []
+        self.stats = deque(maxlen=STATS_CAPACITY)
+        self.sampler = None
+        self.timings = []  # snapshot histogram theo stage của từng job (core.timing.JobTimings)
+        self._live_timings = {}  # id -> JobTimings đang chạy (watch_timings)
+        self._samples = {}  # (name, labels) -> value cho counter/gauge tự quản
+        self._metrics_lock = threading.Lock()
 
     def start(self):
         self.start_time = time.time()
+        self.start_sampler()
         print("🚀 Performance Monitor Started")
 
+    def start_sampler(self, interval=SAMPLE_INTERVAL, capacity=SAMPLE_CAPACITY):
+        """Chạy ResourceSampler (1 lần cho mỗi monitor); mẫu đầu lấy ngay để latest() có dữ liệu"""
+        if self.sampler is None or not self.sampler.is_alive():
+            self.sampler = ResourceSampler(interval=interval, capacity=capacity)
+            self.sampler.sample()
+            self.sampler.start()
+        return self.sampler
+
+    def resources(self):
+        """Mẫu tài nguyên mới nhất (dict, xem ResourceSampler) - không gọi psutil trên luồng gọi"""
+        return self.start_sampler().latest()
+
     def log_stats(self, processed_count: int, total_count: int, operation: str = "Processing"):
         if not self.start_time:
             return
@@ -25,10 +215,10 @@ class PerformanceMonitor:
         current_time = time.time()
         elapsed = current_time - self.start_time
 
-        cpu_percent = psutil.cpu_percent()
-        memory = psutil.virtual_memory()
-        memory_percent = memory.percent
-        memory_used_gb = memory.used / (1024 ** 3)
+        res = self.resources()
+        cpu_percent = res['cpu_percent']
+        memory_percent = res['memory_percent']
+        memory_used_gb = res['memory_gb']
 
         rate = processed_count / elapsed if elapsed > 0 else 0
         eta = (total_count - processed_count) / rate if rate > 0 else 0
@@ -43,6 +233,8 @@ class PerformanceMonitor:
             'cpu_percent': cpu_percent,
             'memory_percent': memory_percent,
             'memory_gb': memory_used_gb,
+            'app_rss_mb': res['total']['rss'] / (1024 ** 2),
+            'app_processes': res['total']['processes'],
             'operation': operation
         }
 
@@ -51,7 +243,198 @@ class PerformanceMonitor:
         # Print real-time stats
         print(f"⚡ {operation}: {processed_count}/{total_count} | "
               f"Rate: {rate:.1f}/s | ETA: {eta:.0f}s | "
-              f"CPU: {cpu_percent:.1f}% | RAM: {memory_percent:.1f}%")
+              f"CPU: {cpu_percent:.1f}% | RAM: {memory_percent:.1f}% | "
+              f"AIO: {stat['app_rss_mb']:.0f}MB / {stat['app_processes']} proc")
+
+    def add_timings(self, job_timings):
+        """Nhận JobTimings (hoặc dict snapshot của nó) khi 1 job kết thúc"""
+        snap = job_timings.snapshot() if hasattr(job_timings, 'snapshot') else dict(job_timings)
+        with self._metrics_lock:
+            self._live_timings.pop(id(job_timings), None)
+            self.timings.append(snap)
+        for name, h in snap.get('stages', {}).items():
+            print(f"⏱️ {snap.get('job', '')} {name}: n={h['count']} | total {h['sum_s']:.2f}s | "
+                  f"p50 {_ms(h['p50_s'])} | p95 {_ms(h['p95_s'])} | max {_ms(h['max_s'])}")
+        return snap
+
+    def export_timings(self, path=None):
+        """Ghi histogram theo stage ra file: .json (đầy đủ bucket) hoặc .csv (1 dòng / job / stage)"""
+        if not self.timings:
+            return None
+        path = path or f"turbo_timings_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        if path.lower().endswith('.csv'):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("job,stage,count,sum_s,mean_s,p50_s,p95_s,p99_s,max_s\n")
+                for snap in self.timings:
+                    for name, h in snap.get('stages', {}).items():
+                        f.write(",".join(str(v if v is not None else '') for v in (
+                            snap.get('job', ''), name, h['count'], h['sum_s'], h['mean_s'],
+                            h['p50_s'], h['p95_s'], h['p99_s'], h['max_s'])) + "\n")
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'jobs': self.timings}, f, ensure_ascii=False, indent=2)
+        print(f"📊 Stage timings saved: {path}")
+        return path
+
+    # ===== Metrics (OpenMetrics) =====
+    def inc(self, name, value=1.0, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._metrics_lock:
+            self._samples[key] = self._samples.get(key, 0.0) + value
+
+    def set_gauge(self, name, value, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._metrics_lock:
+            self._samples[key] = float(value)
+
+    def watch_timings(self, job_timings):
+        """Xuất histogram của job đang chạy (add_timings khi xong sẽ chuyển sang danh sách đã xong)"""
+        with self._metrics_lock:
+            self._live_timings[id(job_timings)] = job_timings
+        return job_timings
+
+    def observe_item(self, job, row):
+        """Kết quả 1 item (dòng scraper/checker/downloader/enricher) -> items + errors theo nhóm"""
+        self.inc('aio_items_processed', job=job)
+        if not isinstance(row, dict) or core_metrics is None:
+            return
+        status = row.get('Tình trạng', row.get('Trạng thái', row.get('error')))
+        error_class = core_metrics.classify_error(status)
+        if error_class:
+            self.inc('aio_errors', job=job, error_class=error_class)
+
+    def observe_progress(self, job, done, total):
+        self.set_gauge('aio_queue_depth', max(0, int(total or 0) - int(done or 0)), job=job)
+
+    def wrap_item(self, job, callback=None):
+        """item_callback cho run_*: ghi metrics rồi chuyển tiếp cho callback gốc"""
+        def _item(row):
+            self.observe_item(job, row)
+            if callback:
+                callback(row)
+        return _item
+
+    def wrap_progress(self, job, callback=None):
+        def _progress(done, total=0, *rest):
+            self.observe_progress(job, done, total)
+            if callback:
+                callback(done, total, *rest)
+        return _progress
+
+    def _process_samples(self):
+        out = []
+        for p in (self.resources() or {}).get('processes', []):
+            labels = (('pid', str(p['pid'])), ('role', p['role']))
+            out.append(('aio_process_resident_memory_bytes', labels, float(p['rss'])))
+            out.append(('aio_process_cpu_seconds', labels, p['cpu_s']))
+            out.append(('aio_process_open_connections', labels, float(p['connections'])))
+        return out
+
+    def _stage_histograms(self):
+        """Gộp bucket theo (job, stage) từ job đã xong + job đang chạy"""
+        with self._metrics_lock:
+            snaps = list(self.timings) + [t.snapshot() for t in self._live_timings.values()]
+        merged = {}
+        for snap in snaps:
+            for stage, h in snap.get('stages', {}).items():
+                acc = merged.setdefault((snap.get('job', ''), stage), {'buckets': {}, 'count': 0, 'sum': 0.0})
+                for le, n in (h.get('buckets_ms') or {}).items():
+                    acc['buckets'][le] = acc['buckets'].get(le, 0) + n
+                acc['count'] += h.get('count', 0)
+                acc['sum'] += h.get('sum_s', 0.0)
+        return merged
+
+    def render_openmetrics(self):
+        """Toàn bộ metrics dạng OpenMetrics text (kết thúc bằng # EOF)"""
+        samples = {}
+        with self._metrics_lock:
+            for (name, labels), value in self._samples.items():
+                samples.setdefault(name, []).append((labels, value))
+        if core_metrics is not None:
+            shared = core_metrics.current().snapshot()
+            samples.setdefault('aio_requests', []).append(((), shared['requests_total']))
+            samples.setdefault('aio_rate_limited', []).append(((), shared['rate_limited_total']))
+            samples.setdefault('aio_downloaded_bytes', []).append(((), shared['downloaded_bytes_total']))
+            samples.setdefault('aio_inflight_requests', []).append(((), max(0.0, shared['inflight_requests'])))
+        for name, labels, value in self._process_samples():
+            samples.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, (mtype, help_text) in METRICS.items():
+            if mtype == 'histogram':
+                continue
+            if name not in samples:
+                continue
+            lines.append(f"# TYPE {name} {mtype}")
+            lines.append(f"# HELP {name} {help_text}")
+            suffix = '_total' if mtype == 'counter' else ''
+            for labels, value in sorted(samples[name]):
+                lines.append(f"{name}{suffix}{_labels(labels)} {_num(value)}")
+
+        stages = self._stage_histograms()
+        if stages:
+            name = 'aio_stage_seconds'
+            lines.append(f"# TYPE {name} histogram")
+            lines.append(f"# HELP {name} {METRICS[name][1]}")
+            for (job, stage), acc in sorted(stages.items()):
+                base = (('job', job), ('stage', stage))
+                cumulative = 0
+                for le in sorted((k for k in acc['buckets'] if k != '+Inf'), key=float):
+                    cumulative += acc['buckets'][le]
+                    lines.append(f"{name}_bucket{_labels(base + (('le', _num(float(le) / 1000.0)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(base + (('le', '+Inf'),))} {acc['count']}")
+                lines.append(f"{name}_count{_labels(base)} {acc['count']}")
+                lines.append(f"{name}_sum{_labels(base)} {_num(acc['sum'])}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path):
+        """Ghi metrics ra file (ghi file tạm rồi os.replace -> reader không thấy file dở dang)"""
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.render_openmetrics())
+        os.replace(tmp, path)
+        return path
+
+    def start_metrics_file(self, path, interval=15.0):
+        """Thread nền ghi metrics mỗi `interval` giây; trả về Event để dừng (lần ghi cuối: gọi write_metrics)"""
+        stop = threading.Event()
+        self.start_sampler()
+
+        def _loop():
+            while not stop.wait(interval):
+                try:
+                    self.write_metrics(path)
+                except OSError:
+                    pass
+
+        threading.Thread(target=_loop, name='metrics-file', daemon=True).start()
+        return stop
+
+    def serve_metrics(self, port=9464, host='127.0.0.1'):
+        """Endpoint OpenMetrics cục bộ: GET /metrics. Trả về server (gọi .shutdown() để dừng)"""
+        monitor = self
+        self.start_sampler()
+
+        class _MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = monitor.render_openmetrics().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
 
     def finish(self):
         if not self.start_time:
@@ -59,6 +442,7 @@ class PerformanceMonitor:
 
         total_time = time.time() - self.start_time
         print(f"✅ TURBO COMPLETED in {total_time:.1f}s")
+        peaks = self.sampler.peaks(since=self.start_time) if self.sampler else {}
 
         # Save detailed report
         if self.stats:
@@ -67,10 +451,20 @@ class PerformanceMonitor:
                 f.write("TURBO MODE PERFORMANCE REPORT\n")
                 f.write("=" * 50 + "\n\n")
                 f.write(f"Total Duration: {total_time:.2f} seconds\n")
-                f.write(f"Peak CPU: {max(s['cpu_percent'] for s in self.stats):.1f}%\n")
-                f.write(f"Peak Memory: {max(s['memory_percent'] for s in self.stats):.1f}%\n")
+                f.write(f"Peak CPU: {peaks.get('cpu_percent', max(s['cpu_percent'] for s in self.stats)):.1f}%\n")
+                f.write(f"Peak Memory: {peaks.get('memory_percent', max(s['memory_percent'] for s in self.stats)):.1f}%\n")
                 f.write(f"Average Rate: {sum(s['rate'] for s in self.stats) / len(self.stats):.1f} items/sec\n\n")
 
+                if peaks:
+                    f.write("PROCESSES (peak):\n")
+                    f.write("-" * 30 + "\n")
+                    f.write(f"App CPU: {peaks['app_cpu_percent']:.1f}% | App RSS: {peaks['app_rss'] / 1024 ** 2:.0f}MB | "
+                            f"Processes: {peaks['processes']} | Connections: {peaks['app_connections']} | "
+                            f"Net recv: {peaks['net_recv_bps'] / 1024 ** 2:.1f}MB/s\n")
+                    for (pid, role), rss in sorted(peaks['rss_by_process'].items()):
+                        f.write(f"  {role} pid={pid} | RSS {rss / 1024 ** 2:.0f}MB\n")
+                    f.write("\n")
+
                 f.write("DETAILED LOG:\n")
                 f.write("-" * 30 + "\n")
                 for stat in self.stats:
@@ -80,14 +474,43 @@ class PerformanceMonitor:
                             f"CPU: {stat['cpu_percent']:.1f}% | "
                             f"RAM: {stat['memory_percent']:.1f}%\n")
 
+                if self.timings:
+                    f.write("\nSTAGE TIMINGS:\n")
+                    f.write("-" * 30 + "\n")
+                    for snap in self.timings:
+                        for name, h in snap.get('stages', {}).items():
+                            f.write(f"{snap.get('job', '')} | {name} | n={h['count']} | "
+                                    f"total {h['sum_s']:.2f}s | p50 {_ms(h['p50_s'])} | "
+                                    f"p95 {_ms(h['p95_s'])} | p99 {_ms(h['p99_s'])}\n")
+
             print(f"📊 Performance report saved: {report_path}")
 
 
+def _ms(seconds):
+    return 'N/A' if seconds is None else f"{seconds * 1000:.0f}ms"
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    esc = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{esc(v)}"' for k, v in labels) + '}'
+
+
+def _num(value):
+    value = round(float(value), 6)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
 # Singleton instance
 monitor = PerformanceMonitor()
 
 # Usage in your code:
 # from performance_monitor import monitor
-# monitor.start()
+# monitor.start()                 # bật ResourceSampler (thread nền, ring buffer)
+# monitor.resources()             # mẫu mới nhất: CPU/RAM máy + CPU/RSS/kết nối từng process
 # monitor.log_stats(current_count, total_count, "Scraping")
+# monitor.add_timings(job_timings)   # core.timing.JobTimings truyền vào run_checker(timings=...)
+# monitor.export_timings("timings.json")
+# monitor.serve_metrics(9464) / monitor.start_metrics_file("aio.prom")
 # monitor.finish()
\ No newline at end of file
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+ui/render.py
+Render log cho Flet theo lô: worker chỉ append vào deque (không khoá, không page.update),
+1 thread render gom các dòng mới và đẩy lên ListView theo nhịp cố định (fps).
+
+- Số control trong view luôn <= max_lines (bỏ dòng cũ nhất); file log đầy đủ vẫn ghi riêng (log_buffer / sink).
+- Khi log dồn quá nhanh (backlog > max_lines) chỉ giữ các dòng mới nhất và hiện 1 dòng "… bỏ qua N dòng".
+- Chỉ gọi list_view.update() (diff của 1 control) thay vì page.update() toàn trang.
+
+ControlState: progress/detail/perf callback chỉ ghi giá trị mới nhất của từng thuộc tính control;
+1 render loop (~10 fps) đẩy những thuộc tính thực sự đổi bằng 1 lần page.update(*controls).
+"""
+import threading
+from collections import deque
+
+import flet as ft
+from flet import Colors
+
+LOG_FPS = 8             # số lần flush / giây
+LOG_MAX_LINES = 600     # số dòng tối đa trên view
+LOG_BATCH = 200         # số dòng tối đa đẩy lên trong 1 frame
+PROGRESS_FPS = 10       # nhịp render progress
+
+
+class LogView:
+    """ListView log có giới hạn + hàng đợi dòng chờ render"""
+
+    def __init__(self, page: ft.Page, max_lines: int = LOG_MAX_LINES, fps: float = LOG_FPS,
+                 batch: int = LOG_BATCH, **list_kwargs):
+        self.page = page
+        self.max_lines = max_lines
+        self.batch = batch
+        self.interval = 1.0 / max(1.0, fps)
+        self.control = ft.ListView(**{'expand': True, 'spacing': 3, 'auto_scroll': True, **list_kwargs})
+        self._pending = deque()          # (line, color, weight) - append/popleft an toàn giữa các thread
+        self._view_lock = threading.Lock()  # chỉ giữa thread render và thao tác UI (clear), worker không đụng
+        self._halt = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='log-render', daemon=True)
+        self._thread.start()
+
+    # ---- gọi từ bất kỳ thread nào ----
+    def push(self, line: str, color=None, weight=None):
+        self._pending.append((line, color, weight))
+
+    def clear(self):
+        with self._view_lock:
+            self._pending.clear()
+            self.control.controls.clear()
+        self._update()
+
+    def stop(self):
+        self._halt.set()
+
+    # ---- thread render ----
+    def _loop(self):
+        while not self._halt.wait(self.interval):
+            if self._pending:
+                try:
+                    self.flush()
+                except Exception:
+                    pass
+
+    def flush(self):
+        """Đẩy các dòng đang chờ lên view (1 lần update cho cả lô)"""
+        with self._view_lock:
+            backlog = len(self._pending)
+            skipped = 0
+            if backlog > self.max_lines:
+                skipped = backlog - self.max_lines
+                for _ in range(skipped):
+                    self._pending.popleft()
+            controls = self.control.controls
+            if skipped:
+                controls.clear()
+                controls.append(ft.Text(f"… bỏ qua {skipped} dòng log (xem file log đầy đủ)", size=12,
+                                        font_family="Consolas", color=Colors.GREY_600, italic=True))
+            for _ in range(min(self.batch, len(self._pending))):
+                line, color, weight = self._pending.popleft()
+                controls.append(ft.Text(line, size=12, font_family="Consolas", color=color, weight=weight))
+            if len(controls) > self.max_lines:
+                del controls[:len(controls) - self.max_lines]
+        self._update()
+
+    def _update(self):
+        try:
+            self.control.update()
+        except (AssertionError, AttributeError):
+            # ListView chưa gắn vào page -> cập nhật cả trang
+            self.page.update()
+
+
+class ControlState:
+    """Giá trị hiển thị gộp (last-write-wins) cho các control, render theo nhịp cố định"""
+
+    def __init__(self, page: ft.Page, fps: float = PROGRESS_FPS):
+        self.page = page
+        self.interval = 1.0 / max(1.0, fps)
+        self._pending = {}  # (id(control), attr) -> (control, attr, value)
+        self._lock = threading.Lock()
+        self._halt = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='progress-render', daemon=True)
+        self._thread.start()
+
+    def set(self, control, **attrs):
+        """Ghi giá trị mới (rẻ: chỉ cập nhật dict); giá trị cũ chưa render bị ghi đè"""
+        with self._lock:
+            for attr, value in attrs.items():
+                self._pending[(id(control), attr)] = (control, attr, value)
+
+    def stop(self):
+        self._halt.set()
+
+    def _loop(self):
+        while not self._halt.wait(self.interval):
+            if self._pending:
+                try:
+                    self.flush()
+                except Exception:
+                    pass
+
+    def flush(self):
+        """Áp các giá trị đang chờ lên control, chỉ update control có thuộc tính thay đổi"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        changed = {}
+        for control, attr, value in pending.values():
+            if getattr(control, attr, None) == value:
+                continue
+            setattr(control, attr, value)
+            changed[id(control)] = control
+        if changed:
+            try:
+                self.page.update(*changed.values())
+            except TypeError:
+                self.page.update()
+        return len(changed)
+